@@ -0,0 +1,150 @@
+"""Admission control for the acquirer path: rate limits, bounded queues, priority tiers, deadline shedding"""
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # Shared payment_metrics package at the repo root
+from payment_metrics import LatencyHistogram  # Re-exported for the benchmarks
+
+
+class Tier(IntEnum):
+    """Lower value is served first"""
+    SMALL_MERCHANT = 0  # Local Grocery, Coffee Shop: low volume, must never wait behind a burst
+    LARGE_MERCHANT = 1  # MEGA-MART: high volume, rate limited
+
+
+class Admission(IntEnum):
+    ADMITTED = 0
+    RATE_LIMITED = 1
+    QUEUE_FULL = 2
+
+
+@dataclass
+class Request:
+    merchant_id: str
+    arrived_at: float
+    deadline: float  # Authorization is useless to the terminal after this
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def try_take(self, tokens: float = 1.0) -> bool:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+@dataclass
+class MerchantPolicy:
+    tier: Tier
+    rate_tps: float
+    burst: float
+    queue_limit: int
+
+
+class AdmissionController:
+    """
+    Sits in front of the authorization workers.
+
+    offer() rejects at once when the merchant is over its token-bucket rate or its
+    own queue is full, so a burst cannot grow one shared unbounded queue.
+    next_request() serves tiers in priority order and merchants within a tier
+    round-robin, and sheds requests that would finish after their deadline
+    instead of doing work the terminal has already given up on.
+    """
+
+    def __init__(self, expected_service_seconds: float, default_policy: MerchantPolicy,
+                 clock: Callable[[], float] = time.monotonic):
+        self.expected_service_seconds = expected_service_seconds
+        self.default_policy = default_policy
+        self.clock = clock
+        self.policies: Dict[str, MerchantPolicy] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queues: Dict[str, deque] = {}
+        # Per tier: merchants with queued requests, in round-robin order
+        self._ready: Dict[Tier, deque] = {tier: deque() for tier in Tier}
+        self.stats = {"admitted": 0, "rate_limited": 0, "queue_full": 0, "shed": 0, "served": 0}
+
+    def register(self, merchant_id: str, policy: MerchantPolicy):
+        self.policies[merchant_id] = policy
+        self._buckets[merchant_id] = TokenBucket(policy.rate_tps, policy.burst, self.clock)
+
+    def offer(self, request: Request) -> Admission:
+        merchant_id = request.merchant_id
+        if merchant_id not in self.policies:
+            self.register(merchant_id, self.default_policy)
+        policy = self.policies[merchant_id]
+
+        # Capacity first: a request bounced off a full queue must not spend a token
+        queue = self._queues.setdefault(merchant_id, deque())
+        if len(queue) >= policy.queue_limit:
+            self.stats["queue_full"] += 1
+            return Admission.QUEUE_FULL
+        if not self._buckets[merchant_id].try_take():
+            self.stats["rate_limited"] += 1
+            return Admission.RATE_LIMITED
+
+        if not queue:
+            self._ready[policy.tier].append(merchant_id)
+        queue.append(request)
+        self.stats["admitted"] += 1
+        return Admission.ADMITTED
+
+    def next_request(self) -> Optional[Request]:
+        """The next request worth serving, or None if nothing is queued"""
+        now = self.clock()
+        for tier in Tier:
+            ready = self._ready[tier]
+            while ready:
+                merchant_id = ready.popleft()
+                queue = self._queues[merchant_id]
+                request = None
+                while queue:
+                    candidate = queue.popleft()
+                    if now + self.expected_service_seconds <= candidate.deadline:
+                        request = candidate
+                        break
+                    self.stats["shed"] += 1
+                if queue:
+                    ready.append(merchant_id)
+                if request is not None:
+                    self.stats["served"] += 1
+                    return request
+        return None
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def shed_expired(self) -> List[Request]:
+        """Drops every queued request that can no longer meet its deadline (e.g. on each heartbeat)"""
+        now = self.clock()
+        shed = []
+        for queue in self._queues.values():
+            keep = [r for r in queue if now + self.expected_service_seconds <= r.deadline]
+            if len(keep) != len(queue):
+                shed.extend(r for r in queue if now + self.expected_service_seconds > r.deadline)
+                queue.clear()
+                queue.extend(keep)
+        self.stats["shed"] += len(shed)
+        for ready in self._ready.values():
+            for _ in range(len(ready)):
+                merchant_id = ready.popleft()
+                if self._queues[merchant_id]:
+                    ready.append(merchant_id)
+        return shed
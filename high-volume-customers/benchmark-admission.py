@@ -0,0 +1,99 @@
+"""Rush hour through an unbounded FIFO queue vs the admission controller (companion to index.html)"""
+import random
+import argparse
+from collections import defaultdict
+
+from admission_control import AdmissionController, LatencyHistogram, MerchantPolicy, Request, Tier
+
+TICK_SECONDS = 0.2  # simulationHeartbeat() interval
+
+
+def generate_arrivals(args) -> list[Request]:
+    """MEGA-MART bursts to 1500-2000 tps per heartbeat tick (as in toggleBurst()); everyone else is steady"""
+    rng = random.Random(args.seed)
+    steady = {"Local Grocery": 5.0, "Coffee Shop": 5.0}
+    steady.update({f"Merchant-{i:02d}": 5.0 for i in range(args.other_merchants)})
+    arrivals = []
+    tick = 0.0
+    while tick < args.duration:
+        bursting = args.burst_start <= tick < args.burst_end
+        rates = dict(steady, **{"MEGA-MART": rng.uniform(1500, 2000) if bursting else 50.0})
+        for merchant_id, rate in rates.items():
+            t = tick + rng.expovariate(rate)
+            while t < tick + TICK_SECONDS:
+                arrivals.append(Request(merchant_id, t, t + args.deadline_ms / 1000))
+                t += rng.expovariate(rate)
+        tick += TICK_SECONDS
+    arrivals.sort(key=lambda r: r.arrived_at)
+    return arrivals
+
+
+def unbounded_fifo(arrivals, service: float, args):
+    """Today's behaviour: every request queues, latency grows with queue depth"""
+    histograms = defaultdict(LatencyHistogram)
+    free_at = 0.0
+    for request in arrivals:
+        free_at = max(free_at, request.arrived_at) + service
+        if args.burst_start <= request.arrived_at < args.burst_end:
+            record(histograms, request, (free_at - request.arrived_at) * 1000)
+    return histograms, {"served": len(arrivals)}
+
+
+def admission_controlled(arrivals, service: float, args):
+    now = 0.0
+    controller = AdmissionController(service, clock=lambda: now, default_policy=MerchantPolicy(
+        Tier.SMALL_MERCHANT, rate_tps=50, burst=20, queue_limit=50))
+    controller.register("MEGA-MART", MerchantPolicy(
+        Tier.LARGE_MERCHANT, rate_tps=args.mega_rate_tps, burst=args.mega_rate_tps / 5, queue_limit=args.mega_queue))
+
+    histograms = defaultdict(LatencyHistogram)
+    free_at, i = 0.0, 0
+    while True:
+        next_arrival = arrivals[i].arrived_at if i < len(arrivals) else None
+        if controller.queue_depth() and (next_arrival is None or free_at <= next_arrival):
+            now = free_at
+            request = controller.next_request()
+            if request is None:
+                continue  # Everything queued was shed
+            free_at = now + service
+            if args.burst_start <= request.arrived_at < args.burst_end:
+                record(histograms, request, (free_at - request.arrived_at) * 1000)
+        elif next_arrival is not None:
+            now = next_arrival
+            controller.offer(arrivals[i])
+            free_at = max(free_at, now)
+            i += 1
+        else:
+            return histograms, controller.stats
+
+
+def record(histograms, request: Request, latency_ms: float):
+    histograms["all"].record(latency_ms)
+    key = request.merchant_id if request.merchant_id in ("MEGA-MART", "Local Grocery") else "others"
+    histograms[key].record(latency_ms)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Admission control benchmark")
+    parser.add_argument("--capacity-tps", type=float, default=1200.0)
+    parser.add_argument("--other-merchants", type=int, default=50)
+    parser.add_argument("--mega-rate-tps", type=float, default=1100.0, help="MEGA-MART token bucket rate")
+    parser.add_argument("--mega-queue", type=int, default=600)
+    parser.add_argument("--deadline-ms", type=float, default=500.0)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--burst-start", type=float, default=10.0)
+    parser.add_argument("--burst-end", type=float, default=40.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    arrivals = generate_arrivals(args)
+    service = 1 / args.capacity_tps
+    print(f"{len(arrivals):,} requests, capacity {args.capacity_tps:.0f} tps, "
+          f"MEGA-MART burst {args.burst_start:.0f}-{args.burst_end:.0f}s; latency while the burst is active:")
+    for label, strategy in [("unbounded FIFO", unbounded_fifo), ("admission control", admission_controlled)]:
+        histograms, stats = strategy(arrivals, service, args)
+        print(f"  {label}: {stats}")
+        for key in ("all", "MEGA-MART", "Local Grocery", "others"):
+            h = histograms[key]
+            print(f"    {key:<14} p50 {h.percentile(50):9.1f}ms  p99 {h.percentile(99):9.1f}ms  "
+                  f"max {h.max:9.1f}ms  ({h.total:,} served)")
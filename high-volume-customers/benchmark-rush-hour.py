@@ -0,0 +1,88 @@
+"""Reproducible rush hour: MEGA-MART bursts into SHARD 01, with and without hot-key splitting"""
+import random
+import argparse
+from collections import defaultdict
+
+from shard_engine import ConsistentHashPartitioner, RangePartitioner, ShardEngine, Transaction, p99
+
+MEGA_MART, LOCAL_GROCERY, COFFEE_SHOP = 7, 31, 63  # Merchant ids: MEGA-MART sits in SHARD 01 (00-24)
+NAMES = {MEGA_MART: "MEGA-MART", LOCAL_GROCERY: "Local Grocery", COFFEE_SHOP: "Coffee Shop"}
+
+
+def run(partitioner, auto_split: bool, args) -> dict:
+    """
+    Single-server FIFO queue per shard, serving shard_capacity_tps.
+    Background merchants 00-99 share background_tps; MEGA-MART adds rush_tps
+    between rush_start and rush_end.
+    """
+    rng = random.Random(args.seed)
+    now = 0.0
+    engine = ShardEngine(partitioner, shard_capacity_tps=args.shard_capacity_tps, auto_split=auto_split,
+                         clock=lambda: now)
+    service = 1 / args.shard_capacity_tps
+    busy_until = [0.0] * partitioner.shard_count
+    rush_latencies = defaultdict(list)
+    rush_offered = [0] * partitioner.shard_count  # Arrivals during the rush
+    rush_served = [0] * partitioner.shard_count   # Completions during the rush (capped by capacity)
+    mega_written = 0
+    split_at = None
+
+    while now < args.duration:
+        rushing = args.rush_start <= now < args.rush_end
+        mega_tps = args.rush_tps if rushing else args.mega_normal_tps
+        now += rng.expovariate(args.background_tps + mega_tps)
+        merchant_id = MEGA_MART if rng.random() < mega_tps / (args.background_tps + mega_tps) else rng.randrange(100)
+        mega_written += merchant_id == MEGA_MART
+
+        shard_id = engine.write(Transaction(merchant_id, rng.randrange(100, 10_000), now))
+        if split_at is None and engine.splits:
+            split_at = now
+        busy_until[shard_id] = max(busy_until[shard_id], now) + service
+        if args.rush_start <= busy_until[shard_id] < args.rush_end:
+            rush_served[shard_id] += 1
+        if rushing:
+            latency = busy_until[shard_id] - now
+            rush_latencies["all"].append(latency)
+            rush_latencies[merchant_id].append(latency)
+            rush_offered[shard_id] += 1
+            if split_at is not None and now >= split_at + 5:
+                rush_latencies["settled"].append(latency)  # Once the split backlog has drained
+
+    assert engine.read_merchant(MEGA_MART)["transactions"] == mega_written
+    rush_seconds = args.rush_end - args.rush_start
+    return {
+        "shard_tps": [served / rush_seconds for served in rush_served],
+        "offered_tps": [offered / rush_seconds for offered in rush_offered],
+        "p99_ms": {key: p99(values) * 1000 for key, values in rush_latencies.items()},
+        "splits": {NAMES.get(m, m): len(salts) for m, salts in engine.splits.items()},
+        "describe": [partitioner.describe(i) for i in range(partitioner.shard_count)],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rush hour shard benchmark")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--shard-capacity-tps", type=float, default=1000.0)
+    parser.add_argument("--background-tps", type=float, default=400.0)
+    parser.add_argument("--mega-normal-tps", type=float, default=50.0)
+    parser.add_argument("--rush-tps", type=float, default=1800.0)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--rush-start", type=float, default=10.0)
+    parser.add_argument("--rush-end", type=float, default=40.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for label, make_partitioner in [("range", RangePartitioner), ("consistent hash", ConsistentHashPartitioner)]:
+        for auto_split in (False, True):
+            result = run(make_partitioner(args.shards), auto_split, args)
+            print(f"{label}, {'with' if auto_split else 'without'} hot-key splitting"
+                  f"{' -> ' + str(result['splits']) if result['splits'] else ''}")
+            rows = zip(result["shard_tps"], result["offered_tps"], result["describe"])
+            for i, (tps, offered, describe) in enumerate(rows):
+                print(f"  SHARD {i + 1:02d} ({describe:<15}) served {tps:7.0f} tps "
+                      f"({tps / args.shard_capacity_tps:4.0%} of capacity), offered {offered:7.0f} tps")
+            p99_ms = result["p99_ms"]
+            print(f"  rush hour p99: all {p99_ms['all']:9.1f}ms  MEGA-MART {p99_ms[MEGA_MART]:9.1f}ms  "
+                  f"Local Grocery {p99_ms.get(LOCAL_GROCERY, 0.0):9.1f}ms")
+            if "settled" in p99_ms:
+                print(f"  rush hour p99 from 5s after the split: {p99_ms['settled']:.1f}ms")
@@ -0,0 +1,206 @@
+"""Merchant-keyed shard engine with hot-key splitting (the model behind index.html)"""
+import time
+import zlib
+import math
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Sequence
+
+KEY_SPACE = 100  # Merchant ids 00-99, as drawn in the simulator
+
+
+@dataclass
+class Transaction:
+    merchant_id: int
+    amount_cents: int
+    timestamp: float
+
+
+def sub_key(merchant_id: int, salt: int) -> str:
+    """Salt 0 is the merchant's own key; salted keys are its extra sub-partitions"""
+    return str(merchant_id) if salt == 0 else f"{merchant_id}#{salt}"
+
+
+def key_slot(key: str) -> int:
+    """Plain merchant ids keep their place in the id range; salted keys scatter over it"""
+    return int(key) if key.isdigit() else zlib.crc32(key.encode()) % KEY_SPACE
+
+
+class RangePartitioner:
+    """Shard i owns slots [bounds[i], bounds[i + 1]); the default is the simulator's 00-24, 25-49, ..."""
+
+    def __init__(self, shards: int = 4):
+        self.bounds = [i * KEY_SPACE // shards for i in range(shards)]
+        self.shard_count = shards
+
+    def shard_for(self, key: str) -> int:
+        return bisect_right(self.bounds, key_slot(key)) - 1
+
+    def describe(self, shard_id: int) -> str:
+        end = self.bounds[shard_id + 1] if shard_id + 1 < self.shard_count else KEY_SPACE
+        return f"ID: {self.bounds[shard_id]:02d}-{end - 1:02d}"
+
+
+class ConsistentHashPartitioner:
+    """Hash ring with virtual nodes: adding a shard only moves ~1/n of the keys"""
+
+    def __init__(self, shards: int = 4, vnodes: int = 64):
+        self.shard_count = shards
+        ring = sorted((zlib.crc32(f"shard-{s}-vnode-{v}".encode()), s) for s in range(shards) for v in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [shard for _, shard in ring]
+
+    def shard_for(self, key: str) -> int:
+        i = bisect_left(self._points, zlib.crc32(key.encode()))
+        return self._owners[i % len(self._owners)]
+
+    def describe(self, shard_id: int) -> str:
+        return f"ring share {self._owners.count(shard_id) / len(self._owners):.0%}"
+
+
+class RateCounter:
+    """Events per second per key over a sliding window of one-second buckets"""
+
+    def __init__(self, window_seconds: int = 5, clock: Callable[[], float] = time.monotonic):
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self._buckets: deque[tuple[int, Counter]] = deque()
+
+    def add(self, key, count: int = 1):
+        second = int(self.clock())
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append((second, Counter()))
+            self._trim(second)
+        self._buckets[-1][1][key] += count
+
+    def _trim(self, second: int):
+        while self._buckets and self._buckets[0][0] <= second - self.window_seconds:
+            self._buckets.popleft()
+
+    def rates(self) -> Counter:
+        self._trim(int(self.clock()))
+        total = Counter()
+        for _, bucket in self._buckets:
+            total.update(bucket)
+        return Counter({key: count / self.window_seconds for key, count in total.items()})
+
+
+class Shard:
+    def __init__(self, shard_id: int, clock: Callable[[], float], rate_window_seconds: int = 5):
+        self.shard_id = shard_id
+        self.rows: Dict[str, List[Transaction]] = {}
+        self.merchant_rates = RateCounter(rate_window_seconds, clock)  # Keyed by merchant id, across its sub-keys
+
+    def write(self, key: str, txn: Transaction):
+        self.rows.setdefault(key, []).append(txn)
+        self.merchant_rates.add(txn.merchant_id)
+
+    @property
+    def rate(self) -> float:
+        return sum(self.merchant_rates.rates().values())
+
+
+class ShardEngine:
+    """
+    Routes transactions to shards by merchant key.
+
+    Every `check_every` writes it looks at the per-shard rate counters. When a shard
+    runs above `hot_utilization` of `shard_capacity_tps` and one merchant makes up at
+    least `hot_share` of that, the merchant is split: its writes are spread round-robin
+    over salted sub-keys chosen to land on the least loaded shards. Reads merge the
+    merchant's own key with every salted sub-key.
+    """
+
+    def __init__(self, partitioner, shard_capacity_tps: float = 1000.0, hot_utilization: float = 0.8,
+                 hot_share: float = 0.5, target_utilization: float = 0.6, auto_split: bool = True,
+                 check_every: int = 500, rate_window_seconds: int = 2,
+                 clock: Callable[[], float] = time.monotonic):
+        self.partitioner = partitioner
+        self.shard_capacity_tps = shard_capacity_tps
+        self.hot_utilization = hot_utilization
+        self.hot_share = hot_share
+        self.target_utilization = target_utilization
+        self.auto_split = auto_split
+        self.check_every = check_every
+        self.shards = [Shard(i, clock, rate_window_seconds) for i in range(partitioner.shard_count)]
+        # merchant id -> salts in use (0 = own key); absent = not split
+        self.splits: Dict[int, List[int]] = {}
+        self._next_salt: Dict[int, int] = {}
+        self._writes = 0
+
+    def route(self, merchant_id: int) -> tuple[str, int]:
+        """(key, shard id) for the merchant's next write"""
+        salts = self.splits.get(merchant_id)
+        if salts is None:
+            key = sub_key(merchant_id, 0)
+        else:
+            turn = self._next_salt[merchant_id] = (self._next_salt.get(merchant_id, -1) + 1) % len(salts)
+            key = sub_key(merchant_id, salts[turn])
+        return key, self.partitioner.shard_for(key)
+
+    def write(self, txn: Transaction) -> int:
+        key, shard_id = self.route(txn.merchant_id)
+        self.shards[shard_id].write(key, txn)
+        self._writes += 1
+        if self.auto_split and self._writes % self.check_every == 0:
+            self.rebalance()
+        return shard_id
+
+    def read_merchant(self, merchant_id: int) -> dict:
+        """Merged view over every sub-partition of the merchant"""
+        count = total = 0
+        for salt in self.splits.get(merchant_id, [0]):
+            key = sub_key(merchant_id, salt)
+            rows = self.shards[self.partitioner.shard_for(key)].rows.get(key, [])
+            count += len(rows)
+            total += sum(txn.amount_cents for txn in rows)
+        return {"merchant_id": merchant_id, "transactions": count, "amount_cents": total}
+
+    def rebalance(self) -> List[int]:
+        """Splits hot merchants; returns the merchant ids split this time"""
+        split = []
+        for shard in self.shards:
+            rates = shard.merchant_rates.rates()
+            shard_rate = sum(rates.values())
+            if shard_rate < self.hot_utilization * self.shard_capacity_tps:
+                continue
+            merchant_id, merchant_rate = rates.most_common(1)[0]
+            if merchant_rate < self.hot_share * shard_rate:
+                continue
+            # Count the merchant's rate over all its sub-keys, not just this shard's share
+            total_rate = sum(s.merchant_rates.rates()[merchant_id] for s in self.shards)
+            ways = math.ceil(total_rate / (self.target_utilization * self.shard_capacity_tps))
+            if self.split(merchant_id, ways):
+                split.append(merchant_id)
+        return split
+
+    def split(self, merchant_id: int, ways: int) -> bool:
+        """Spreads the merchant over `ways` sub-keys on distinct, least loaded shards"""
+        ways = min(ways, len(self.shards))
+        current = self.splits.get(merchant_id, [0])
+        if ways <= len(current):
+            return False
+        loads = {s.shard_id: s.rate for s in self.shards}
+        used = {self.partitioner.shard_for(sub_key(merchant_id, salt)) for salt in current}
+        # Salted keys land where their hash puts them: try candidates, best shards first
+        candidates = {}
+        for salt in range(1, 64 * len(self.shards)):
+            shard_id = self.partitioner.shard_for(sub_key(merchant_id, salt))
+            if shard_id not in used and shard_id not in candidates:
+                candidates[shard_id] = salt
+        salts = list(current)
+        for shard_id in sorted(candidates, key=loads.get)[:ways - len(current)]:
+            salts.append(candidates[shard_id])
+        self.splits[merchant_id] = salts
+        return len(salts) > len(current)
+
+    def shard_rates(self) -> List[float]:
+        return [shard.rate for shard in self.shards]
+
+
+def p99(samples: Sequence[float]) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
@@ -0,0 +1,251 @@
+"""Group-commit write path for Leader balance updates"""
+import os
+import sys
+import time
+import queue
+import struct
+import argparse
+import tempfile
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # Shared payment_models package at the repo root
+from payment_models import Account
+
+# Log record: user id length, amount, new balance, new version, then the user id
+RECORD = struct.Struct(">Hddq")
+
+
+def encode_record(user_id: str, amount: float, balance: float, version: int) -> bytes:
+    raw_id = user_id.encode()
+    return RECORD.pack(len(raw_id), amount, balance, version) + raw_id
+
+
+def read_log(path: str) -> List[Tuple[str, float, float, int]]:
+    """(user_id, amount, balance, version) for every committed payment, in commit order"""
+    with open(path, "rb") as f:
+        data = f.read()
+    records, pos = [], 0
+    while pos + RECORD.size <= len(data):
+        id_len, amount, balance, version = RECORD.unpack_from(data, pos)
+        end = pos + RECORD.size + id_len
+        if end > len(data):
+            break  # Torn write at the tail: never acknowledged
+        records.append((data[pos + RECORD.size:end].decode(), amount, balance, version))
+        pos = end
+    return records
+
+
+class UnbatchedLeader:
+    """Baseline: one lock, one log write and one fsync per payment"""
+
+    def __init__(self, accounts: Dict[str, Account], log_path: str, fsync: bool = True):
+        self.accounts = accounts
+        self.fsync = fsync
+        self._log = open(log_path, "ab", buffering=0)
+        self._lock = threading.Lock()
+
+    def pay(self, user_id: str, amount: float) -> Tuple[float, int]:
+        with self._lock:
+            account = self.accounts[user_id]
+            balance, version = account.balance - amount, account.version + 1
+            self._log.write(encode_record(user_id, amount, balance, version))
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            account.balance, account.version = balance, version
+            return balance, version
+
+    def close(self):
+        self._log.close()
+
+
+class LeaderWriteEngine:
+    """
+    Queues concurrent payments and commits them in groups.
+
+    A single writer thread takes the first waiting payment, then lingers up to
+    `batch_window_seconds` for more (0 = only what is already queued), stopping
+    early at `max_batch` payments. It applies them in arrival order (so payments
+    to one account keep their order), appends the whole batch to the log with one
+    write and one fsync, and only then publishes the new balances and answers
+    every caller with its (balance, version). Payments that arrive during an fsync
+    form the next group. Without a log_path the log goes to a fresh temp directory.
+    """
+
+    _STOP = None
+
+    def __init__(self, accounts: Dict[str, Account], log_path: Optional[str] = None,
+                 batch_window_seconds: float = 0.001, max_batch: int = 512, fsync: bool = True):
+        if log_path is None:
+            log_path = os.path.join(tempfile.mkdtemp(prefix="leader-log-"), "payments.log")
+        self.accounts = accounts
+        self.batch_window_seconds = batch_window_seconds
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.stats = {"payments": 0, "batches": 0}
+        self._log = open(log_path, "ab", buffering=0)
+        # Set when a failed batch could not be truncated away: the log tail is no longer trustworthy
+        self._failed: Optional[BaseException] = None
+        self._requests: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="LEADER-WRITER", daemon=True)
+        self._writer.start()
+
+    def submit(self, user_id: str, amount: float) -> Future:
+        """Future resolving to (new balance, new version) once the payment is durable"""
+        future = Future()
+        self._requests.put((user_id, amount, future))
+        return future
+
+    def pay(self, user_id: str, amount: float) -> Tuple[float, int]:
+        return self.submit(user_id, amount).result()
+
+    def close(self):
+        self._requests.put(self._STOP)
+        self._writer.join()
+        self._log.close()
+
+    def _collect(self) -> Tuple[list, bool]:
+        first = self._requests.get()
+        if first is self._STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window_seconds
+        while len(batch) < self.max_batch:
+            # Linger until the window closes; a full batch commits without waiting it out
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is self._STOP:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if not batch:
+                continue
+            try:
+                self._commit(batch)
+            except Exception as exc:
+                # Never let one bad batch kill the writer: fail its callers and keep serving
+                self._fail(batch, exc)
+
+    @staticmethod
+    def _fail(batch: list, exc: BaseException):
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _commit(self, batch: list):
+        if self._failed is not None:
+            self._fail(batch, self._failed)
+            return
+
+        # 1. Apply in arrival order on a private overlay: nothing is visible before the fsync
+        pending: Dict[str, Tuple[float, int]] = {}
+        records, results = [], []
+        for user_id, amount, future in batch:
+            account = self.accounts.get(user_id)
+            if account is None:
+                future.set_exception(KeyError(user_id))
+                results.append(None)
+                continue
+            balance, version = pending.get(user_id, (account.balance, account.version))
+            balance, version = balance - amount, version + 1
+            pending[user_id] = (balance, version)
+            records.append(encode_record(user_id, amount, balance, version))
+            results.append((balance, version))
+
+        # 2. One write and one fsync for the whole group
+        start = os.fstat(self._log.fileno()).st_size
+        try:
+            self._log.write(b"".join(records))
+            if self.fsync:
+                os.fsync(self._log.fileno())
+        except OSError as exc:
+            # Replay must not see a group whose callers were told it failed
+            try:
+                os.ftruncate(self._log.fileno(), start)
+            except OSError:
+                self._failed = exc
+            self._fail(batch, exc)
+            return
+
+        # 3. Publish and answer the callers
+        for user_id, (balance, version) in pending.items():
+            account = self.accounts[user_id]
+            account.balance, account.version = balance, version
+        for (_, _, future), result in zip(batch, results):
+            if result is not None:
+                future.set_result(result)
+        self.stats["payments"] += len(records)
+        self.stats["batches"] += 1
+
+
+def run_benchmark(leader, accounts: Dict[str, Account], threads: int, payments_per_thread: int) -> dict:
+    latencies: List[float] = []
+    lock = threading.Lock()
+    user_ids = list(accounts)
+
+    def client(seed: int):
+        own = []
+        for n in range(payments_per_thread):
+            started = time.perf_counter()
+            leader.pay(user_ids[(seed * 7919 + n) % len(user_ids)], 1.0)
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+
+    workers = [threading.Thread(target=client, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "payments_per_sec": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Leader write path benchmark")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--payments", type=int, default=200, help="payments per thread")
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args()
+
+    total = args.threads * args.payments
+    print(f"{args.threads} threads x {args.payments} payments over {args.accounts} accounts"
+          f"{'' if not args.no_fsync else ' (no fsync)'}")
+    configs: List[Tuple[str, Optional[float]]] = [("unbatched", None)] + [
+        (f"group commit, {window * 1000:g}ms window", window) for window in (0.0, 0.001, 0.005)
+    ]
+    for label, window in configs:
+        accounts = {f"user_{i}": Account(f"user_{i}", 1_000_000.0) for i in range(args.accounts)}
+        log_path = os.path.join(tempfile.mkdtemp(prefix="leader-log-"), "payments.log")
+        if window is None:
+            leader = UnbatchedLeader(accounts, log_path, fsync=not args.no_fsync)
+        else:
+            leader = LeaderWriteEngine(accounts, log_path, batch_window_seconds=window, fsync=not args.no_fsync)
+        result = run_benchmark(leader, accounts, args.threads, args.payments)
+        batches = getattr(leader, "stats", {}).get("batches")
+        leader.close()
+
+        # No lost updates, and the log replays to the same balances
+        assert sum(a.version for a in accounts.values()) == total
+        replayed = {user_id: balance for user_id, _, balance, _ in read_log(log_path)}
+        assert all(accounts[u].balance == b for u, b in replayed.items()) and len(read_log(log_path)) == total
+        print(f"  {label:<28} {result['payments_per_sec']:>9.0f} payments/sec  "
+              f"p50 {result['p50_ms']:6.2f}ms  p99 {result['p99_ms']:6.2f}ms"
+              f"{f'  ({total / batches:.1f} payments per fsync)' if batches else ''}")
@@ -1,8 +1,19 @@
+import sys
 import time
 import random
 import logging
+import argparse
+import threading
+from pathlib import Path
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared packages at the repo root
+from payment_metrics import metrics
+from payment_models import Account
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # leader_write_engine.py sits next to the demos
+from leader_write_engine import LeaderWriteEngine
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s: %(message)s', 
@@ -11,31 +22,157 @@ logger_user = logging.getLogger("USER-ACTION")
 logger_leader = logging.getLogger("LEADER-DB")
 logger_follower = logging.getLogger("FOLLOWER-DB")
 logger_app = logging.getLogger("APP-LOGIC")
+# Per-read lines go through sampling (PAYMENT_LOG_SAMPLE_EVERY)
+read_log = metrics.sampled(logger_follower)
 
 @dataclass
-class Account:
+class ChangeLogEntry:
+    """One committed write on the Leader, as shipped to Followers"""
+    version: int  # Account version after the write
     user_id: str
     balance: float
-    version: int = 0  # Track version for demonstration purposes
+    committed_at: float  # time.monotonic() on the Leader
 
-# Mock Database: Leader and Followers
-leader_db: Dict[str, Account] = {}
-follower_db_1: Dict[str, Account] = {}
-follower_db_2: Dict[str, Account] = {}
+class ChangeLog:
+    """
+    Leader-side replication log (like a WAL / binlog).
+    Position N is the N-th write since startup. Entries every Follower has applied
+    can be truncated, so the log only holds the replication backlog.
+    """
+    
+    def __init__(self):
+        self.entries: List[ChangeLogEntry] = []
+        self.base_position = 0  # Position of entries[0]
+        self.changed = threading.Condition()
+    
+    @property
+    def end_position(self) -> int:
+        return self.base_position + len(self.entries)
+    
+    def append(self, account: Account) -> int:
+        with self.changed:
+            self.entries.append(ChangeLogEntry(account.version, account.user_id, account.balance, time.monotonic()))
+            self.changed.notify_all()
+            return self.end_position
+    
+    def read(self, from_position: int, max_entries: int = 10_000) -> List[ChangeLogEntry]:
+        with self.changed:
+            start = from_position - self.base_position
+            if start < 0:
+                raise ValueError(f"Position {from_position} was truncated (log starts at {self.base_position})")
+            return self.entries[start:start + max_entries]
+    
+    def truncate(self, through_position: int):
+        """Drops entries before through_position (the slowest Follower's applied position)"""
+        with self.changed:
+            drop = min(through_position, self.end_position) - self.base_position
+            if drop > 0:
+                del self.entries[:drop]
+                self.base_position += drop
+
+class Follower:
+    """
+    A read replica that applies the Leader's change log after `lag_seconds`.
+    Each change costs O(1) per Follower: no full copies of the account table.
+    """
+    
+    def __init__(self, name: str, log: "ChangeLog", lag_seconds: float = 0.0):
+        self.name = name
+        self.log = log
+        self.lag_seconds = lag_seconds
+        self.db: Dict[str, Account] = {}
+        self.applied_position = log.base_position  # Everything before this is visible here
+    
+    def catch_up(self, now: Optional[float] = None, ignore_lag: bool = False) -> int:
+        """Applies every entry that is at least lag_seconds old; returns how many"""
+        visible_before = (time.monotonic() if now is None else now) - self.lag_seconds
+        applied = 0
+        while True:
+            batch = self.log.read(self.applied_position)
+            for entry in batch:
+                if not ignore_lag and entry.committed_at > visible_before:
+                    return applied
+                account = self.db.get(entry.user_id)
+                if account is None:
+                    self.db[entry.user_id] = Account(entry.user_id, entry.balance, entry.version)
+                else:
+                    account.balance, account.version = entry.balance, entry.version
+                self.applied_position += 1
+                applied += 1
+            if not batch:
+                return applied
+    
+    def next_due(self) -> Optional[float]:
+        """When the next unapplied entry becomes visible here, or None if caught up"""
+        pending = self.log.read(self.applied_position, max_entries=1)
+        return pending[0].committed_at + self.lag_seconds if pending else None
+
+class ReplicationPump:
+    """
+    Background thread that ships the change log to every Follower.
+    Sleeps until a write arrives or the oldest pending entry is due, then truncates
+    whatever all Followers have applied.
+    """
+    
+    def __init__(self, log: ChangeLog, followers: List[Follower]):
+        self.log = log
+        self.followers = followers
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="REPLICATION", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        with self.log.changed:
+            self._stopping = True
+            self.log.changed.notify_all()
+        self._thread.join()
+    
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            for follower in self.followers:
+                follower.catch_up(now)
+            self.log.truncate(min(f.applied_position for f in self.followers))
+            with self.log.changed:
+                if self._stopping:
+                    return
+                # Checked under the lock: a write appended after this point waits for
+                # wait() to release it, so its notify cannot be lost
+                due = [d for d in (f.next_due() for f in self.followers) if d is not None]
+                if due:
+                    self.log.changed.wait(max(0.0, min(due) - time.monotonic()))
+                else:
+                    self.log.changed.wait_for(lambda: self._stopping or any(
+                        f.applied_position < self.log.end_position for f in self.followers))
 
 # Track replication lag (simulated)
 REPLICATION_LAG_MS = random.randint(100, 500)  # Typical replication lag
 
+# Mock Database: Leader and Followers
+leader_db: Dict[str, Account] = {}
+leader_writes = LeaderWriteEngine(leader_db)
+change_log = ChangeLog()
+followers = [
+    Follower("Follower-1", change_log, lag_seconds=REPLICATION_LAG_MS / 1000.0),
+    Follower("Follower-2", change_log, lag_seconds=REPLICATION_LAG_MS / 1000.0),
+]
+follower_db_1 = followers[0].db
+follower_db_2 = followers[1].db
+
 def initialize_user(user_id: str, initial_balance: float):
     """Initialize a user account in all databases."""
     account = Account(user_id=user_id, balance=initial_balance, version=1)
     
     # Write to leader
     leader_db[user_id] = account
+    change_log.append(account)
     
     # Replicate to followers (simulating they're already in sync initially)
-    follower_db_1[user_id] = Account(user_id=user_id, balance=initial_balance, version=1)
-    follower_db_2[user_id] = Account(user_id=user_id, balance=initial_balance, version=1)
+    for follower in followers:
+        follower.catch_up(ignore_lag=True)
     
     logger_leader.info(f"Initialized {user_id} with balance ${initial_balance}")
 
@@ -46,11 +183,11 @@ def write_payment(user_id: str, payment_amount: float):
     """
     logger_user.info(f"🔵 User clicks 'Pay ${payment_amount}' button")
     
-    # Write always goes to Leader
+    # Write always goes to Leader, group-committed to its log before it is replicated
     account = leader_db[user_id]
     old_balance = account.balance
-    account.balance -= payment_amount
-    account.version += 1
+    leader_writes.pay(user_id, payment_amount)
+    change_log.append(account)
     
     logger_leader.info(f"✅ WRITE completed: {user_id} balance ${old_balance} → ${account.balance} (v{account.version})")
     
@@ -62,34 +199,30 @@ def replicate_to_followers():
     """
     Simulate asynchronous replication from Leader to Followers.
     This happens with a lag (100-500ms in our simulation).
+    Followers apply only the change log entries written since their applied position.
     """
     time.sleep(REPLICATION_LAG_MS / 1000.0)  # Convert ms to seconds
     
-    for user_id, leader_account in leader_db.items():
-        follower_db_1[user_id] = Account(
-            user_id=leader_account.user_id,
-            balance=leader_account.balance,
-            version=leader_account.version
-        )
-        follower_db_2[user_id] = Account(
-            user_id=leader_account.user_id,
-            balance=leader_account.balance,
-            version=leader_account.version
-        )
+    for follower in followers:
+        applied = follower.catch_up()
+        logger_follower.info(f"⚡ {follower.name} applied {applied} change(s), now at log position {follower.applied_position}")
+    change_log.truncate(min(f.applied_position for f in followers))
     
     logger_follower.info(f"⚡ Replication completed (after {REPLICATION_LAG_MS}ms lag)")
 
+@metrics.timed("reads.random_follower")
 def read_balance_from_follower(user_id: str) -> float:
     """
     Read balance from a random Follower (to distribute read load).
     This is the PROBLEM: might return stale data!
     """
     # Randomly pick a follower
-    follower = random.choice([follower_db_1, follower_db_2])
-    follower_name = "Follower-1" if follower is follower_db_1 else "Follower-2"
+    follower = random.choice(followers)
     
-    account = follower[user_id]
-    logger_follower.info(f"📖 READ from {follower_name}: {user_id} balance ${account.balance} (v{account.version})")
+    account = follower.db[user_id]
+    read_log.info("📖 READ from %s (log position %s): %s balance $%s (v%s)",
+                  follower.name, follower.applied_position, user_id, account.balance, account.version)
+    metrics.count("reads.random_follower.follower")
     
     return account.balance
 
@@ -154,7 +287,57 @@ def user_journey():
     print(f"  • Risk: User might submit duplicate payment!")
     print("="*80 + "\n")
 
+def replication_at_scale(accounts: int, follower_count: int, writes: int, lag_ms: float):
+    """
+    Replicates `writes` payments across `accounts` accounts to `follower_count`
+    Followers through the change log, and compares the work with full copies.
+    """
+    log = ChangeLog()
+    replicas = [Follower(f"Follower-{i + 1}", log, lag_seconds=random.uniform(0, lag_ms) / 1000.0)
+                for i in range(follower_count)]
+    leader: Dict[str, Account] = {}
+    for i in range(accounts):
+        leader[f"user_{i}"] = account = Account(f"user_{i}", 1000.0, version=1)
+        log.append(account)
+    for replica in replicas:
+        replica.catch_up(ignore_lag=True)
+    log.truncate(log.end_position)
+    
+    pump = ReplicationPump(log, replicas)
+    pump.start()
+    started = time.perf_counter()
+    user_ids = list(leader)
+    for _ in range(writes):
+        account = leader[random.choice(user_ids)]
+        account.balance -= 1.0
+        account.version += 1
+        log.append(account)
+    writes_done = time.perf_counter() - started
+    
+    while min(r.applied_position for r in replicas) < log.end_position:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    pump.stop()
+    
+    assert all(r.db[uid].balance == leader[uid].balance for r in replicas for uid in user_ids)
+    print(f"{accounts:,} accounts, {follower_count} followers, {writes:,} writes (lag up to {lag_ms}ms)")
+    print(f"  writes took {writes_done:.3f}s, all followers caught up after {elapsed:.3f}s")
+    print(f"  applied {writes * follower_count:,} deltas; full copies would move {accounts * follower_count * writes:,} rows")
+    print(f"  log entries left after truncation: {len(log.entries)} (positions: {[r.applied_position for r in replicas[:4]]}...)")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Leader/Follower read-after-write demo")
+    parser.add_argument("--scale", action="store_true", help="run the change log replication at scale instead")
+    parser.add_argument("--accounts", type=int, default=200_000)
+    parser.add_argument("--followers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=100_000)
+    parser.add_argument("--lag-ms", type=float, default=REPLICATION_LAG_MS)
+    args = parser.parse_args()
+    
+    if args.scale:
+        replication_at_scale(args.accounts, args.followers, args.writes, args.lag_ms)
+        raise SystemExit
+    
     # Run the demonstration
     user_journey()
     
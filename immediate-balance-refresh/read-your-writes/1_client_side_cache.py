@@ -1,11 +1,18 @@
+import sys
+import random
+import argparse
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
 from dataclasses import dataclass
-from typing import Dict
+from typing import Deque, Dict, Optional, Tuple
 
-@dataclass
-class Account:
-    user_id: str
-    balance: float
-    version: int = 0
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared packages at the repo root
+from payment_metrics import metrics
+from payment_models import Account
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # leader_write_engine.py sits next to the demos
+from leader_write_engine import LeaderWriteEngine
 
 class PaymentAPIResponse:
     def __init__(self, success: bool, new_balance: float, version: int):
@@ -13,23 +20,96 @@ class PaymentAPIResponse:
         self.new_balance = new_balance
         self.version = version
 
+@dataclass
+class UserSession:
+    user_id: str
+    last_write_version: Optional[int] = None
+
+class BalanceCache:
+    """
+    Server-side cache of (balance, version) per user, shared by every device and page.
+    A read is a hit only if the cached version is at least the version the caller
+    needs, so a hit is never older than the user's own last write.
+    Least recently used entries are evicted beyond `capacity`.
+    """
+    
+    def __init__(self, capacity: int = 100_000):
+        self.capacity = capacity
+        self._entries: OrderedDict[str, Tuple[float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0}
+    
+    def get(self, user_id: str, min_version: Optional[int] = None) -> Optional[float]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if min_version is not None and entry[1] < min_version:
+                self.stats["stale"] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return entry[0]
+    
+    def put(self, user_id: str, balance: float, version: int):
+        """Never replaces a newer entry with an older one (e.g. a slow follower read)"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > version:
+                return
+            self._entries[user_id] = (balance, version)
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+    
+    def invalidate(self, user_id: str, version: int):
+        """Replication reports `version` was committed: drop anything older"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] < version:
+                del self._entries[user_id]
+                self.stats["invalidations"] += 1
+    
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["stale"]
+            # Dict slots plus each key and (balance, version) tuple
+            memory = sys.getsizeof(self._entries) + sum(
+                sys.getsizeof(k) + sys.getsizeof(v) + sys.getsizeof(v[0]) + sys.getsizeof(v[1])
+                for k, v in self._entries.items()
+            )
+            return dict(self.stats, entries=len(self._entries), approx_bytes=memory,
+                        hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
+
 leader_db: Dict[str, Account] = {}
+leader_writes = LeaderWriteEngine(leader_db)
 follower_db: Dict[str, Account] = {}
+user_sessions: Dict[str, UserSession] = {}
+balance_cache = BalanceCache()
+# Replication change stream: (user_id, balance, version) committed on the Leader, not yet on the Follower
+change_stream: Deque[Tuple[str, float, int]] = deque()
+db_reads = {"leader": 0, "follower": 0}
 
 def make_payment(user_id: str, payment_amount: float) -> PaymentAPIResponse:
     """
     When payment succeeds, return the updated balance in the API response.
     Cache it on the client side and display it immediately without another database query.
     """
-    account = leader_db[user_id]
-    account.balance -= payment_amount
-    account.version += 1
+    # Durable (group-committed) before the balance is cached or returned
+    balance, version = leader_writes.pay(user_id, payment_amount)
+    
+    # Write through to the shared cache, so other devices see it without a DB read
+    balance_cache.put(user_id, balance, version)
+    user_sessions.setdefault(user_id, UserSession(user_id)).last_write_version = version
+    change_stream.append((user_id, balance, version))
     
     # Return the new balance in API response for immediate client display
     return PaymentAPIResponse(
         success=True, 
-        new_balance=account.balance, 
-        version=account.version
+        new_balance=balance, 
+        version=version
     )
 
 def display_balance_from_cache(cached_response: PaymentAPIResponse) -> float:
@@ -39,4 +119,68 @@ def display_balance_from_cache(cached_response: PaymentAPIResponse) -> float:
     """
     return cached_response.new_balance
 
+def replicate_changes():
+    """Applies the change stream to the Follower and invalidates older cache entries"""
+    while change_stream:
+        user_id, balance, version = change_stream.popleft()
+        follower_db[user_id] = Account(user_id, balance, version)
+        balance_cache.invalidate(user_id, version)
 
+@metrics.timed("reads.client_cache")
+def read_balance(user_id: str) -> float:
+    """
+    Any device or page reload: serve from the cache when it has at least the
+    session's last written version, otherwise read through the databases.
+    """
+    session = user_sessions.get(user_id)
+    required_version = session.last_write_version if session else None
+    
+    balance = balance_cache.get(user_id, required_version)
+    if balance is not None:
+        metrics.count("reads.client_cache.cache")
+        return balance
+    
+    account = follower_db[user_id]
+    db_reads["follower"] += 1
+    metrics.count("reads.client_cache.follower")
+    if required_version is not None and account.version < required_version:
+        # Follower is behind the user's own write - go to the Leader
+        account = leader_db[user_id]
+        db_reads["leader"] += 1
+        metrics.count("reads.client_cache.leader")
+    balance_cache.put(user_id, account.balance, account.version)
+    return account.balance
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dashboard read storm through the balance cache")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--capacity", type=int, default=20_000)
+    parser.add_argument("--reads", type=int, default=1_000_000)
+    parser.add_argument("--payments", type=int, default=20_000)
+    parser.add_argument("--hot-share", type=float, default=0.1, help="share of users producing most reads")
+    args = parser.parse_args()
+    
+    balance_cache = BalanceCache(args.capacity)
+    for i in range(args.users):
+        leader_db[f"user_{i}"] = Account(f"user_{i}", 1000.0, 1)
+        follower_db[f"user_{i}"] = Account(f"user_{i}", 1000.0, 1)
+    
+    rng = random.Random(7)
+    hot_users = max(1, int(args.users * args.hot_share))
+    payment_every = max(1, args.reads // args.payments)
+    for n in range(args.reads):
+        # Skewed storm: 90% of reads hit the hot users (e.g. everyone refreshing after payday)
+        user_id = f"user_{rng.randrange(hot_users) if rng.random() < 0.9 else rng.randrange(args.users)}"
+        if n % payment_every == 0:
+            make_payment(user_id, 1.0)
+            if rng.random() < 0.5:
+                replicate_changes()
+        assert read_balance(user_id) == leader_db[user_id].balance
+    
+    cache_stats = balance_cache.metrics()
+    print(f"{args.reads:,} reads, {args.payments:,} payments over {args.users:,} users (cache capacity {args.capacity:,})")
+    print(f"  hit rate {cache_stats['hit_rate']:.1%}  hits {cache_stats['hits']:,}  misses {cache_stats['misses']:,}  "
+          f"stale {cache_stats['stale']:,}  evictions {cache_stats['evictions']:,}  invalidations {cache_stats['invalidations']:,}")
+    print(f"  DB reads: follower {db_reads['follower']:,}  leader {db_reads['leader']:,}")
+    print(f"  cache: {cache_stats['entries']:,} entries, ~{cache_stats['approx_bytes'] / 2**20:.1f} MiB "
+          f"({cache_stats['approx_bytes'] / max(1, cache_stats['entries']):.0f} bytes/entry)")
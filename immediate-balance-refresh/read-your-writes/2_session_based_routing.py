@@ -1,56 +1,257 @@
+import sys
+import abc
 import time
-from dataclasses import dataclass
-from typing import Dict, Optional
-from datetime import datetime, timedelta
-
-@dataclass
-class Account:
-    user_id: str
-    balance: float
-    version: int = 0
-
-@dataclass
-class UserSession:
-    user_id: str
-    last_write_time: Optional[datetime] = None
-    last_write_version: Optional[int] = None
+import random
+import argparse
+import threading
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from datetime import datetime
 
-leader_db: Dict[str, Account] = {}
-follower_db: Dict[str, Account] = {}
-user_sessions: Dict[str, UserSession] = {}
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared packages at the repo root
+from payment_metrics import metrics
+from payment_models import Account
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # leader_write_engine.py sits next to the demos
+from leader_write_engine import LeaderWriteEngine
 
 SESSION_STICKINESS_SECONDS = 5
 
+class SessionBackend(abc.ABC):
+    """
+    Key/value interface with per-key expiry (the subset of Redis SET ... EX / GET we need).
+    Swap in a networked store by implementing these methods.
+    """
+    
+    @abc.abstractmethod
+    def set(self, key: str, value: int, ttl_seconds: float):
+        ...
+    
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[int]:
+        """The value, or None if it was never set or has expired"""
+    
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Entries currently resident (expired ones may linger until swept)"""
+
+class ShardedTTLBackend(SessionBackend):
+    """
+    In-process store split into lock-striped shards by key hash, so threads touching
+    different users rarely contend. Each shard keeps keys in expiry order
+    (TTLs are uniform here), so expired sessions are swept from the front in
+    amortized O(1) on every write. Each write also sweeps one other shard in
+    round-robin order, so shards that stopped receiving writes drain too and
+    only recently written sessions stay resident.
+    """
+    
+    def __init__(self, shards: int = 64, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock  # monotonic: immune to wall-clock jumps
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._next_sweep = 0  # A lost increment under contention only repeats a shard
+    
+    def set(self, key: str, value: int, ttl_seconds: float):
+        i = hash(key) % len(self._shards)
+        now = self.clock()
+        with self._locks[i]:
+            shard = self._shards[i]
+            shard.pop(key, None)
+            shard[key] = (now + ttl_seconds, value)
+            self._sweep(shard, now)
+        # One lock at a time: never hold two shard locks
+        j = self._next_sweep
+        self._next_sweep = (j + 1) % len(self._shards)
+        if j != i:
+            with self._locks[j]:
+                self._sweep(self._shards[j], now)
+    
+    @staticmethod
+    def _sweep(shard: OrderedDict, now: float):
+        while shard:
+            oldest_key, (expires_at, _) = next(iter(shard.items()))
+            if expires_at > now:
+                break
+            del shard[oldest_key]
+    
+    def get(self, key: str) -> Optional[int]:
+        i = hash(key) % len(self._shards)
+        with self._locks[i]:
+            entry = self._shards[i].get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._shards[i][key]
+                return None
+            return value
+    
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+class RedisLikeBackend(SessionBackend):
+    """
+    Local stand-in for a Redis server: one keyspace behind one lock (Redis runs
+    commands on a single thread), lazy expiry on GET, plus Redis-style active
+    expiry that samples a few keys with a TTL every `active_expire_every` writes.
+    """
+    
+    def __init__(self, clock: Callable[[], float] = time.monotonic, active_expire_every: int = 100,
+                 sample_size: int = 20):
+        self.clock = clock
+        self.active_expire_every = active_expire_every
+        self.sample_size = sample_size
+        self._data: Dict[str, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+    
+    def set(self, key: str, value: int, ttl_seconds: float):
+        now = self.clock()
+        with self._lock:
+            self._data.pop(key, None)  # Re-insert: dict order stays least recently written first
+            self._data[key] = (now + ttl_seconds, value)
+            self._writes += 1
+            if self._writes % self.active_expire_every == 0:
+                self._active_expire(now)
+    
+    def get(self, key: str) -> Optional[int]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._data[key]
+                return None
+            return entry[1]
+    
+    def _active_expire(self, now: float):
+        # Like Redis: keep sampling while more than a quarter of the sample was expired
+        while self._data:
+            keys = list(islice(self._data, self.sample_size))
+            expired = [k for k in keys if self._data[k][0] <= now]
+            for k in expired:
+                del self._data[k]
+            if len(expired) * 4 <= len(keys):
+                return
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+class SessionStore:
+    """
+    Remembers which users wrote within the stickiness window (and at which version).
+    A session is dropped by the backend once the window has passed.
+    """
+    
+    def __init__(self, backend: SessionBackend, stickiness_seconds: float = SESSION_STICKINESS_SECONDS):
+        self.backend = backend
+        self.stickiness_seconds = stickiness_seconds
+    
+    def record_write(self, user_id: str, version: int):
+        self.backend.set(user_id, version, self.stickiness_seconds)
+    
+    def last_write_version(self, user_id: str) -> Optional[int]:
+        """Version of the user's last write, if it is still within the stickiness window"""
+        return self.backend.get(user_id)
+    
+    def is_sticky(self, user_id: str) -> bool:
+        return self.backend.get(user_id) is not None
+
+leader_db: Dict[str, Account] = {}
+leader_writes = LeaderWriteEngine(leader_db)
+follower_db: Dict[str, Account] = {}
+session_store = SessionStore(ShardedTTLBackend())
+
 def make_payment(user_id: str, payment_amount: float) -> tuple[float, int]:
     """
-    Track the last write timestamp for each user session.
+    Track the last write for each user session.
     Updates session to enable smart routing for subsequent reads.
     """
-    account = leader_db[user_id]
-    account.balance -= payment_amount
-    account.version += 1
+    balance, version = leader_writes.pay(user_id, payment_amount)
     
-    # Update session with write timestamp
-    session = user_sessions[user_id]
-    session.last_write_time = datetime.now()
-    session.last_write_version = account.version
+    # Update session: it stays sticky to the Leader for SESSION_STICKINESS_SECONDS
+    session_store.record_write(user_id, version)
     
-    return account.balance, account.version
+    return balance, version
 
+@metrics.timed("reads.session_routing")
 def read_balance(user_id: str) -> float:
     """
     If a read request comes within X seconds of a write, route it to Leader.
     Otherwise, route to Follower for load balancing.
     """
-    session = user_sessions[user_id]
-    
-    if session.last_write_time:
-        time_since_write = (datetime.now() - session.last_write_time).total_seconds()
-        if time_since_write < SESSION_STICKINESS_SECONDS:
-            # Recent write detected - route to Leader for consistency
-            return leader_db[user_id].balance
+    if session_store.is_sticky(user_id):
+        # Recent write detected - route to Leader for consistency
+        metrics.count("reads.session_routing.leader")
+        return leader_db[user_id].balance
     
     # No recent write - route to Follower for load balancing
+    metrics.count("reads.session_routing.follower")
     return follower_db[user_id].balance
 
+# Benchmark: concurrent session traffic against each backend
 
+class GlobalDictBackend(SessionBackend):
+    """The original layout: one global dict of wall-clock write times behind one lock, never pruned"""
+    
+    def __init__(self):
+        self._data: Dict[str, tuple[datetime, int]] = {}
+        self._lock = threading.Lock()
+    
+    def set(self, key: str, value: int, ttl_seconds: float):
+        with self._lock:
+            self._data[key] = (datetime.now(), value)
+    
+    def get(self, key: str) -> Optional[int]:
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or (datetime.now() - entry[0]).total_seconds() >= SESSION_STICKINESS_SECONDS:
+            return None
+        return entry[1]
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+def drive(store: SessionStore, threads: int, ops_per_thread: int, users: int, write_share: float) -> float:
+    """Each thread mixes writes and reads over random users; returns ops/sec"""
+    def worker(seed: int):
+        rng = random.Random(seed)
+        for _ in range(ops_per_thread):
+            user_id = f"user_{rng.randrange(users)}"
+            if rng.random() < write_share:
+                store.record_write(user_id, 1)
+            else:
+                store.is_sticky(user_id)
+    
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * ops_per_thread / (time.perf_counter() - started)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Session store benchmark")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=100_000, help="operations per thread")
+    parser.add_argument("--users", type=int, default=10_000_000)
+    parser.add_argument("--write-share", type=float, default=0.2)
+    parser.add_argument("--stickiness", type=float, default=0.5, help="seconds (shortened for the benchmark)")
+    args = parser.parse_args()
+    
+    SESSION_STICKINESS_SECONDS = args.stickiness
+    backends = {
+        "global dict (datetime, no eviction)": GlobalDictBackend(),
+        "sharded TTL store": ShardedTTLBackend(),
+        "Redis-like stand-in": RedisLikeBackend(),
+    }
+    print(f"{args.threads} threads x {args.ops:,} ops over {args.users:,} users, "
+          f"{args.write_share:.0%} writes, {args.stickiness}s stickiness")
+    for name, backend in backends.items():
+        ops_per_sec = drive(SessionStore(backend, args.stickiness), args.threads, args.ops, args.users,
+                            args.write_share)
+        print(f"  {name:<36} {ops_per_sec:>10,.0f} ops/sec  {len(backend):>9,} sessions resident")
@@ -1,12 +1,17 @@
+import sys
+import time
+import threading
+from pathlib import Path
 from dataclasses import dataclass
 from typing import Dict, Optional
 from datetime import datetime
 
-@dataclass
-class Account:
-    user_id: str
-    balance: float
-    version: int = 0
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared packages at the repo root
+from payment_metrics import metrics
+from payment_models import Account
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # leader_write_engine.py sits next to the demos
+from leader_write_engine import LeaderWriteEngine
 
 @dataclass
 class UserSession:
@@ -15,44 +20,111 @@ class UserSession:
     last_write_version: Optional[int] = None
 
 leader_db: Dict[str, Account] = {}
+leader_writes = LeaderWriteEngine(leader_db)
 follower_db: Dict[str, Account] = {}
 user_sessions: Dict[str, UserSession] = {}
 
+# Upper bound a read waits for the Follower to catch up before going to the Leader (0 = never wait)
+READ_WAIT_TIMEOUT_SECONDS = 0.0
+
+# Guards follower_db. Waiting reads sleep on one of FOLLOWER_WAIT_STRIPES Conditions
+# picked by user id, so a replicated write wakes only that stripe's waiters and
+# the number of Conditions stays fixed however many users ever wait
+FOLLOWER_WAIT_STRIPES = 64
+follower_lock = threading.Lock()
+follower_applied = [threading.Condition(follower_lock) for _ in range(FOLLOWER_WAIT_STRIPES)]
+
+read_stats = {"follower_hits": 0, "waited_hits": 0, "leader_fallbacks": 0, "waits": 0, "wait_seconds": 0.0}
+read_stats_lock = threading.Lock()
+
 def make_payment(user_id: str, payment_amount: float) -> tuple[float, int]:
     """
     Tag each write with a monotonically increasing version number.
     Store the version in user session for subsequent read requests.
     """
-    account = leader_db[user_id]
-    account.balance -= payment_amount
-    account.version += 1
+    balance, version = leader_writes.pay(user_id, payment_amount)
     
     # Store version in session for read consistency checks
     session = user_sessions[user_id]
     session.last_write_time = datetime.now()
-    session.last_write_version = account.version
+    session.last_write_version = version
     
-    return account.balance, account.version
+    return balance, version
 
-def read_balance(user_id: str) -> float:
+def apply_replicated_write(user_id: str, balance: float, version: int):
+    """
+    Replication applies a Leader write on the Follower and wakes up reads waiting for it.
+    Versions only move forward: a late, older write is ignored.
+    """
+    with follower_lock:
+        account = follower_db.get(user_id)
+        if account is None:
+            follower_db[user_id] = Account(user_id, balance, version)
+        elif version > account.version:
+            account.balance, account.version = balance, version
+        # Waiters on other users in the stripe re-check their version and sleep again
+        follower_applied[hash(user_id) % FOLLOWER_WAIT_STRIPES].notify_all()
+
+@metrics.timed("reads.version_check")
+def read_balance(user_id: str, max_wait_seconds: Optional[float] = None) -> float:
     """
     On read, check if Follower has caught up to the required version.
     If not, either wait briefly or route to Leader.
+    With max_wait_seconds > 0 the read blocks (without polling) until the Follower
+    reaches the version or the bound expires, then falls back to the Leader.
+    None means the current READ_WAIT_TIMEOUT_SECONDS, so tuning it takes effect at once.
     """
+    if max_wait_seconds is None:
+        max_wait_seconds = READ_WAIT_TIMEOUT_SECONDS
     session = user_sessions[user_id]
     required_version = session.last_write_version
     
     if required_version is None:
         # No writes yet - can safely use Follower
+        _count("follower_hits")
         return follower_db[user_id].balance
     
     follower_account = follower_db[user_id]
     
     if follower_account.version >= required_version:
         # Follower has caught up - use it for load balancing
+        _count("follower_hits")
         return follower_account.balance
+    
+    if max_wait_seconds > 0:
+        # Follower is behind - give replication a bounded chance to catch up
+        started = time.monotonic()
+        with follower_lock:
+            waiters = follower_applied[hash(user_id) % FOLLOWER_WAIT_STRIPES]
+            caught_up = waiters.wait_for(
+                lambda: follower_db[user_id].version >= required_version, max_wait_seconds
+            )
+            balance = follower_db[user_id].balance
+        _count("waited_hits" if caught_up else "leader_fallbacks", time.monotonic() - started)
+        if caught_up:
+            return balance
     else:
-        # Follower is behind - route to Leader for consistency
-        return leader_db[user_id].balance
+        _count("leader_fallbacks")
+    
+    # Follower is behind - route to Leader for consistency
+    return leader_db[user_id].balance
 
+def _count(outcome: str, waited_seconds: Optional[float] = None):
+    metrics.count(f"reads.version_check.{outcome}")
+    with read_stats_lock:
+        read_stats[outcome] += 1
+        if waited_seconds is not None:
+            read_stats["waits"] += 1
+            read_stats["wait_seconds"] += waited_seconds
 
+def read_stats_summary() -> dict:
+    """Rates for tuning READ_WAIT_TIMEOUT_SECONDS against Leader read load"""
+    with read_stats_lock:
+        stats = dict(read_stats)
+    reads = stats["follower_hits"] + stats["waited_hits"] + stats["leader_fallbacks"]
+    return {
+        "reads": reads,
+        "follower_hit_rate": (stats["follower_hits"] + stats["waited_hits"]) / reads if reads else 0.0,
+        "leader_fallback_rate": stats["leader_fallbacks"] / reads if reads else 0.0,
+        "avg_wait_ms": stats["wait_seconds"] * 1000 / stats["waits"] if stats["waits"] else 0.0,
+    }
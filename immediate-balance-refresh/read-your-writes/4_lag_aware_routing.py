@@ -0,0 +1,207 @@
+import sys
+import heapq
+import random
+import argparse
+import threading
+from bisect import bisect_right
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared packages at the repo root
+from payment_metrics import metrics
+from payment_models import Account
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # leader_write_engine.py sits next to the demos
+from leader_write_engine import LeaderWriteEngine
+
+@dataclass
+class UserSession:
+    user_id: str
+    last_write_version: Optional[int] = None  # Leader log position of the user's last write
+
+@dataclass
+class FollowerReplica:
+    name: str
+    db: Dict[str, Account] = field(default_factory=dict)
+    applied_version: int = 0  # Leader log position replicated so far
+    in_flight: int = 0        # Reads currently being served
+
+class FollowerRouter:
+    """
+    Picks a Follower for each read instead of random.choice.
+    Only Followers whose applied version covers the caller's last write are eligible;
+    among those it samples two and takes the one with fewer reads in flight
+    (power of two choices). The Leader serves the read only when no Follower qualifies.
+    """
+
+    def __init__(self, followers: List[FollowerReplica], probes: int = 4, rng: Optional[random.Random] = None):
+        self.followers = followers
+        self.probes = probes  # Random Followers sampled before falling back to a full scan
+        self.rng = rng or random.Random()
+        self.lock = threading.Lock()
+        self.stats = {"follower_reads": 0, "leader_reads": 0}
+
+    def update_applied(self, follower: FollowerReplica, version: int):
+        """Replication heartbeat: the Follower reports how far it has applied"""
+        with self.lock:
+            follower.applied_version = max(follower.applied_version, version)
+
+    def acquire(self, required_version: Optional[int] = None) -> Optional[FollowerReplica]:
+        """Returns the Follower to read from (call release() when done), or None for the Leader"""
+        required = required_version or 0
+        with self.lock:
+            sample = self.rng.sample(self.followers, min(self.probes, len(self.followers)))
+            eligible = [f for f in sample if f.applied_version >= required]
+            if not eligible:
+                # Every probe lags: most Followers are behind, look at all of them
+                eligible = [f for f in self.followers if f.applied_version >= required]
+            if not eligible:
+                self.stats["leader_reads"] += 1
+                return None
+            if len(eligible) > 2:
+                eligible = self.rng.sample(eligible, 2)
+            chosen = min(eligible, key=lambda f: f.in_flight)
+            chosen.in_flight += 1
+            self.stats["follower_reads"] += 1
+            return chosen
+
+    def release(self, follower: Optional[FollowerReplica]):
+        if follower is not None:
+            with self.lock:
+                follower.in_flight -= 1
+
+leader_db: Dict[str, Account] = {}
+leader_writes = LeaderWriteEngine(leader_db)
+leader_version = 0  # Leader log position: one per committed write
+followers: List[FollowerReplica] = [FollowerReplica(f"Follower-{i + 1}") for i in range(3)]
+router = FollowerRouter(followers)
+user_sessions: Dict[str, UserSession] = {}
+
+def make_payment(user_id: str, payment_amount: float) -> tuple[float, int]:
+    """
+    Tag each write with the Leader's log position.
+    Store it in the user session so reads can ask for a Follower that has it.
+    """
+    global leader_version
+    balance, _ = leader_writes.pay(user_id, payment_amount)
+    leader_version += 1
+
+    user_sessions[user_id].last_write_version = leader_version
+    return balance, leader_version
+
+def apply_replicated_write(follower: FollowerReplica, user_id: str, balance: float, account_version: int,
+                           log_version: int):
+    """Replication applies one Leader write on a Follower and tells the router"""
+    follower.db[user_id] = Account(user_id, balance, account_version)
+    router.update_applied(follower, log_version)
+
+@metrics.timed("reads.lag_aware")
+def read_balance(user_id: str) -> float:
+    """
+    Route to the least-loaded Follower that has the user's last write.
+    Only if none has caught up, read from the Leader.
+    """
+    follower = router.acquire(user_sessions[user_id].last_write_version)
+    try:
+        if follower is None:
+            metrics.count("reads.lag_aware.leader")
+            return leader_db[user_id].balance
+        metrics.count("reads.lag_aware.follower")
+        return follower.db[user_id].balance
+    finally:
+        router.release(follower)
+
+# Simulation: leader read offload under different replication lag distributions
+
+LAG_PROFILES = {
+    "uniform 50-150ms": lambda rng, n: [rng.uniform(0.05, 0.15) for _ in range(n)],
+    "one laggard (2s)": lambda rng, n: [2.0] + [rng.uniform(0.02, 0.08) for _ in range(n - 1)],
+    "heavy tail": lambda rng, n: [min(5.0, rng.paretovariate(1.5) * 0.03) for _ in range(n)],
+    "all behind 1s": lambda rng, n: [rng.uniform(0.9, 1.1) for _ in range(n)],
+}
+
+def simulate(strategy: str, lags: List[float], reads: int, write_rate: float, read_rate: float,
+             read_after_write_share: float, redirect_seconds: float, service_seconds: float,
+             heartbeat_seconds: float, seed: int) -> dict:
+    """
+    Discrete-event simulation. Writes arrive at write_rate/sec; reads at read_rate/sec,
+    a share of them about redirect_seconds after the user's own write (the dashboard).
+    Follower i has applied every write older than lags[i]; the router learns that
+    through heartbeats every heartbeat_seconds, so its view is conservative.
+    """
+    rng = random.Random(seed)
+    replicas = [FollowerReplica(f"Follower-{i + 1}") for i in range(len(lags))]
+    sim_router = FollowerRouter(replicas, rng=random.Random(seed))
+
+    write_times: List[float] = []
+    finishing: List[tuple[float, int]] = []  # (finish time, follower index)
+    index = {id(f): i for i, f in enumerate(replicas)}
+    stale = peak = 0
+    now = next_write = next_heartbeat = 0.0
+
+    for _ in range(reads):
+        now += rng.expovariate(read_rate)
+        while next_write <= now:
+            write_times.append(next_write)
+            next_write += rng.expovariate(write_rate)
+        while next_heartbeat <= now:
+            for replica, lag in zip(replicas, lags):
+                sim_router.update_applied(replica, bisect_right(write_times, next_heartbeat - lag))
+            next_heartbeat += heartbeat_seconds
+        while finishing and finishing[0][0] <= now:
+            _, i = heapq.heappop(finishing)
+            sim_router.release(replicas[i])
+
+        # Reads after a redirect need the version of a write made just before; the rest need nothing
+        required = None
+        if rng.random() < read_after_write_share:
+            required = bisect_right(write_times, now - rng.expovariate(1 / redirect_seconds)) or None
+        if strategy == "router":
+            follower = sim_router.acquire(required)
+        else:
+            follower = rng.choice(replicas)
+            if strategy == "random + leader fallback" and required and follower.applied_version < required:
+                follower = None
+            if follower is None:
+                sim_router.stats["leader_reads"] += 1
+            else:
+                follower.in_flight += 1
+                sim_router.stats["follower_reads"] += 1
+        if follower is None:
+            continue
+
+        i = index[id(follower)]
+        truly_applied = bisect_right(write_times, now - lags[i])
+        stale += bool(required and truly_applied < required)
+        peak = max(peak, follower.in_flight)
+        heapq.heappush(finishing, (now + rng.expovariate(1 / service_seconds), i))
+
+    return {
+        "leader_share": sim_router.stats["leader_reads"] / reads,
+        "stale_reads": stale,
+        "peak_in_flight": peak,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lag-aware follower routing simulation")
+    parser.add_argument("--followers", type=int, default=8)
+    parser.add_argument("--reads", type=int, default=100_000)
+    parser.add_argument("--write-rate", type=float, default=500.0, help="writes per second")
+    parser.add_argument("--read-rate", type=float, default=5000.0, help="reads per second")
+    parser.add_argument("--read-after-write-share", type=float, default=0.3)
+    parser.add_argument("--redirect-ms", type=float, default=100.0, help="mean write -> dashboard read delay")
+    parser.add_argument("--service-ms", type=float, default=5.0)
+    parser.add_argument("--heartbeat-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for profile, make_lags in LAG_PROFILES.items():
+        lags = make_lags(random.Random(args.seed), args.followers)
+        print(f"{profile} (lags {min(lags) * 1000:.0f}-{max(lags) * 1000:.0f}ms)")
+        for strategy in ("random", "random + leader fallback", "router"):
+            result = simulate(strategy, lags, args.reads, args.write_rate, args.read_rate,
+                              args.read_after_write_share, args.redirect_ms / 1000, args.service_ms / 1000,
+                              args.heartbeat_ms / 1000, args.seed)
+            print(f"  {strategy:<25} leader reads {result['leader_share']:6.1%}  "
+                  f"stale reads {result['stale_reads']:>6}  peak in-flight per follower {result['peak_in_flight']}")
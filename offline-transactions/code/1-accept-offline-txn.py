@@ -1,25 +1,36 @@
 """Edge node - makes authorization decisions locally"""
+import sys
 import uuid
 from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import List
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
 
 from models import Card, Transaction, TransactionStatus, TerminalConfig
+from transaction_journal import TransactionJournal
+from velocity_limiter import VelocityLimiter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared payment_metrics package at the repo root
+from payment_metrics import metrics
 
 
 class EdgeTerminal:
     """Payment terminal operating at the edge (offline)"""
     
-    def __init__(self, config: TerminalConfig):
+    def __init__(self, config: TerminalConfig, blacklist=None, journal: Optional[TransactionJournal] = None):
         self.config = config
-        self.storage: List[Transaction] = []
-        self.velocity_tracker: dict[str, List[datetime]] = defaultdict(list)
+        # Any container of card numbers: config.blacklist, or a memory-mapped BlacklistIndex
+        self.blacklist = blacklist if blacklist is not None else config.blacklist
+        # In-memory list, or an on-disk journal that survives a reboot mid-flight
+        self.storage = journal if journal is not None else []
+        # Per-card 2-minute windows; idle cards are swept, total tracked cards capped
+        self.velocity_tracker = VelocityLimiter(config.velocity_limit, window_seconds=120)
     
+    @metrics.timed("offline.authorize")
     def authorize(self, card: Card, amount: float, seat: str) -> Transaction:
         """Make authorization decision at the edge"""
         
         transaction = Transaction(
-            id=str(uuid.uuid4()),
+            id=uuid.uuid4().bytes,
             card_number=card.number,
             amount=amount,
             timestamp=datetime.now(),
@@ -30,48 +41,60 @@ class EdgeTerminal:
         # Risk checks (order matters)
         if self._is_blacklisted(card.number):
             transaction.status = TransactionStatus.DECLINED
+            metrics.count("offline.declined.blacklist")
             return transaction
         
         if not self._check_velocity(card.number):
             transaction.status = TransactionStatus.DECLINED
+            metrics.count("offline.declined.velocity")
             return transaction
         
         if not card.can_transact_offline():
             transaction.status = TransactionStatus.DECLINED
+            metrics.count("offline.declined.offline_limit")
             return transaction
         
         if amount > self.config.floor_limit:
             transaction.status = TransactionStatus.DECLINED
+            metrics.count("offline.declined.floor_limit")
             return transaction
         
         # Approve and store
         transaction.status = TransactionStatus.APPROVED
         card.increment_counter()
         self.storage.append(transaction)
+        metrics.count("offline.approved")
         
         return transaction
     
     def _is_blacklisted(self, card_number: str) -> bool:
         """Check stolen/blocked cards"""
         """The blacklist is downloaded periodically from central system"""
-        return card_number in self.config.blacklist
+        return card_number in self.blacklist
+    
+    def run_idle_maintenance(self):
+        """Housekeeping kept off the authorize() path: call between passengers or after a sync"""
+        maybe_compact = getattr(self.blacklist, "maybe_compact", None)
+        if maybe_compact is not None:
+            maybe_compact()
     
     def _check_velocity(self, card_number: str) -> bool:
         """Detect suspicious transaction patterns"""
-        now = datetime.now()
-        
-        # Remove old entries (>2 minutes)
-        self.velocity_tracker[card_number] = [
-            t for t in self.velocity_tracker[card_number]
-            if (now - t).seconds < 120
-        ]
-        
-        if len(self.velocity_tracker[card_number]) >= self.config.velocity_limit:
-            return False
-        
-        self.velocity_tracker[card_number].append(now)
-        return True
+        return self.velocity_tracker.allow(card_number)
     
-    def get_pending_transactions(self) -> List[Transaction]:
+    def get_pending_transactions(self) -> Iterable[Transaction]:
         """Get transactions ready for sync"""
-        return [t for t in self.storage if t.status == TransactionStatus.PENDING_SYNC]
\ No newline at end of file
+        return (txn for _, txn in self.get_pending_with_offsets())
+    
+    def get_pending_with_offsets(self) -> Iterable[Tuple[int, Transaction]]:
+        """(offset, transaction) pairs: once the bank settles one, acknowledge_synced(offset + 1)"""
+        if isinstance(self.storage, TransactionJournal):
+            # Streams only the unacknowledged tail of the journal
+            return self.storage.iter_pending()
+        # authorize() stores approvals as APPROVED; sync marks them SYNCED (or DECLINED past the TTL)
+        return [(i, t) for i, t in enumerate(self.storage) if t.status == TransactionStatus.APPROVED]
+    
+    def acknowledge_synced(self, through_offset: int):
+        """Bank confirmed settlement: the journal can forget everything before through_offset"""
+        if isinstance(self.storage, TransactionJournal):
+            self.storage.acknowledge(through_offset)
\ No newline at end of file
@@ -1,8 +1,17 @@
 """Handles synchronization after reconnecting"""
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from typing import List
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
 
 from models import Transaction, TransactionStatus, TerminalConfig
+from sync_protocol import encode_chunk
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared payment_metrics package at the repo root
+from payment_metrics import metrics
 
 class SyncService:
     """Syncs offline transactions back to the bank"""
@@ -10,8 +19,10 @@ class SyncService:
     def __init__(self, config: TerminalConfig):
         self.config = config
     
-    def sync_transactions(self, transactions: List[Transaction], bank) -> dict:
+    @metrics.timed("offline.sync_transactions")
+    def sync_transactions(self, transactions: Iterable[Transaction], bank) -> dict:
         results = {"synced": 0, "expired": 0}
+        to_settle = []
         
         for txn in transactions:
             # TTL: check expiration
@@ -23,10 +34,135 @@ class SyncService:
             
             # Send to bank
             txn.status = TransactionStatus.SYNCED
+            to_settle.append(txn)
             results["synced"] += 1
         
-        # Submit batch to bank
-        bank_results = bank.settle_batch([t for t in transactions if t.status == TransactionStatus.SYNCED])
+        # Submit batch to bank (collected in one pass, so a streamed journal read works too)
+        bank_results = bank.settle_batch(to_settle)
         results.update(bank_results)
+        metrics.count("offline.sync.synced", results["synced"])
+        metrics.count("offline.sync.expired", results["expired"])
+        
+        return results
+    
+    def sync_streaming(self, transactions: Iterable[Transaction], link, terminal_id: str, upload_id: str,
+                       chunk_size: int = 500, max_in_flight: int = 4, max_reconnects: int = 20,
+                       reconnect_backoff_seconds: float = 0.05) -> dict:
+        """
+        Streaming upload for flaky ground connections.
+        Sends compressed chunks of at most chunk_size transactions, keeps up to
+        max_in_flight chunks in the air, and after a disconnect resends only the
+        chunks the bank has not acknowledged. Chunk numbers follow input positions,
+        so a restarted upload with the same input skips everything below the
+        bank's watermark. The bank pins chunk_size per upload_id and rejects a resume
+        with a different one (ValueError), since chunk numbers would then point elsewhere.
+        """
+        results = {"synced": 0, "expired": 0, "settled": 0, "duplicates": 0, "rejected": 0}
+        sync_stats = {"chunks": 0, "retransmits": 0, "disconnects": 0, "raw_bytes": 0, "compressed_bytes": 0,
+                      "wire_bytes": 0}
+        started = time.perf_counter()
+        
+        # Resume point: chunks up to the watermark reached the bank in an earlier session
+        watermark = link.watermark(terminal_id, upload_id, chunk_size)
+        chunks = self._iter_chunks(transactions, chunk_size, watermark, results)
+        unacked: dict[int, bytes] = {}
+        next_seq = watermark + 1
+        reconnects = 0
         
-        return results
\ No newline at end of file
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            in_flight = {}
+            
+            def send(seq: int):
+                # Every ack below read_through has been read: the bank can drop those results
+                read_through = (min(unacked) if unacked else next_seq) - 1
+                in_flight[pool.submit(link.send_chunk, terminal_id, upload_id, chunk_size, seq,
+                                      unacked[seq], read_through)] = seq
+                sync_stats["wire_bytes"] += len(unacked[seq])
+            
+            exhausted = False
+            while True:
+                # 1. Keep the pipeline full
+                while not exhausted and len(in_flight) < max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    seq, payload, raw_size = chunk
+                    unacked[seq] = payload
+                    next_seq = seq + 1
+                    sync_stats["chunks"] += 1
+                    sync_stats["raw_bytes"] += raw_size
+                    sync_stats["compressed_bytes"] += len(payload)
+                    send(seq)
+                if not in_flight:
+                    break
+                
+                # 2. Collect acks as they come back (possibly out of order)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                disconnected = False
+                for future in done:
+                    seq = in_flight.pop(future)
+                    try:
+                        ack = future.result()
+                    except ConnectionError:
+                        disconnected = True
+                        continue
+                    del unacked[seq]
+                    watermark = max(watermark, ack["watermark"])
+                    for key, value in ack["results"].items():
+                        results[key] += value
+                
+                # 3. Disconnected: let the other in-flight chunks land, then resend what is unacked
+                if disconnected:
+                    sync_stats["disconnects"] += 1
+                    reconnects += 1
+                    if reconnects > max_reconnects:
+                        raise ConnectionError(f"Gave up after {max_reconnects} reconnects (watermark {watermark})")
+                    for future in list(in_flight):
+                        seq = in_flight.pop(future)
+                        try:
+                            ack = future.result()
+                        except ConnectionError:
+                            continue
+                        del unacked[seq]
+                        for key, value in ack["results"].items():
+                            results[key] += value
+                    time.sleep(reconnect_backoff_seconds)
+                    # Chunks whose ack was lost are still resent: the bank answers them idempotently
+                    for seq in sorted(unacked):
+                        sync_stats["retransmits"] += 1
+                        send(seq)
+        
+        # Every ack has been read: the bank can drop this upload's state
+        link.finish_upload(terminal_id, upload_id)
+        elapsed = time.perf_counter() - started
+        sync_stats["elapsed_seconds"] = round(elapsed, 3)
+        sync_stats["txns_per_sec"] = round(results["synced"] / elapsed, 1) if elapsed else 0.0
+        # wire_bytes also counts retransmits; the ratio compares each chunk once
+        sync_stats["compression_ratio"] = (round(sync_stats["raw_bytes"] / sync_stats["compressed_bytes"], 2)
+                                           if sync_stats["compressed_bytes"] else 0.0)
+        results["metrics"] = sync_stats
+        return results
+    
+    def _iter_chunks(self, transactions: Iterable[Transaction], chunk_size: int, watermark: int,
+                     results: dict) -> Iterator[tuple[int, bytes, int]]:
+        """Yields (seq, payload, uncompressed size); chunk seq is derived from input position"""
+        ttl = timedelta(hours=self.config.ttl_hours)
+        iterator = iter(transactions)
+        seq = 0
+        while batch := list(islice(iterator, chunk_size)):
+            if seq > watermark:
+                now = datetime.now()
+                to_send = []
+                for txn in batch:
+                    # TTL: check expiration
+                    if now - txn.timestamp > ttl:
+                        txn.status = TransactionStatus.DECLINED
+                        results["expired"] += 1
+                        continue
+                    txn.status = TransactionStatus.SYNCED
+                    to_send.append(txn)
+                results["synced"] += len(to_send)
+                payload, raw_size = encode_chunk(to_send)
+                yield seq, payload, raw_size
+            seq += 1
@@ -1,17 +1,43 @@
 """Acquirer bank - receives and processes synced transactions"""
-from typing import List
+import sys
+import time
+import zlib
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from itertools import compress
+from pathlib import Path
+from typing import Callable, List, Optional
 
 from models import Transaction
+from settlement_store import SetIdempotencyStore, SettlementSpool, TransactionColumns
+from sync_protocol import decode_chunk
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared payment_metrics package at the repo root
+from payment_metrics import metrics
+from payment_models import to_minor
 
 
 class AcquirerBank:
     """Airline's bank - handles batch settlements"""
     
-    def __init__(self, name: str):
+    def __init__(self, name: str, dedup_store=None, spool: Optional[SettlementSpool] = None,
+                 upload_ttl_seconds: float = 24 * 3600):
         self.name = name
-        self.settled_transactions: List[Transaction] = []
-        self.processed_ids: set[str] = set()  # Critical: prevents double-charging
+        # In-memory list unless a disk spool is given (e.g. SettlementSpool)
+        self.settled_transactions = spool if spool is not None else []
+        # Critical: prevents double-charging.
+        # Pass BucketedIdempotencyStore(config.ttl_hours) to bound memory by the terminal TTL.
+        self.processed_ids = dedup_store if dedup_store is not None else SetIdempotencyStore()
+        # Chunked uploads: (terminal_id, upload_id) -> chunk size, per-chunk results and contiguous watermark.
+        # Least recently used first: finish_upload() drops one, idle ones expire after upload_ttl_seconds.
+        self.uploads: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self.upload_ttl_seconds = upload_ttl_seconds
+        self._lock = threading.Lock()  # Guards `uploads` only; each upload has its own lock for its chunks
+        # Serializes dedup check-then-add; the only lock held while settling
+        self._settle_lock = threading.Lock()
     
+    @metrics.timed("offline.settle_batch")
     def settle_batch(self, transactions: List[Transaction]) -> dict:
         """
         Process a batch of transactions from terminal.
@@ -19,27 +45,275 @@ class AcquirerBank:
         """
         results = {"settled": 0, "duplicates": 0, "rejected": 0}
         
-        for txn in transactions:
-            # Idempotency check: already processed?
-            if txn.id in self.processed_ids:
-                results["duplicates"] += 1
-                continue
+        with self._settle_lock:
+            for txn in transactions:
+                # Past the terminal TTL the dedup store may have forgotten it: never settle blind
+                if self.processed_ids.is_expired(txn.timestamp):
+                    results["rejected"] += 1
+                    continue
+            
+                # Idempotency check: already processed?
+                if self.processed_ids.contains(txn.id_bytes, txn.timestamp):
+                    results["duplicates"] += 1
+                    continue
             
-            # Validation
-            if txn.amount <= 0:
-                results["rejected"] += 1
-                continue
+                # Validation
+                if txn.amount <= 0:
+                    results["rejected"] += 1
+                    continue
             
-            # Process once and only once
-            self.processed_ids.add(txn.id)
-            self.settled_transactions.append(txn)
-            results["settled"] += 1
+                # Process once and only once
+                self.processed_ids.add(txn.id_bytes, txn.timestamp)
+                self.settled_transactions.append(txn)
+                results["settled"] += 1
         
+        for outcome, count in results.items():
+            metrics.count(f"offline.settle.{outcome}", count)
         return results
     
+    def settle_columns(self, batch: TransactionColumns) -> dict:
+        """
+        Columnar version of settle_batch() for large uploads (e.g. a fleet landing at a hub).
+        TTL, dedup and validation run as whole-array passes instead of per-object checks.
+        Same result shape and the same outcome per row as settle_batch().
+        """
+        results = {"settled": 0, "duplicates": 0, "rejected": 0}
+        n = len(batch)
+        if n == 0:
+            return results
+        store = self.processed_ids
+        
+        with self._settle_lock:
+            # 1. TTL expiry, idempotency and validation, each as one pass over a column
+            expired = store.expired_mask(batch.timestamps)
+            duplicate = store.contains_many(batch.ids, batch.timestamps)
+            # Rounded to minor units, like txn.amount in settle_batch(): 0.004 is not a payment
+            valid = list(map((0).__lt__, map(to_minor, batch.amounts)))
+            settle = [not (e or d) and v for e, d, v in zip(expired, duplicate, valid)]
+        
+            # 2. Repeats inside the batch: only the first valid occurrence settles
+            if len(set(batch.ids)) != n:
+                seen = set()
+                for i, key in enumerate(batch.ids):
+                    if expired[i] or duplicate[i]:
+                        continue
+                    if key in seen:
+                        duplicate[i], settle[i] = True, False
+                    elif settle[i]:
+                        seen.add(key)
+        
+            # 3. Process once and only once
+            store.add_many(compress(batch.ids, settle), compress(batch.timestamps, settle))
+            if hasattr(self.settled_transactions, "append_columns"):
+                self.settled_transactions.append_columns(batch, settle)
+            else:
+                self.settled_transactions.extend(map(batch.to_transaction, compress(range(n), settle)))
+        
+        results["settled"] = sum(settle)
+        results["duplicates"] = sum(d and not e for e, d in zip(expired, duplicate))
+        results["rejected"] = n - results["settled"] - results["duplicates"]
+        return results
+    
+    def receive_chunk(self, terminal_id: str, upload_id: str, chunk_size: int, seq: int, payload: bytes,
+                      read_through: int = -1) -> dict:
+        """
+        Receives one compressed chunk of a streaming upload (see SyncService.sync_streaming).
+        Idempotent per chunk: a re-sent chunk returns its original results without settling again.
+        The watermark is the highest seq below which every chunk has arrived.
+        read_through is the highest seq below which the terminal has read every ack; those
+        per-chunk results are evicted, so an upload's state stays bounded by its unread acks.
+        """
+        with self._lock:
+            upload = self._upload_locked(terminal_id, upload_id, chunk_size)
+        # Chunks of other uploads (and other terminals) are received concurrently
+        with upload["lock"]:
+            if seq <= upload["evicted_through"]:
+                # Its ack was already read: nothing to settle and nothing new to report
+                results = {"settled": 0, "duplicates": 0, "rejected": 0}
+            else:
+                if seq not in upload["results"]:
+                    upload["results"][seq] = self.settle_batch(decode_chunk(payload))
+                results = upload["results"][seq]
+            while upload["watermark"] + 1 in upload["results"]:
+                upload["watermark"] += 1
+            # A read ack implies the chunk arrived, so never evict past the watermark
+            for evicted in range(upload["evicted_through"] + 1, min(read_through, upload["watermark"]) + 1):
+                upload["results"].pop(evicted, None)
+            upload["evicted_through"] = max(upload["evicted_through"], min(read_through, upload["watermark"]))
+            return {"seq": seq, "watermark": upload["watermark"], "results": results}
+    
+    def upload_watermark(self, terminal_id: str, upload_id: str, chunk_size: int) -> int:
+        """Where a reconnecting terminal should resume (-1: nothing received yet)"""
+        with self._lock:
+            return self._upload_locked(terminal_id, upload_id, chunk_size)["watermark"]
+    
+    def finish_upload(self, terminal_id: str, upload_id: str):
+        """
+        The terminal has read every ack: forget the upload. Resuming it afterwards
+        re-sends from the start, and the idempotency store reports those as duplicates.
+        """
+        with self._lock:
+            self.uploads.pop((terminal_id, upload_id), None)
+    
+    def _upload_locked(self, terminal_id: str, upload_id: str, chunk_size: int) -> dict:
+        key, now = (terminal_id, upload_id), time.monotonic()
+        upload = self.uploads.get(key)
+        if upload is None:
+            # Abandoned uploads (the terminal never came back) expire instead of piling up
+            while self.uploads:
+                oldest = next(iter(self.uploads.values()))
+                if now - oldest["last_seen"] < self.upload_ttl_seconds:
+                    break
+                self.uploads.popitem(last=False)
+            upload = self.uploads[key] = {"chunk_size": chunk_size, "results": {}, "watermark": -1,
+                                          "evicted_through": -1, "lock": threading.Lock()}
+        else:
+            self.uploads.move_to_end(key)
+        upload["last_seen"] = now
+        if upload["chunk_size"] != chunk_size:
+            # Chunk numbers count chunk_size transactions each: a different size would skip or repeat some
+            raise ValueError(f"upload {upload_id} uses chunk_size {upload['chunk_size']}, not {chunk_size}")
+        return upload
+    
     def issue_compensating_transaction(self, transaction: Transaction):
         """
         Handle declined transactions after settlement.
         In reality, this pushes customer account into negative balance.
         """
-        pass  # Implementation depends on issuer bank integration
\ No newline at end of file
+        pass  # Implementation depends on issuer bank integration
+
+class FleetIngestion:
+    """
+    Concurrent settlement front end for many terminals uploading at once (e.g. a hub bank).
+
+    Dedup state is split into `partitions` AcquirerBank instances by crc32 of the
+    transaction id; each bank's own settle lock is the only lock held while settling.
+    Uploads are cut into slices of at most `quantum` transactions and served
+    round-robin across terminals: one large upload cannot starve the aircraft that
+    landed after it. Backpressure: submit() blocks while `max_pending` transactions are queued.
+
+    Workers are threads and settlement is pure Python, so this does not raise
+    settled txns/sec: the GIL runs one worker at a time, and splitting slices across
+    partitions costs a little. What it buys is fairness (short uploads are not stuck
+    behind long ones) and overlap with blocking I/O such as a disk spool.
+    """
+    
+    def __init__(self, partitions: int = 8, workers: int = 8, quantum: int = 256,
+                 max_pending: int = 100_000, bank_factory: Optional[Callable[[int], AcquirerBank]] = None):
+        bank_factory = bank_factory or (lambda i: AcquirerBank(f"Airline Bank p{i}"))
+        self.partitions = [bank_factory(i) for i in range(partitions)]
+        self.workers = workers
+        self.quantum = quantum
+        self.max_pending = max_pending
+        self.stats = {"uploads": 0, "slices": 0, "settled": 0, "duplicates": 0, "rejected": 0, "throttled": 0}
+        # terminal_id -> deque of (upload, slice); `_ready` holds terminals with queued work, in turn order
+        self._queues: dict[str, deque] = {}
+        self._ready: deque[str] = deque()
+        self._pending = 0
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+    
+    def start(self):
+        for worker_id in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"INGEST-WORKER-{worker_id}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        """Finishes every queued upload, then stops the workers"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+    
+    def submit(self, terminal_id: str, transactions: List[Transaction], timeout: Optional[float] = None) -> Future:
+        """
+        Queues one terminal's upload; the future resolves to settle_batch()-style results.
+        Blocks while the server is saturated, raising TimeoutError after `timeout` seconds.
+        An upload larger than max_pending is admitted once the queue is empty.
+        """
+        future = Future()
+        upload = {"future": future, "remaining": 0, "results": {"settled": 0, "duplicates": 0, "rejected": 0}}
+        slices = [transactions[i:i + self.quantum] for i in range(0, len(transactions), self.quantum)]
+        if not slices:
+            future.set_result(upload["results"])
+            return future
+        upload["remaining"] = len(slices)
+        
+        with self._cond:
+            admissible = lambda: self._pending == 0 or self._pending + len(transactions) <= self.max_pending
+            if not admissible():
+                self.stats["throttled"] += 1
+                if not self._cond.wait_for(admissible, timeout):
+                    raise TimeoutError(f"Ingestion saturated: {self._pending} transactions queued")
+            queue = self._queues.setdefault(terminal_id, deque())
+            if not queue:
+                self._ready.append(terminal_id)
+            queue.extend((upload, batch) for batch in slices)
+            self._pending += len(transactions)
+            self.stats["uploads"] += 1
+            self._cond.notify_all()
+        return future
+    
+    def _next_slice(self):
+        """Round-robin over terminals, one slice per turn; None once stopped and drained"""
+        with self._cond:
+            while not self._ready:
+                if self._stopping:
+                    return None
+                self._cond.wait()
+            terminal_id = self._ready.popleft()
+            queue = self._queues[terminal_id]
+            item = queue.popleft()
+            if queue:
+                self._ready.append(terminal_id)
+            else:
+                del self._queues[terminal_id]
+            return item
+    
+    def _work(self):
+        while (item := self._next_slice()) is not None:
+            upload, batch = item
+            error = None
+            try:
+                results = self._settle_slice(batch)
+            except Exception as exc:
+                error, results = exc, None
+            
+            with self._cond:
+                self._pending -= len(batch)
+                self.stats["slices"] += 1
+                if results is not None:
+                    for key, value in results.items():
+                        upload["results"][key] += value
+                        self.stats[key] += value
+                upload["remaining"] -= 1
+                # Other workers may hold slices of the same upload: resolve it once, under the lock
+                future = upload["future"]
+                if not future.done():
+                    if error is not None:
+                        future.set_exception(error)
+                    elif upload["remaining"] == 0:
+                        future.set_result(upload["results"])
+                self._cond.notify_all()  # wakes submitters blocked on backpressure
+    
+    def _settle_slice(self, batch: List[Transaction]) -> dict:
+        # The same id always hashes to the same partition, so retries inside one slice still dedup
+        by_partition: dict[int, list[Transaction]] = {}
+        n = len(self.partitions)
+        for txn in batch:
+            by_partition.setdefault(zlib.crc32(txn.id_bytes) % n, []).append(txn)
+        
+        results = {"settled": 0, "duplicates": 0, "rejected": 0}
+        for partition_id, transactions in by_partition.items():
+            partition_results = self.partitions[partition_id].settle_batch(transactions)
+            for key, value in partition_results.items():
+                results[key] += value
+        return results
+    
+    @property
+    def settled_count(self) -> int:
+        return sum(len(bank.settled_transactions) for bank in self.partitions)
@@ -0,0 +1,81 @@
+"""Per-object settle_batch() vs columnar settle_columns() on a fleet-sized upload"""
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import importlib.util
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from models import Transaction, TransactionStatus
+from settlement_store import BucketedIdempotencyStore, SettlementSpool, TransactionColumns
+
+HERE = Path(__file__).parent
+TTL_HOURS = 24
+
+# The bank script's file name is not importable with a plain import statement
+_spec = importlib.util.spec_from_file_location("server_receive_batch", HERE / "3-server-receive-batch.py")
+server_receive_batch = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(server_receive_batch)
+AcquirerBank = server_receive_batch.AcquirerBank
+
+
+def generate_upload(size: int, duplicate_rate: float, invalid_rate: float) -> list[Transaction]:
+    """One hub's worth of landed flights: a few retried and a few bad transactions"""
+    landed_at = datetime.now() - timedelta(minutes=30)
+    transactions = []
+    for _ in range(size):
+        if transactions and random.random() < duplicate_rate:
+            transactions.append(random.choice(transactions))
+            continue
+        amount = 0.0 if random.random() < invalid_rate else round(random.uniform(2, 25), 2)
+        transactions.append(Transaction(
+            id=str(uuid.uuid4()),
+            card_number=f"4{random.randrange(10 ** 15):015d}",
+            amount=amount,
+            timestamp=landed_at - timedelta(seconds=random.randrange(3600)),
+            seat=f"{random.randint(1, 40)}{random.choice('ABCDEF')}",
+            status=TransactionStatus.SYNCED,
+        ))
+    return transactions
+
+
+def new_bank() -> AcquirerBank:
+    return AcquirerBank(
+        "Airline Bank",
+        dedup_store=BucketedIdempotencyStore(ttl_hours=TTL_HOURS),
+        spool=SettlementSpool(tempfile.mkdtemp(prefix="settlement-spool-")),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Settlement path benchmark")
+    parser.add_argument("--size", type=int, default=50_000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    parser.add_argument("--invalid-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    upload = generate_upload(args.size, args.duplicate_rate, args.invalid_rate)
+
+    bank = new_bank()
+    started = time.perf_counter()
+    per_object = bank.settle_batch(upload)
+    per_object_seconds = time.perf_counter() - started
+
+    # Terminals would upload columns directly; conversion is timed separately
+    started = time.perf_counter()
+    columns = TransactionColumns.from_transactions(upload)
+    convert_seconds = time.perf_counter() - started
+
+    bank = new_bank()
+    started = time.perf_counter()
+    columnar = bank.settle_columns(columns)
+    columnar_seconds = time.perf_counter() - started
+
+    assert per_object == columnar, (per_object, columnar)
+    print(f"upload of {args.size} transactions -> {columnar}")
+    print(f"settle_batch   (per object): {per_object_seconds * 1000:9.1f}ms  "
+          f"{args.size / per_object_seconds:>12.0f} txns/sec")
+    print(f"settle_columns (columnar):   {columnar_seconds * 1000:9.1f}ms  "
+          f"{args.size / columnar_seconds:>12.0f} txns/sec  (+{convert_seconds * 1000:.1f}ms to build columns)")
@@ -0,0 +1,69 @@
+"""Streaming chunked sync over a simulated flaky ground link"""
+import uuid
+import random
+import argparse
+import importlib.util
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from models import TerminalConfig, Transaction, TransactionStatus
+from sync_protocol import SimulatedBankLink
+
+HERE = Path(__file__).parent
+
+
+def load_script(filename: str):
+    """The showcase scripts' file names are not importable with a plain import statement"""
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace("-", "_"), HERE / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+SyncService = load_script("2-sync-on-arrive.py").SyncService
+AcquirerBank = load_script("3-server-receive-batch.py").AcquirerBank
+
+
+def flight_transactions(count: int) -> list[Transaction]:
+    departed = datetime.now() - timedelta(hours=6)
+    passengers = [f"4{random.randrange(10 ** 15):015d}" for _ in range(max(1, count // 3))]
+    return [
+        Transaction(
+            id=str(uuid.uuid4()),
+            card_number=random.choice(passengers),
+            amount=random.choice([3.5, 4.0, 6.5, 9.0, 12.0]),
+            timestamp=departed + timedelta(seconds=random.randrange(6 * 3600)),
+            seat=f"{random.randint(1, 40)}{random.choice('ABCDEF')}",
+            status=TransactionStatus.APPROVED,
+        )
+        for _ in range(count)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked sync benchmark")
+    parser.add_argument("--transactions", type=int, default=20_000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    upload = flight_transactions(args.transactions)
+    config = TerminalConfig(floor_limit=25.0, velocity_limit=3, ttl_hours=24, blacklist=set())
+
+    for failure_rate in (0.0, 0.05, 0.2):
+        bank = AcquirerBank("Airline Bank")
+        link = SimulatedBankLink(bank, latency_seconds=args.latency_ms / 1000,
+                                 failure_rate=failure_rate, seed=args.seed)
+        results = SyncService(config).sync_streaming(
+            upload, link, terminal_id="TERM-A320-01", upload_id="flight-0042",
+            chunk_size=args.chunk_size, max_in_flight=args.max_in_flight,
+        )
+        metrics = results.pop("metrics")
+        assert results["settled"] == len(bank.settled_transactions) == args.transactions, results
+        print(f"failure_rate={failure_rate:<4} {results}")
+        print(f"    {metrics['txns_per_sec']:>10.1f} txns/sec  {metrics['chunks']} chunks  "
+              f"{metrics['retransmits']} retransmits  {metrics['disconnects']} disconnects  "
+              f"{metrics['wire_bytes']:,} bytes on the wire ({metrics['compression_ratio']}x compression)")
@@ -0,0 +1,222 @@
+"""Compact, memory-mapped blacklist with versioned delta updates for the edge terminal"""
+import os
+import sys
+import mmap
+import struct
+import heapq
+import hashlib
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+# File layout: header, then `count` sorted big-endian uint64 PAN hashes (8 bytes per card)
+MAGIC = b"BLK1"
+HEADER = struct.Struct(">4sQQ")  # magic, version, count
+HASH = struct.Struct(">Q")
+# Delta journal record: from_version, to_version, added count, removed count, then the hashes
+DELTA_HEADER = struct.Struct(">QQII")
+# Hashes per read/write while compaction streams the snapshot (512 KiB)
+COMPACT_BLOCK = 65_536
+
+
+def pan_hash(card_number: str) -> int:
+    """64-bit hash of a PAN: the terminal never stores card numbers in the clear"""
+    return int.from_bytes(hashlib.blake2b(card_number.encode(), digest_size=8).digest(), "big")
+
+
+def write_blacklist_file(path: str, hashes: Iterable[int], version: int):
+    """Central side: publishes a full snapshot (sorted, de-duplicated)"""
+    ordered = array("Q", sorted(set(hashes)))
+    if ordered.itemsize != 8:
+        raise ValueError("platform has no 8-byte unsigned array type")
+    if sys.byteorder == "little":
+        ordered.byteswap()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, version, len(ordered)))
+        f.write(ordered.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class BlacklistDelta:
+    """Changes between two published versions, as PAN hashes"""
+    from_version: int
+    to_version: int
+    added: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+
+    @classmethod
+    def between(cls, old_pans: set[str], new_pans: set[str], from_version: int, to_version: int) -> "BlacklistDelta":
+        return cls(
+            from_version,
+            to_version,
+            added=[pan_hash(pan) for pan in new_pans - old_pans],
+            removed=[pan_hash(pan) for pan in old_pans - new_pans],
+        )
+
+    def encode(self) -> bytes:
+        """Wire/journal format: 24-byte header + 8 bytes per changed card"""
+        return (DELTA_HEADER.pack(self.from_version, self.to_version, len(self.added), len(self.removed))
+                + b"".join(HASH.pack(h) for h in self.added)
+                + b"".join(HASH.pack(h) for h in self.removed))
+
+    @classmethod
+    def decode_many(cls, data: bytes) -> list["BlacklistDelta"]:
+        deltas, pos = [], 0
+        while pos + DELTA_HEADER.size <= len(data):
+            from_version, to_version, n_added, n_removed = DELTA_HEADER.unpack_from(data, pos)
+            pos += DELTA_HEADER.size
+            end = pos + (n_added + n_removed) * HASH.size
+            if end > len(data):
+                break  # torn append at the end of the journal
+            hashes = [h for (h,) in HASH.iter_unpack(data[pos:end])]
+            deltas.append(cls(from_version, to_version, hashes[:n_added], hashes[n_added:]))
+            pos = end
+        return deltas
+
+
+class BlacklistIndex:
+    """
+    Terminal-side blacklist.
+    The snapshot file is memory-mapped, so startup does not load it into the heap
+    and lookups are a binary search over it: O(log n). Delta patches go into a
+    small in-memory overlay (persisted in a journal next to the snapshot) and are
+    folded into a new snapshot by compact(), which the terminal runs between
+    transactions via maybe_compact(), never from authorization or apply_delta().
+
+    False positives only come from 64-bit hash collisions (about n / 2^64 per lookup).
+    """
+
+    def __init__(self, path: str, compact_threshold: int = 50_000):
+        self.path = path
+        self.journal_path = f"{path}.delta"
+        self.compact_threshold = compact_threshold
+        self.added: set[int] = set()
+        self.removed: set[int] = set()
+        self._open_snapshot()
+        # Replay deltas applied since the last compaction
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                for delta in BlacklistDelta.decode_many(f.read()):
+                    self._apply_overlay(delta)
+
+    def _open_snapshot(self):
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a blacklist snapshot")
+
+    def _snapshot_contains(self, h: int) -> bool:
+        lo, hi = 0, self.count
+        mm, base = self._mm, HEADER.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = HASH.unpack_from(mm, base + mid * 8)[0]
+            if value < h:
+                lo = mid + 1
+            elif value > h:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __contains__(self, card_number: str) -> bool:
+        h = pan_hash(card_number)
+        if h in self.added:
+            return True
+        if h in self.removed:
+            return False
+        return self._snapshot_contains(h)
+
+    def apply_delta(self, delta: BlacklistDelta):
+        """
+        Applies the changes since our version (e.g. downloaded during a short sync window).
+        A delta that does not start at our version means a patch was missed: the caller
+        must download a full snapshot instead.
+        """
+        if delta.from_version != self.version:
+            raise ValueError(
+                f"Delta {delta.from_version}->{delta.to_version} does not apply to version {self.version}"
+            )
+        with open(self.journal_path, "ab") as f:
+            f.write(delta.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self._apply_overlay(delta)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return len(self.added) + len(self.removed) >= self.compact_threshold
+
+    def maybe_compact(self) -> bool:
+        """Compacts once the overlay reaches compact_threshold; call when idle (e.g. after a sync)"""
+        if not self.needs_compaction:
+            return False
+        self.compact()
+        return True
+
+    def _apply_overlay(self, delta: BlacklistDelta):
+        for h in delta.added:
+            self.removed.discard(h)
+            self.added.add(h)
+        for h in delta.removed:
+            self.added.discard(h)
+            self.removed.add(h)
+        self.version = delta.to_version
+
+    def compact(self):
+        """
+        Folds the overlay into a new snapshot. Merges the sorted snapshot with the
+        sorted overlay block by block, so memory stays at the overlay plus one block
+        however large the snapshot is.
+        """
+        tmp_path = f"{self.path}.tmp"
+        count, last = 0, None
+        block = array("Q")
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.version, 0))  # count is filled in once known
+            for h in heapq.merge(self._iter_snapshot(), sorted(self.added)):
+                if h == last or h in self.removed:
+                    continue
+                block.append(h)
+                last = h
+                if len(block) == COMPACT_BLOCK:
+                    count += self._write_block(f, block)
+            count += self._write_block(f, block)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, self.version, count))
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.added.clear()
+        self.removed.clear()
+        self._open_snapshot()
+
+    def _iter_snapshot(self) -> Iterator[int]:
+        for start in range(0, self.count, COMPACT_BLOCK):
+            end = min(start + COMPACT_BLOCK, self.count)
+            block = array("Q")
+            block.frombytes(self._mm[HEADER.size + start * 8:HEADER.size + end * 8])
+            if sys.byteorder == "little":
+                block.byteswap()
+            yield from block
+
+    @staticmethod
+    def _write_block(f, block: array) -> int:
+        written = len(block)
+        if sys.byteorder == "little":
+            block.byteswap()
+        f.write(block.tobytes())
+        del block[:]
+        return written
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
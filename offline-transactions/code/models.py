@@ -0,0 +1,32 @@
+"""Records shared by the terminal, the sync service and the acquirer bank"""
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared payment_models package at the repo root
+from payment_models import Transaction, TransactionStatus
+
+
+@dataclass
+class Card:
+    """Chip card state relevant offline: the chip caps consecutive offline approvals"""
+    number: str
+    offline_counter: int = 0
+    offline_limit: int = 5
+
+    def can_transact_offline(self) -> bool:
+        return self.offline_counter < self.offline_limit
+
+    def increment_counter(self):
+        self.offline_counter += 1
+
+
+@dataclass
+class TerminalConfig:
+    floor_limit: float = 25.0  # Max amount approved without going online
+    velocity_limit: int = 3    # Approvals per card per velocity window
+    ttl_hours: int = 72        # Offline transactions older than this are not settled
+    blacklist: set = field(default_factory=set)
+
+
+__all__ = ["Card", "TerminalConfig", "Transaction", "TransactionStatus"]
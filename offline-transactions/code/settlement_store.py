@@ -0,0 +1,356 @@
+"""Bounded-memory idempotency and settlement storage for the acquirer bank"""
+import os
+import math
+import time
+import uuid
+import struct
+import hashlib
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import chain, compress, repeat
+from typing import Callable, Iterable, Iterator
+
+from models import Transaction, TransactionStatus
+
+
+@dataclass
+class TransactionColumns:
+    """
+    Columnar batch of transactions: one array per field instead of one object per row.
+    ids are 16-byte binary UUIDs, timestamps are POSIX seconds.
+    """
+    ids: list[bytes]
+    amounts: array  # array('d')
+    card_numbers: list[str]
+    timestamps: array  # array('d')
+    seats: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_transactions(cls, transactions: list[Transaction]) -> "TransactionColumns":
+        return cls(
+            ids=[t.id_bytes for t in transactions],
+            amounts=array("d", (t.amount for t in transactions)),
+            card_numbers=[t.card_number for t in transactions],
+            timestamps=array("d", (t.timestamp.timestamp() for t in transactions)),
+            seats=[t.seat for t in transactions],
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def to_transaction(self, i: int) -> Transaction:
+        return Transaction(
+            id=self.ids[i],
+            card_number=self.card_numbers[i],
+            amount=self.amounts[i],
+            timestamp=datetime.fromtimestamp(self.timestamps[i]),
+            seat=self.seats[i] if self.seats else "",
+            status=TransactionStatus.SYNCED,
+        )
+
+
+class SetIdempotencyStore:
+    """Original behaviour: every id ever processed, kept forever. Keys are 16-byte binary UUIDs."""
+
+    def __init__(self):
+        self.ids: set[bytes] = set()
+
+    def is_expired(self, timestamp: datetime) -> bool:
+        return False
+
+    def contains(self, key: bytes, timestamp: datetime) -> bool:
+        return key in self.ids
+
+    def add(self, key: bytes, timestamp: datetime):
+        self.ids.add(key)
+
+    # Columnar API (binary keys, POSIX timestamps)
+
+    def expired_mask(self, timestamps: array) -> list[bool]:
+        return [False] * len(timestamps)
+
+    def contains_many(self, keys: list[bytes], timestamps: array) -> list[bool]:
+        return list(map(self.ids.__contains__, keys))
+
+    def add_many(self, keys: Iterable[bytes], timestamps: Iterable[float]):
+        self.ids.update(keys)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter: no false negatives, tunable false-positive rate"""
+
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+        # Standard sizing: m = -n ln(p) / ln(2)^2, k = m/n ln(2)
+        self.num_bits = max(8, int(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: bytes) -> Iterator[int]:
+        # Double hashing: h1 + i*h2 from one 128-bit digest
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: bytes):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, key: bytes) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class BucketedIdempotencyStore:
+    """
+    Dedup store that only remembers what can still be retried.
+    Terminals decline anything older than TerminalConfig.ttl_hours, so ids are
+    kept in time buckets (by transaction timestamp) and whole buckets are dropped
+    once they fall outside the TTL. Keys are 16-byte binary UUIDs.
+
+    With use_bloom=True each bucket has a Bloom filter in front of the exact set:
+    a negative answer (the common case for new transactions) skips the exact lookup,
+    which matters once the exact set lives somewhere slower than memory.
+    """
+
+    def __init__(self, ttl_hours: int, bucket_minutes: int = 60, use_bloom: bool = False,
+                 expected_per_bucket: int = 100_000, clock: Callable[[], datetime] = datetime.now):
+        self.ttl_seconds = ttl_hours * 3600
+        self.bucket_seconds = bucket_minutes * 60
+        self.use_bloom = use_bloom
+        self.expected_per_bucket = expected_per_bucket
+        self.clock = clock
+        self.buckets: dict[int, set[bytes]] = {}
+        self.blooms: dict[int, BloomFilter] = {}
+        self.stats = {"bloom_negatives": 0, "exact_lookups": 0, "buckets_expired": 0}
+
+    def _bucket(self, timestamp: datetime) -> int:
+        return int(timestamp.timestamp()) // self.bucket_seconds
+
+    def _oldest_live_bucket(self) -> int:
+        return (int(self.clock().timestamp()) - self.ttl_seconds) // self.bucket_seconds
+
+    def is_expired(self, timestamp: datetime) -> bool:
+        """Older than the terminal TTL: its bucket may already be gone, so it cannot be deduplicated"""
+        return self._bucket(timestamp) < self._oldest_live_bucket()
+
+    def contains(self, key: bytes, timestamp: datetime) -> bool:
+        bucket = self._bucket(timestamp)
+        ids = self.buckets.get(bucket)
+        if ids is None:
+            return False
+        if self.use_bloom and not self.blooms[bucket].might_contain(key):
+            self.stats["bloom_negatives"] += 1
+            return False
+        self.stats["exact_lookups"] += 1
+        return key in ids
+
+    def add(self, key: bytes, timestamp: datetime):
+        bucket = self._bucket(timestamp)
+        ids = self.buckets.get(bucket)
+        if ids is None:
+            self.expire()
+            ids = self.buckets[bucket] = set()
+            if self.use_bloom:
+                self.blooms[bucket] = BloomFilter(self.expected_per_bucket)
+        ids.add(key)
+        if self.use_bloom:
+            self.blooms[bucket].add(key)
+
+    # Columnar API (binary keys, POSIX timestamps)
+
+    def expired_mask(self, timestamps: array) -> list[bool]:
+        # One C-level comparison per row against the cutoff
+        cutoff = float(self._oldest_live_bucket() * self.bucket_seconds)
+        return list(map(cutoff.__gt__, timestamps))
+
+    def contains_many(self, keys: list[bytes], timestamps: array) -> list[bool]:
+        """
+        Set membership for a whole batch, as C-level map() passes over the keys.
+        A transaction id only ever lives in the bucket of its own timestamp, so
+        checking every bucket the batch touches (usually one or two) is exact.
+        The Bloom layer is skipped: it only pays off in front of a slower exact store.
+        """
+        if not keys:
+            return []
+        sets = [self.buckets[b] for b in self._batch_buckets(timestamps) if b in self.buckets]
+        if not sets:
+            return [False] * len(keys)
+        if len(sets) == 1:
+            return list(map(sets[0].__contains__, keys))
+        return list(map(any, zip(*(map(ids.__contains__, keys) for ids in sets))))
+
+    def add_many(self, keys: Iterable[bytes], timestamps: Iterable[float]):
+        keys = list(keys)
+        timestamps = array("d", timestamps)
+        if not keys:
+            return
+        buckets = self._batch_buckets(timestamps)
+        for bucket in buckets:
+            if len(buckets) == 1:
+                bucket_keys = keys
+            else:
+                # Rows whose timestamp falls in [start, end): two C-level comparisons per row
+                start, end = float(bucket * self.bucket_seconds), float((bucket + 1) * self.bucket_seconds)
+                in_bucket = map(bool.__and__, map(start.__le__, timestamps), map(end.__gt__, timestamps))
+                bucket_keys = list(compress(keys, in_bucket))
+                if not bucket_keys:
+                    continue
+            ids = self.buckets.get(bucket)
+            if ids is None:
+                self.expire()
+                ids = self.buckets[bucket] = set()
+                if self.use_bloom:
+                    self.blooms[bucket] = BloomFilter(self.expected_per_bucket)
+            ids.update(bucket_keys)
+            if self.use_bloom:
+                for key in bucket_keys:
+                    self.blooms[bucket].add(key)
+
+    def _batch_buckets(self, timestamps: array) -> list[int]:
+        """
+        The distinct buckets the batch touches. A batch mixing old retries with fresh
+        rows spans hours it has no rows in, so min..max would visit empty buckets.
+        """
+        return sorted(map(int, set(map(float(self.bucket_seconds).__rfloordiv__, timestamps))))
+
+    def expire(self) -> int:
+        """Drops buckets that fell out of the TTL window; returns how many"""
+        oldest = self._oldest_live_bucket()
+        doomed = [bucket for bucket in self.buckets if bucket < oldest]
+        for bucket in doomed:
+            del self.buckets[bucket]
+            self.blooms.pop(bucket, None)
+        self.stats["buckets_expired"] += len(doomed)
+        return len(doomed)
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self.buckets.values())
+
+
+# Spool record: 16-byte id, amount in cents, POSIX timestamp, card number, seat
+SPOOL_FORMAT = "16sqd19s4s"
+SPOOL_RECORD = struct.Struct(">" + SPOOL_FORMAT)
+
+
+class SettlementSpool:
+    """
+    Append-only, segmented on-disk log of settled transactions.
+    Replaces the in-memory settled_transactions list: memory use is one open
+    file handle no matter how many flights have been settled.
+    An append fsyncs once `flush_records` are unflushed or the oldest unflushed one
+    is `flush_seconds` old, bounding what a crash mid-stream can lose; call flush()
+    or close() when the stream stops.
+    """
+
+    def __init__(self, directory: str, records_per_segment: int = 1_000_000,
+                 flush_records: int = 10_000, flush_seconds: float = 1.0):
+        self.directory = directory
+        self.records_per_segment = records_per_segment
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+        self._unflushed = 0
+        self._first_unflushed_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self.segments = sorted(name for name in os.listdir(directory) if name.endswith(".spool"))
+        self._file = None
+        self._segment_count = 0
+        if self.segments:
+            self._segment_count = self._recover(os.path.join(directory, self.segments[-1]))
+        self._count = sum(os.path.getsize(os.path.join(directory, name)) for name in self.segments) // SPOOL_RECORD.size
+
+    def append(self, txn: Transaction):
+        if self._file is None or self._segment_count >= self.records_per_segment:
+            self._roll()
+        self._file.write(SPOOL_RECORD.pack(
+            txn.id_bytes,
+            txn.amount_minor,
+            txn.timestamp.timestamp(),
+            txn.card_number.encode()[:19],
+            txn.seat.encode()[:4],
+        ))
+        self._segment_count += 1
+        self._count += 1
+        self._appended(1)
+
+    def append_columns(self, batch: TransactionColumns, mask: list[bool]):
+        """Appends the rows where mask is True, packing many records per struct call"""
+        cents = map(round, map((100.0).__mul__, compress(batch.amounts, mask)))
+        cards = map(str.encode, compress(batch.card_numbers, mask))
+        seats = map(str.encode, compress(batch.seats, mask)) if batch.seats else repeat(b"")
+        rows = list(zip(compress(batch.ids, mask), cents, compress(batch.timestamps, mask), cards, seats))
+
+        written = 0
+        while written < len(rows):
+            if self._file is None or self._segment_count >= self.records_per_segment:
+                self._roll()
+            take = min(len(rows) - written, self.records_per_segment - self._segment_count)
+            # struct "s" fields pad/truncate, matching append()
+            packer = struct.Struct(">" + SPOOL_FORMAT * take)
+            self._file.write(packer.pack(*chain.from_iterable(rows[written:written + take])))
+            written += take
+            self._segment_count += take
+            self._count += take
+        self._appended(len(rows))
+
+    def _appended(self, records: int):
+        if not records:
+            return
+        now = time.monotonic()
+        if not self._unflushed:
+            self._first_unflushed_at = now
+        self._unflushed += records
+        if self._unflushed >= self.flush_records or now - self._first_unflushed_at >= self.flush_seconds:
+            self.flush()
+
+    @staticmethod
+    def _recover(path: str) -> int:
+        """
+        Truncates a record torn by a crash mid-append off the last segment (only the
+        active segment is ever written to), so appends resume on a record boundary
+        """
+        size = os.path.getsize(path)
+        good_size = size // SPOOL_RECORD.size * SPOOL_RECORD.size
+        if good_size != size:
+            with open(path, "r+b") as f:
+                f.truncate(good_size)
+                os.fsync(f.fileno())
+        return good_size // SPOOL_RECORD.size
+
+    def _roll(self):
+        if self._file is not None:
+            self._file.close()
+        if not self.segments or self._segment_count >= self.records_per_segment:
+            self.segments.append(f"{self._count:012d}.spool")
+            self._segment_count = 0
+        self._file = open(os.path.join(self.directory, self.segments[-1]), "ab")
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unflushed = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[tuple[str, float, datetime, str, str]]:
+        """Replays (id, amount, timestamp, card_number, seat) in settlement order"""
+        if self._file is not None:
+            self._file.flush()
+        for name in self.segments:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                while chunk := f.read(SPOOL_RECORD.size * 4096):
+                    for raw_id, cents, ts, card, seat in SPOOL_RECORD.iter_unpack(chunk):
+                        yield (str(uuid.UUID(bytes=raw_id)), cents / 100, datetime.fromtimestamp(ts),
+                               card.rstrip(b"\0").decode(), seat.rstrip(b"\0").decode())
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
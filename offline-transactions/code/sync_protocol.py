@@ -0,0 +1,88 @@
+"""Wire format and a simulated ground link for chunked terminal -> bank uploads"""
+import time
+import zlib
+import random
+import struct
+import threading
+from datetime import datetime
+from typing import Optional
+
+from models import Transaction, TransactionStatus
+
+# Chunk: record count, then zlib-compressed fixed-size records
+CHUNK_HEADER = struct.Struct(">I")
+# Record: id, amount in cents, POSIX timestamp, card number, seat
+RECORD = struct.Struct(">16sqd19s4s")
+
+
+def encode_chunk(transactions: list[Transaction]) -> tuple[bytes, int]:
+    """Returns (wire payload, uncompressed size)"""
+    raw = b"".join(
+        RECORD.pack(t.id_bytes, t.amount_minor, t.timestamp.timestamp(),
+                    t.card_number.encode(), t.seat.encode())
+        for t in transactions
+    )
+    return CHUNK_HEADER.pack(len(transactions)) + zlib.compress(raw), len(raw)
+
+
+def decode_chunk(payload: bytes) -> list[Transaction]:
+    (count,) = CHUNK_HEADER.unpack_from(payload)
+    raw = zlib.decompress(payload[CHUNK_HEADER.size:])
+    if len(raw) != count * RECORD.size:
+        raise ValueError("chunk length does not match its record count")
+    return [
+        Transaction(
+            id=raw_id,
+            card_number=card.rstrip(b"\0").decode(),
+            amount=cents / 100,
+            timestamp=datetime.fromtimestamp(ts),
+            seat=seat.rstrip(b"\0").decode(),
+            status=TransactionStatus.SYNCED,
+        )
+        for raw_id, cents, ts, card, seat in RECORD.iter_unpack(raw)
+    ]
+
+
+class SimulatedBankLink:
+    """
+    In-process stand-in for the ground connection to the acquirer bank.
+    Adds a round-trip latency and drops the connection at random, either before
+    the chunk reaches the bank or after (the ack is lost), to exercise resume.
+    """
+
+    def __init__(self, bank, latency_seconds: float = 0.02, failure_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.bank = bank
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes_sent": 0, "dropped_before_delivery": 0, "dropped_ack": 0}
+
+    def _maybe_drop(self, counter: str):
+        with self._lock:
+            dropped = self._random.random() < self.failure_rate
+            if dropped:
+                self.stats[counter] += 1
+        if dropped:
+            raise ConnectionError(f"ground link dropped ({counter})")
+
+    def send_chunk(self, terminal_id: str, upload_id: str, chunk_size: int, seq: int, payload: bytes,
+                   read_through: int = -1) -> dict:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_sent"] += len(payload)
+        time.sleep(self.latency_seconds / 2)
+        self._maybe_drop("dropped_before_delivery")
+        ack = self.bank.receive_chunk(terminal_id, upload_id, chunk_size, seq, payload, read_through)
+        time.sleep(self.latency_seconds / 2)
+        self._maybe_drop("dropped_ack")
+        return ack
+
+    def finish_upload(self, terminal_id: str, upload_id: str):
+        time.sleep(self.latency_seconds)
+        self.bank.finish_upload(terminal_id, upload_id)
+
+    def watermark(self, terminal_id: str, upload_id: str, chunk_size: int) -> int:
+        time.sleep(self.latency_seconds)
+        return self.bank.upload_watermark(terminal_id, upload_id, chunk_size)
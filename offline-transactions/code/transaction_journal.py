@@ -0,0 +1,209 @@
+"""Crash-safe, append-only journal of approved offline transactions"""
+import os
+import time
+import zlib
+import struct
+import threading
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+from models import Transaction, TransactionStatus
+
+MAGIC = b"TXJ1"
+# File header: magic, offset of the first record in this file (earlier ones were truncated)
+HEADER = struct.Struct(">4sQ")
+# Fixed-size record: id, amount in cents, POSIX timestamp, card number, seat, crc32 of the preceding fields
+BODY = struct.Struct(">16sqd19s4s")
+RECORD_SIZE = BODY.size + 4
+CURSOR = struct.Struct(">QI")  # acknowledged offset, crc32
+
+
+class TransactionJournal:
+    """
+    Terminal storage for approved transactions, safe across a reboot mid-flight.
+
+    Records are fixed-size and checksummed, so recovery only has to check the
+    last `group_commit_records` records (all a crash can leave unsynced) instead of
+    replaying the file. Appends are group-committed: one fsync covers up to
+    `group_commit_records` approvals, and a timer syncs the rest `group_commit_seconds`
+    after the first unsynced append, so a quiet terminal never sits on unsynced approvals.
+    A separate cursor file holds the offset the bank has acknowledged, so the
+    pending set is always the tail of the file after the cursor.
+    """
+
+    def __init__(self, path: str, group_commit_records: int = 8, group_commit_seconds: float = 0.05,
+                 truncate_after: int = 10_000):
+        self.path = path
+        self.cursor_path = f"{path}.cursor"
+        self.group_commit_records = group_commit_records
+        self.group_commit_seconds = group_commit_seconds
+        self.truncate_after = truncate_after
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()  # The flush timer fires on its own thread
+
+        if not os.path.exists(path):
+            self._write_file(path, base_offset=0, records=b"")
+        self._file = open(path, "r+b", buffering=0)
+        self.base_offset = self._recover()
+        self.acked_offset = max(self._read_cursor(), self.base_offset)
+
+    # Write path
+
+    def append(self, txn: Transaction) -> int:
+        """Journals one approval and returns its offset"""
+        body = BODY.pack(
+            txn.id_bytes,
+            txn.amount_minor,
+            txn.timestamp.timestamp(),
+            txn.card_number.encode(),
+            txn.seat.encode(),
+        )
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(body + struct.pack(">I", zlib.crc32(body)))
+            offset = self.end_offset - 1
+            self._unsynced += 1
+            if (self._unsynced >= self.group_commit_records
+                    or time.monotonic() - self._last_sync >= self.group_commit_seconds):
+                self.flush()
+            elif self._flush_timer is None:
+                # Deadline for this group, in case no further approval arrives to trigger it
+                self._flush_timer = threading.Timer(self.group_commit_seconds, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+            return offset
+
+    def flush(self):
+        """Group commit: make every appended record durable with one fsync"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._file.closed:
+                return
+            if self._unsynced:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    # Read path
+
+    @property
+    def end_offset(self) -> int:
+        size = os.fstat(self._file.fileno()).st_size
+        return self.base_offset + (size - HEADER.size) // RECORD_SIZE
+
+    @property
+    def pending_count(self) -> int:
+        return self.end_offset - self.acked_offset
+
+    def iter_pending(self, until: Optional[int] = None,
+                     chunk_records: int = 1024) -> Iterator[Tuple[int, Transaction]]:
+        """
+        Streams (offset, transaction) pairs over the unacknowledged tail in file order;
+        never touches settled records. After the bank settles a record, acknowledge(offset + 1).
+        """
+        end = self.end_offset if until is None else min(until, self.end_offset)
+        offset = self.acked_offset
+        while offset < end:
+            count = min(chunk_records, end - offset)
+            data = os.pread(self._file.fileno(), count * RECORD_SIZE, self._position(offset))
+            for i in range(count):
+                yield offset + i, self._decode(data[i * RECORD_SIZE:(i + 1) * RECORD_SIZE])
+            offset += count
+
+    # Settlement
+
+    def acknowledge(self, through_offset: int):
+        """The bank has settled every record before through_offset"""
+        if through_offset <= self.acked_offset:
+            return
+        self.acked_offset = min(through_offset, self.end_offset)
+        self._write_cursor(self.acked_offset)
+        if self.acked_offset - self.base_offset >= self.truncate_after or self.pending_count == 0:
+            self.truncate()
+
+    def truncate(self):
+        """Drops settled records by rewriting only the pending tail into a fresh file"""
+        with self._lock:
+            self.flush()
+            tail_start = self._position(self.acked_offset)
+            size = os.fstat(self._file.fileno()).st_size
+            tail = os.pread(self._file.fileno(), size - tail_start, tail_start)
+            self._file.close()
+            self._write_file(self.path, base_offset=self.acked_offset, records=tail)
+            self._file = open(self.path, "r+b", buffering=0)
+            self.base_offset = self.acked_offset
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._file.close()
+
+    # Internals
+
+    def _position(self, offset: int) -> int:
+        return HEADER.size + (offset - self.base_offset) * RECORD_SIZE
+
+    def _decode(self, record: bytes) -> Transaction:
+        raw_id, cents, ts, card, seat = BODY.unpack_from(record)
+        return Transaction(
+            id=raw_id,
+            card_number=card.rstrip(b"\0").decode(),
+            amount=cents / 100,
+            timestamp=datetime.fromtimestamp(ts),
+            seat=seat.rstrip(b"\0").decode(),
+            status=TransactionStatus.APPROVED,
+        )
+
+    def _recover(self) -> int:
+        """
+        Bounded startup: CRC-checks the unsynced window (the last group_commit_records
+        records) and truncates at the first torn or zero-filled record in it
+        """
+        header = self._file.read(HEADER.size)
+        magic, base_offset = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a transaction journal")
+        size = os.fstat(self._file.fileno()).st_size
+        good_size = HEADER.size + (size - HEADER.size) // RECORD_SIZE * RECORD_SIZE
+        window_start = max(HEADER.size, good_size - self.group_commit_records * RECORD_SIZE)
+        window = os.pread(self._file.fileno(), good_size - window_start, window_start)
+        for start in range(0, len(window), RECORD_SIZE):
+            if zlib.crc32(window[start:start + BODY.size]) != struct.unpack_from(">I", window, start + BODY.size)[0]:
+                # Nothing after a bad record was ever acknowledged as durable
+                good_size = window_start + start
+                break
+        if good_size != size:
+            self._file.truncate(good_size)
+            os.fsync(self._file.fileno())
+        return base_offset
+
+    def _read_cursor(self) -> int:
+        if not os.path.exists(self.cursor_path):
+            return 0
+        with open(self.cursor_path, "rb") as f:
+            data = f.read()
+        if len(data) != CURSOR.size:
+            return 0
+        offset, crc = CURSOR.unpack(data)
+        return offset if zlib.crc32(data[:8]) == crc else 0
+
+    def _write_cursor(self, offset: int):
+        packed = struct.pack(">Q", offset)
+        self._replace(self.cursor_path, packed + struct.pack(">I", zlib.crc32(packed)))
+
+    def _write_file(self, path: str, base_offset: int, records: bytes):
+        self._replace(path, HEADER.pack(MAGIC, base_offset) + records)
+
+    @staticmethod
+    def _replace(path: str, data: bytes):
+        # Write-then-rename: a crash leaves either the old or the new file, never half of one
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,60 @@
+"""Constant-time sliding-window velocity checks for the edge terminal"""
+import time
+from collections import OrderedDict, deque
+from typing import Callable
+
+
+class VelocityLimiter:
+    """
+    Allows at most `limit` approvals per card within `window_seconds`.
+
+    Each card keeps a deque of at most `limit` monotonic timestamps, trimmed from
+    the left as they age out. Cards are kept in least-recently-approved order, so
+    idle cards are swept from the front in amortized O(1) per call, and the
+    `max_cards` cap evicts the least recently active card first.
+    """
+
+    def __init__(self, limit: int, window_seconds: float = 120, max_cards: int = 10_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_cards = max_cards
+        self.clock = clock  # monotonic: immune to wall-clock changes while offline
+        self.cards: OrderedDict[str, deque] = OrderedDict()
+        self.stats = {"idle_swept": 0, "evicted": 0}
+
+    def allow(self, card_number: str) -> bool:
+        """Records an approval and returns True, or returns False if the card is over its limit"""
+        now = self.clock()
+        cutoff = now - self.window_seconds
+        self._sweep_idle(cutoff)
+
+        window = self.cards.get(card_number)
+        if window is None:
+            window = self.cards[card_number] = deque(maxlen=self.limit)
+            if len(self.cards) > self.max_cards:
+                self.cards.popitem(last=False)
+                self.stats["evicted"] += 1
+        else:
+            # Incremental expiry: at most `limit` pops, usually none
+            while window and window[0] <= cutoff:
+                window.popleft()
+
+        if len(window) >= self.limit:
+            return False
+
+        window.append(now)
+        self.cards.move_to_end(card_number)
+        return True
+
+    def _sweep_idle(self, cutoff: float):
+        # Front of the OrderedDict = card whose last approval is oldest
+        while self.cards:
+            card_number, window = next(iter(self.cards.items()))
+            if window and window[-1] > cutoff:
+                return
+            del self.cards[card_number]
+            self.stats["idle_swept"] += 1
+
+    def __len__(self) -> int:
+        return len(self.cards)
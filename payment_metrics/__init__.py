@@ -0,0 +1,11 @@
+"""Low-overhead instrumentation shared by the showcases (see bench.py for the end-to-end report)"""
+from .histogram import LatencyHistogram
+from .registry import Counter, MetricsRegistry, SampledLogger, metrics
+
+__all__ = [
+    "Counter",
+    "LatencyHistogram",
+    "MetricsRegistry",
+    "SampledLogger",
+    "metrics",
+]
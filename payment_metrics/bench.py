@@ -0,0 +1,322 @@
+"""
+Drives each showcase with a synthetic workload and emits a JSON throughput/latency
+report.  Run from the repo root:
+
+    python -m payment_metrics.bench --size 20000 --output before.json
+    python -m payment_metrics.bench --size 20000 --output after.json --baseline before.json
+
+Every scenario runs on a freshly loaded copy of its script(s), so module-level
+state (the mock databases) never leaks between scenarios. Timers are in microseconds.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import threading
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from .registry import metrics
+
+ROOT = Path(__file__).resolve().parents[1]
+_loaded = 0
+
+
+def load_script(relative_path: str):
+    """Imports a showcase script by path (most file names are not valid module names)"""
+    global _loaded
+    path = ROOT / relative_path
+    # Sibling modules (durable_log, models, ...) are imported by plain name
+    if str(path.parent) not in sys.path:
+        sys.path.insert(0, str(path.parent))
+    _loaded += 1
+    spec = importlib.util.spec_from_file_location(f"bench_showcase_{_loaded}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Payrun: batch to stream
+
+def payrun_legacy(size: int, seed: int) -> int:
+    payrun = load_script("payrun-batch-to-stream/legacy-batch-payrun/legacy-batch-payrun.py")
+    rng = random.Random(seed)
+    for _ in range(size):
+        payrun.add_payment(amount=round(rng.uniform(10, 500), 2))
+    payrun.run_legacy_batch()
+    return size
+
+
+def payrun_stream(size: int, seed: int) -> int:
+    """create_payment -> relay_process -> stream_worker, with a zero-latency bank"""
+    payrun = load_script("payrun-batch-to-stream/stream-payrun/stream-payrun.py")
+    threading.Thread(target=payrun.relay_process, name="BENCH-RELAY", daemon=True).start()
+    threading.Thread(target=payrun.stream_worker, name="BENCH-WORKER", daemon=True).start()
+    for _ in range(size):
+        payrun.create_payment(amount=100.0)
+    while payrun.database["outbox"]:
+        time.sleep(0.001)
+    payrun.message_stream.join()
+    return size
+
+
+def payrun_async(size: int, seed: int) -> int:
+    payrun = load_script("payrun-batch-to-stream/stream-payrun/async-stream-payrun.py")
+    asyncio.run(payrun.run_payrun(size, payrun.AsyncSimulatedBankClient(latency_seconds=0.0)))
+    return size
+
+
+# Offline transactions: authorize at the edge, sync on arrival, settle at the bank
+
+def offline(size: int, seed: int) -> int:
+    """Authorizes `size` swipes, syncs the approved ones, then re-syncs them as a lost-ack retry"""
+    terminal_script = load_script("offline-transactions/code/1-accept-offline-txn.py")
+    sync_script = load_script("offline-transactions/code/2-sync-on-arrive.py")
+    bank_script = load_script("offline-transactions/code/3-server-receive-batch.py")
+    models = sys.modules["models"]
+
+    rng = random.Random(seed)
+    config = models.TerminalConfig()
+    terminal = terminal_script.EdgeTerminal(config)
+    cards = [models.Card(f"4111{i:012d}") for i in range(max(1, size // 3))]
+    config.blacklist.update(card.number for card in cards[::50])
+    seats = [f"{row}{letter}" for row in range(1, 41) for letter in "ABCDEF"]
+    for _ in range(size):
+        terminal.authorize(rng.choice(cards), round(rng.uniform(1, 30), 2), rng.choice(seats))
+
+    # Everything the terminal approved (and stored) while offline
+    approved = list(terminal.storage)
+    bank = bank_script.AcquirerBank("Airline Bank")
+    sync = sync_script.SyncService(config)
+    sync.sync_transactions(approved, bank)
+    sync.sync_transactions(approved, bank)
+    return size
+
+
+# Immediate balance refresh: read routing strategies
+
+class ReadWorkload:
+    """
+    Mixed dashboard traffic: `reads` reads over `users` users, 90% on a hot 10%;
+    every `write_every`-th read follows a payment by the same user, and replication
+    runs every `replicate_every` payments, so some reads race their own write.
+    """
+
+    def __init__(self, size: int, seed: int, write_every: int = 10, replicate_every: int = 8):
+        self.reads = size
+        self.users = max(10, size // 10)
+        self.write_every = write_every
+        self.replicate_every = replicate_every
+        self.rng = random.Random(seed)
+
+    def user_ids(self) -> List[str]:
+        return [f"user_{i}" for i in range(self.users)]
+
+    def run(self, read: Callable[[str], float], write: Callable[[str], None], replicate: Callable[[], None]) -> int:
+        hot = max(1, self.users // 10)
+        writes = 0
+        for n in range(self.reads):
+            user_id = f"user_{self.rng.randrange(hot) if self.rng.random() < 0.9 else self.rng.randrange(self.users)}"
+            if n % self.write_every == 0:
+                write(user_id)
+                writes += 1
+                if writes % self.replicate_every == 0:
+                    replicate()
+            read(user_id)
+        return self.reads
+
+
+def reads_random_follower(size: int, seed: int) -> int:
+    demo = load_script("immediate-balance-refresh/legacy-follower-read/legacy-follower-read.py")
+    workload = ReadWorkload(size, seed)
+    for user_id in workload.user_ids():
+        demo.leader_db[user_id] = account = demo.Account(user_id, 1000.0, version=1)
+        demo.change_log.append(account)
+
+    def replicate():
+        for follower in demo.followers:
+            follower.catch_up(ignore_lag=True)
+        demo.change_log.truncate(min(f.applied_position for f in demo.followers))
+
+    replicate()
+    return workload.run(demo.read_balance_from_follower, lambda u: demo.write_payment(u, 1.0), replicate)
+
+
+def reads_client_cache(size: int, seed: int) -> int:
+    demo = load_script("immediate-balance-refresh/read-your-writes/1_client_side_cache.py")
+    workload = ReadWorkload(size, seed)
+    for user_id in workload.user_ids():
+        demo.leader_db[user_id] = demo.Account(user_id, 1000.0, 1)
+        demo.follower_db[user_id] = demo.Account(user_id, 1000.0, 1)
+    return workload.run(demo.read_balance, lambda u: demo.make_payment(u, 1.0), demo.replicate_changes)
+
+
+def reads_session_routing(size: int, seed: int) -> int:
+    demo = load_script("immediate-balance-refresh/read-your-writes/2_session_based_routing.py")
+    workload = ReadWorkload(size, seed)
+    for user_id in workload.user_ids():
+        demo.leader_db[user_id] = demo.Account(user_id, 1000.0, 1)
+        demo.follower_db[user_id] = demo.Account(user_id, 1000.0, 1)
+    written: List[str] = []
+
+    def write(user_id: str):
+        demo.make_payment(user_id, 1.0)
+        written.append(user_id)
+
+    def replicate():
+        for user_id in written:
+            leader = demo.leader_db[user_id]
+            demo.follower_db[user_id] = demo.Account(user_id, leader.balance, leader.version)
+        written.clear()
+
+    return workload.run(demo.read_balance, write, replicate)
+
+
+def reads_version_check(size: int, seed: int) -> int:
+    demo = load_script("immediate-balance-refresh/read-your-writes/3_version_based_consistency.py")
+    workload = ReadWorkload(size, seed)
+    for user_id in workload.user_ids():
+        demo.leader_db[user_id] = demo.Account(user_id, 1000.0, 1)
+        demo.follower_db[user_id] = demo.Account(user_id, 1000.0, 1)
+        demo.user_sessions[user_id] = demo.UserSession(user_id)
+    written: List[tuple] = []
+
+    def write(user_id: str):
+        written.append((user_id, *demo.make_payment(user_id, 1.0)))
+
+    def replicate():
+        for entry in written:
+            demo.apply_replicated_write(*entry)
+        written.clear()
+
+    return workload.run(demo.read_balance, write, replicate)
+
+
+def reads_lag_aware(size: int, seed: int) -> int:
+    demo = load_script("immediate-balance-refresh/read-your-writes/4_lag_aware_routing.py")
+    workload = ReadWorkload(size, seed)
+    for user_id in workload.user_ids():
+        demo.leader_db[user_id] = demo.Account(user_id, 1000.0, 1)
+        demo.user_sessions[user_id] = demo.UserSession(user_id)
+        for follower in demo.followers:
+            follower.db[user_id] = demo.Account(user_id, 1000.0, 1)
+    written: List[tuple] = []  # Leader writes in log order
+    applied = [0] * len(demo.followers)  # Per Follower: how much of `written` it has applied
+    turn = [0]
+
+    def write(user_id: str):
+        balance, log_version = demo.make_payment(user_id, 1.0)
+        written.append((user_id, balance, demo.leader_db[user_id].version, log_version))
+
+    def replicate():
+        # One Follower catches up per round, so the others lag behind it
+        i = turn[0] % len(demo.followers)
+        turn[0] += 1
+        for entry in written[applied[i]:]:
+            demo.apply_replicated_write(demo.followers[i], *entry)
+        applied[i] = len(written)
+
+    return workload.run(demo.read_balance, write, replicate)
+
+
+# name -> (workload, unit, histogram that times one unit of work)
+SCENARIOS: Dict[str, tuple] = {
+    "payrun-legacy": (payrun_legacy, "payments", "payrun.legacy.payment"),
+    "payrun-stream": (payrun_stream, "payments", "payrun.stream.end_to_end"),
+    "payrun-async": (payrun_async, "payments", "payrun.stream.end_to_end"),
+    "offline": (offline, "swipes", "offline.authorize"),
+    "reads-random-follower": (reads_random_follower, "reads", "reads.random_follower"),
+    "reads-client-cache": (reads_client_cache, "reads", "reads.client_cache"),
+    "reads-session-routing": (reads_session_routing, "reads", "reads.session_routing"),
+    "reads-version-check": (reads_version_check, "reads", "reads.version_check"),
+    "reads-lag-aware": (reads_lag_aware, "reads", "reads.lag_aware"),
+}
+
+
+def run_scenario(name: str, size: int, seed: int) -> dict:
+    workload, unit, primary = SCENARIOS[name]
+    metrics.reset()
+    started = time.perf_counter()
+    records = workload(size, seed)
+    elapsed = time.perf_counter() - started
+    snapshot = metrics.snapshot()
+    return {
+        "unit": unit,
+        "records": records,
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_per_sec": round(records / elapsed, 1) if elapsed else 0.0,
+        "latency_us": snapshot["histograms"].get(primary),
+        **snapshot,
+    }
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    """One line per scenario present in both reports: throughput and p99 change"""
+    lines = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        change = current["throughput_per_sec"] / previous["throughput_per_sec"] - 1 \
+            if previous["throughput_per_sec"] else 0.0
+        line = (f"  {name:<22} {previous['throughput_per_sec']:>12,.0f} -> {current['throughput_per_sec']:>12,.0f} "
+                f"{current['unit']}/sec ({change:+.1%})")
+        if current.get("latency_us") and previous.get("latency_us"):
+            line += f"  p99 {previous['latency_us']['p99']:,.1f} -> {current['latency_us']['p99']:,.1f}us"
+        lines.append(line)
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end showcase benchmark (JSON report)")
+    parser.add_argument("--size", type=int, default=20_000, help="payments / swipes / reads per scenario")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="run just these scenarios")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier report to compare throughput and p99 against")
+    parser.add_argument("--log-sample-every", type=int, default=0,
+                        help="per-record log lines: 0 = none (default), N = every Nth")
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="turn instrumentation off to measure its overhead (throughput only)")
+    args = parser.parse_args()
+
+    metrics.configure(enabled=not args.no_metrics, log_sample_every=args.log_sample_every)
+    if args.log_sample_every == 0:
+        # Job-level INFO lines too: the report is the output
+        logging.disable(logging.INFO)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size": args.size,
+            "seed": args.seed,
+            "metrics_enabled": metrics.enabled,
+            "log_sample_every": args.log_sample_every,
+        },
+        "scenarios": {},
+    }
+    for name in args.only or SCENARIOS:
+        result = report["scenarios"][name] = run_scenario(name, args.size, args.seed)
+        latency = result["latency_us"] or {}
+        print(f"{name:<22} {result['throughput_per_sec']:>12,.0f} {result['unit']}/sec  "
+              f"p50 {latency.get('p50', 0):,.1f}us  p99 {latency.get('p99', 0):,.1f}us", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(f"vs {args.baseline}:", file=sys.stderr)
+            print("\n".join(compare(report, json.load(f))), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,145 @@
+"""HDR-style latency histogram: bounded memory, fixed relative error, mergeable across threads and runs"""
+import math
+import threading
+from typing import Dict, List, Tuple
+
+
+class _Shard:
+    """One recording thread's buckets: only that thread writes them, so no lock per record"""
+    __slots__ = ("counts", "total", "sum", "max")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class LatencyHistogram:
+    """
+    Log-linear buckets (HDR-style): each power of two is split into `sub_buckets`
+    linear steps, so any recorded value is within 1/sub_buckets of its bucket.
+    Values are plain numbers; the timers record microseconds.
+
+    Each recording thread fills its own shard and readers merge the shards, so
+    record() never waits on another thread.
+    """
+
+    def __init__(self, sub_buckets: int = 32):
+        self.sub_buckets = sub_buckets
+        self._lock = threading.Lock()  # Guards the shard list, taken once per recording thread
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._local = threading.local()
+            self._shards: List[_Shard] = []
+
+    def _new_shard(self) -> _Shard:
+        shard = _Shard()
+        with self._lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    def _index(self, value: float) -> int:
+        if value < 1:
+            return int(value * self.sub_buckets)
+        # value = mantissa * 2 ** exponent with 0.5 <= mantissa < 1
+        mantissa, exponent = math.frexp(value)
+        return exponent * self.sub_buckets + int((mantissa * 2 - 1) * self.sub_buckets)
+
+    def _upper_bound(self, index: int) -> float:
+        exponent, step = divmod(index, self.sub_buckets)
+        if exponent == 0:
+            return (step + 1) / self.sub_buckets
+        return 2 ** (exponent - 1) * (1 + (step + 1) / self.sub_buckets)
+
+    def record(self, value: float):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        # _index(), inlined: this runs on every timed call
+        sub_buckets = self.sub_buckets
+        if value < 1:
+            index = int(value * sub_buckets)
+        else:
+            mantissa, exponent = math.frexp(value)
+            index = exponent * sub_buckets + int((mantissa * 2 - 1) * sub_buckets)
+        shard.counts[index] = shard.counts.get(index, 0) + 1
+        shard.total += 1
+        shard.sum += value
+        if value > shard.max:
+            shard.max = value
+
+    def _merged(self) -> Tuple[Dict[int, int], int, float, float]:
+        with self._lock:
+            shards = list(self._shards)
+        counts: Dict[int, int] = {}
+        total, total_sum, maximum = 0, 0.0, 0.0
+        for shard in shards:
+            # dict() copies in one step, so a concurrent record() cannot break the iteration
+            for index, count in dict(shard.counts).items():
+                counts[index] = counts.get(index, 0) + count
+            total += shard.total
+            total_sum += shard.sum
+            maximum = max(maximum, shard.max)
+        return counts, total, total_sum, maximum
+
+    def merge(self, other: "LatencyHistogram"):
+        """Adds another histogram with the same sub_buckets (e.g. from another run) into this one"""
+        if other.sub_buckets != self.sub_buckets:
+            raise ValueError("Cannot merge histograms with different sub_buckets")
+        shard = _Shard()
+        shard.counts, shard.total, shard.sum, shard.max = other._merged()
+        with self._lock:
+            self._shards.append(shard)
+
+    @property
+    def total(self) -> int:
+        return self._merged()[1]
+
+    @property
+    def max(self) -> float:
+        return self._merged()[3]
+
+    @property
+    def mean(self) -> float:
+        _, total, total_sum, _ = self._merged()
+        return total_sum / total if total else 0.0
+
+    def percentile(self, p: float) -> float:
+        return self._percentiles(self._merged(), p)[0]
+
+    def _percentiles(self, merged: Tuple[Dict[int, int], int, float, float], *ps: float) -> List[float]:
+        counts, total, _, maximum = merged
+        if not total:
+            return [0.0 for _ in ps]
+        ordered = sorted(counts.items())
+        results = []
+        for p in ps:
+            rank = math.ceil(total * p / 100)
+            seen = 0
+            value = maximum
+            for index, count in ordered:
+                seen += count
+                if seen >= rank:
+                    value = min(self._upper_bound(index), maximum)
+                    break
+            results.append(value)
+        return results
+
+    def summary(self) -> dict:
+        merged = self._merged()
+        _, total, total_sum, maximum = merged
+        p50, p90, p99, p999 = self._percentiles(merged, 50, 90, 99, 99.9)
+        return {
+            "count": total,
+            "mean": round(total_sum / total, 3) if total else 0.0,
+            "p50": round(p50, 3),
+            "p90": round(p90, 3),
+            "p99": round(p99, 3),
+            "p999": round(p999, 3),
+            "max": round(maximum, 3),
+        }
@@ -0,0 +1,190 @@
+"""Named counters, timers and sampled per-record logging shared by the showcases"""
+import os
+import time
+import logging
+import threading
+import functools
+import inspect
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+from .histogram import LatencyHistogram
+
+_NULL_SPAN = nullcontext()
+
+
+class Counter:
+    """Per-thread cells summed on read, like the histogram shards: inc() takes no lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._local = threading.local()
+            self._cells: List[List[int]] = []
+
+    def inc(self, n: int = 1):
+        try:
+            self._local.cell[0] += n
+        except AttributeError:
+            cell = self._local.cell = [n]
+            with self._lock:
+                self._cells.append(cell)
+
+    @property
+    def value(self) -> int:
+        with self._lock:
+            cells = list(self._cells)
+        return sum(cell[0] for cell in cells)
+
+
+class _Span:
+    """One timed section: records its duration in microseconds on exit"""
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: LatencyHistogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record((time.perf_counter_ns() - self.started) / 1000)
+        return False
+
+
+class SampledLogger:
+    """
+    Per-record logging for hot loops: logs the 1st call and then every Nth one,
+    where N is the registry's log_sample_every (0 = never, 1 = every record).
+    Takes %-style arguments, so skipped records are never formatted.
+    """
+
+    def __init__(self, logger: logging.Logger, registry: "MetricsRegistry"):
+        self.logger = logger
+        self.registry = registry
+        self._calls = 0
+
+    def _due(self) -> bool:
+        every = self.registry.log_sample_every
+        if every <= 0:
+            return False
+        self._calls += 1  # A lost increment under contention only shifts which record is logged
+        return every == 1 or self._calls % every == 1
+
+    def info(self, msg: str, *args):
+        if self._due():
+            self.logger.info(msg, *args)
+
+    def warning(self, msg: str, *args):
+        if self._due():
+            self.logger.warning(msg, *args)
+
+
+class MetricsRegistry:
+    """
+    Process-wide registry of named counters and latency histograms.
+
+    Timers record microseconds into a LatencyHistogram, so a snapshot gives
+    p50/p99/p99.9 without keeping every sample. With `enabled` off, time() and
+    timed() fall through to the wrapped code with no clock reads at all.
+    """
+
+    def __init__(self, enabled: bool = True, log_sample_every: int = 1):
+        self.enabled = enabled
+        self.log_sample_every = log_sample_every
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: Optional[bool] = None, log_sample_every: Optional[int] = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if log_sample_every is not None:
+            self.log_sample_every = log_sample_every
+
+    def counter(self, name: str) -> Counter:
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counter(name).inc(n)
+
+    def time(self, name: str):
+        """Context manager: `with metrics.time("settle_batch"): ...`"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self.histogram(name))
+
+    def timed(self, name: str) -> Callable:
+        """Decorator form of time(); works on plain functions, methods and coroutines"""
+
+        def decorate(fn):
+            histogram = self.histogram(name)
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await fn(*args, **kwargs)
+                    started = time.perf_counter_ns()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        histogram.record((time.perf_counter_ns() - started) / 1000)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter_ns()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    histogram.record((time.perf_counter_ns() - started) / 1000)
+            return wrapper
+
+        return decorate
+
+    def sampled(self, logger: logging.Logger) -> SampledLogger:
+        return SampledLogger(logger, self)
+
+    def snapshot(self) -> dict:
+        """Counter values and histogram summaries (timers in microseconds) recorded since the last reset"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        counts = {name: counters[name].value for name in sorted(counters)}
+        summaries = {name: histograms[name].summary() for name in sorted(histograms)}
+        return {
+            "counters": {name: value for name, value in counts.items() if value},
+            "histograms": {name: summary for name, summary in summaries.items() if summary["count"]},
+        }
+
+    def reset(self):
+        """Zeroes every metric in place (decorated functions keep their histogram)"""
+        with self._lock:
+            metrics = list(self._counters.values()) + list(self._histograms.values())
+        for metric in metrics:
+            metric.clear()
+
+
+# PAYMENT_METRICS=0 turns instrumentation off; PAYMENT_LOG_SAMPLE_EVERY=N logs every Nth hot-loop record
+metrics = MetricsRegistry(
+    enabled=os.environ.get("PAYMENT_METRICS", "1") != "0",
+    log_sample_every=int(os.environ.get("PAYMENT_LOG_SAMPLE_EVERY", "1")),
+)
@@ -0,0 +1,19 @@
+"""Compact record types shared by the showcases (see benchmark.py for their memory footprint)"""
+from .ids import new_uuid, pack_uuid, unpack_uuid
+from .money import MINOR_UNITS, from_minor, to_minor
+from .records import Account, OutboxEvent, Payment, PaymentStatus, Transaction, TransactionStatus
+
+__all__ = [
+    "Account",
+    "MINOR_UNITS",
+    "OutboxEvent",
+    "Payment",
+    "PaymentStatus",
+    "Transaction",
+    "TransactionStatus",
+    "from_minor",
+    "new_uuid",
+    "pack_uuid",
+    "to_minor",
+    "unpack_uuid",
+]
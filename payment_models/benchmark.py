@@ -0,0 +1,138 @@
+"""
+Bytes and allocations per record: the showcases' original dataclasses vs the slotted
+records.  Run from the repo root:  python -m payment_models.benchmark
+"""
+import gc
+import os
+import sys
+import time
+import uuid
+import argparse
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from .records import Account, Payment, Transaction, TransactionStatus
+
+SEATS = [f"{row}{letter}" for row in range(1, 41) for letter in "ABCDEF"]
+STATUSES = ["PENDING", "PROCESSING", "COMPLETED"]
+EPOCH = datetime(2026, 1, 1)
+
+
+# The layouts being replaced
+@dataclass
+class DataclassPayment:
+    id: str
+    amount: float
+    status: str
+    created_at: float = 0.0
+    completed_at: float = None
+
+
+@dataclass
+class DataclassAccount:
+    user_id: str
+    balance: float
+    version: int = 0
+
+
+@dataclass
+class DataclassTransaction:
+    id: str
+    card_number: str
+    amount: float
+    timestamp: datetime
+    seat: str
+    status: TransactionStatus
+
+
+def payments_dataclass(n):
+    return [DataclassPayment(f"pay_{i:032x}", (i % 10_000) / 100 + 0.01, STATUSES[i % 3], time.perf_counter())
+            for i in range(n)]
+
+
+def payments_slotted(n):
+    return [Payment(f"pay_{i:032x}", (i % 10_000) / 100 + 0.01, STATUSES[i % 3]) for i in range(n)]
+
+
+def accounts_dataclass(n):
+    return [DataclassAccount(f"user_{i}", 1000.0 + i % 997, 1) for i in range(n)]
+
+
+def accounts_slotted(n):
+    return [Account(f"user_{i}", 1000.0 + i % 997, 1) for i in range(n)]
+
+
+def transactions_dataclass(n):
+    return [DataclassTransaction(str(uuid.uuid4()), f"4{i:015d}", (i % 2500) / 100 + 0.5,
+                                 EPOCH + timedelta(seconds=i), SEATS[i % len(SEATS)], TransactionStatus.APPROVED)
+            for i in range(n)]
+
+
+def transactions_slotted(n):
+    return [Transaction(uuid.uuid4().bytes, f"4{i:015d}", (i % 2500) / 100 + 0.5,
+                        EPOCH + timedelta(seconds=i), SEATS[i % len(SEATS)], TransactionStatus.APPROVED)
+            for i in range(n)]
+
+
+CASES = [
+    ("Payment", "dataclass", payments_dataclass),
+    ("Payment", "slotted", payments_slotted),
+    ("Account", "dataclass", accounts_dataclass),
+    ("Account", "slotted", accounts_slotted),
+    ("Transaction", "dataclass", transactions_dataclass),
+    ("Transaction", "slotted", transactions_slotted),
+]
+
+
+def _resident_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(case: int, n: int) -> tuple[float, float, float]:
+    """
+    (bytes per record, allocated blocks per record, build seconds), including the list
+    or arrays holding the records. Runs in a fresh process so earlier cases' freed
+    memory cannot be reused; uses resident memory where /proc exists, else tracemalloc.
+    """
+    build = CASES[case][2]
+    use_proc = os.path.exists("/proc/self/statm")
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    if use_proc:
+        memory_before = _resident_bytes()
+    else:
+        tracemalloc.start()
+    started = time.perf_counter()
+    records = build(n)
+    elapsed = time.perf_counter() - started
+    if use_proc:
+        memory = _resident_bytes() - memory_before
+    else:
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del records
+    return memory / n, blocks / n, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record memory benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000],
+                        help="records per case, e.g. --sizes 1000000 10000000 (10M needs several GB)")
+    parser.add_argument("--only", choices=sorted({record for record, _, _ in CASES}))
+    args = parser.parse_args()
+
+    spawn = multiprocessing.get_context("spawn")
+    for n in args.sizes:
+        print(f"{n:,} records")
+        for case, (record, layout, _) in enumerate(CASES):
+            if args.only and record != args.only:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                per_record, blocks, elapsed = pool.submit(measure, case, n).result()
+            print(f"  {record:<12} {layout:<15} {per_record:7.1f} bytes/record  "
+                  f"{blocks:4.1f} allocations/record  built in {elapsed:5.2f}s")
@@ -0,0 +1,20 @@
+"""Binary ids: a UUID is 16 raw bytes instead of a 36-character string"""
+import uuid
+from typing import Union
+
+
+def pack_uuid(value: Union[str, bytes]) -> bytes:
+    """Accepts the canonical string or the 16 raw bytes"""
+    if isinstance(value, bytes):
+        if len(value) != 16:
+            raise ValueError(f"expected 16 bytes, got {len(value)}")
+        return value
+    return uuid.UUID(value).bytes
+
+
+def unpack_uuid(raw: bytes) -> str:
+    return str(uuid.UUID(bytes=raw))
+
+
+def new_uuid() -> bytes:
+    return uuid.uuid4().bytes
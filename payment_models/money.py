@@ -0,0 +1,12 @@
+"""Money as integer minor units (cents): exact, and an int is smaller than a float box for small values"""
+
+MINOR_UNITS = 100
+
+
+def to_minor(amount: float) -> int:
+    """12.34 -> 1234 (rounded, so 0.1 + 0.2 style float noise never leaks into balances)"""
+    return round(amount * MINOR_UNITS)
+
+
+def from_minor(minor: int) -> float:
+    return minor / MINOR_UNITS
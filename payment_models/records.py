@@ -0,0 +1,132 @@
+"""
+Slotted hot records shared by the showcases.
+
+Each class keeps the attribute names and constructor keywords of the dataclass it
+replaces (amount/balance read and write as floats, ids as strings), but stores
+amounts as integer minor units, UUIDs as 16 bytes and statuses as enum members,
+and has no per-instance __dict__.
+"""
+import sys
+import time
+from datetime import datetime
+from enum import Enum
+from typing import Optional, Union
+
+from .ids import pack_uuid, unpack_uuid
+from .money import from_minor, to_minor
+
+
+class PaymentStatus(str, Enum):
+    """Compares equal to the plain strings the payrun code and SQL use"""
+    PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+
+# Value or member -> member, without going through Enum's slower __call__
+_PAYMENT_STATUSES = {status.value: status for status in PaymentStatus}
+
+
+class TransactionStatus(Enum):
+    PENDING_SYNC = "PENDING_SYNC"
+    APPROVED = "APPROVED"
+    DECLINED = "DECLINED"
+    SYNCED = "SYNCED"
+
+
+class Payment:
+    __slots__ = ("id", "amount_minor", "_status", "created_at", "completed_at")
+
+    def __init__(self, id: str, amount: float, status: Union[str, PaymentStatus],
+                 created_at: Optional[float] = None, completed_at: Optional[float] = None):
+        self.id = id
+        self.amount_minor = to_minor(amount)
+        self.status = status
+        self.created_at = time.perf_counter() if created_at is None else created_at
+        self.completed_at = completed_at  # Set when the bank call finishes (for latency stats)
+
+    @property
+    def amount(self) -> float:
+        return from_minor(self.amount_minor)
+
+    @amount.setter
+    def amount(self, value: float):
+        self.amount_minor = to_minor(value)
+
+    @property
+    def status(self) -> PaymentStatus:
+        return self._status
+
+    @status.setter
+    def status(self, value: Union[str, PaymentStatus]):
+        # One shared member per status, not a string per record
+        self._status = _PAYMENT_STATUSES.get(value) or PaymentStatus(value)
+
+    def __repr__(self) -> str:
+        return f"Payment(id={self.id!r}, amount={self.amount!r}, status={self.status.value!r})"
+
+
+class OutboxEvent:
+    __slots__ = ("id", "payment_id", "seq", "processed")
+
+    def __init__(self, id: str, payment_id: str, seq: int = 0, processed: bool = False):
+        self.id = id
+        self.payment_id = payment_id
+        self.seq = seq  # Monotonic position in the outbox (like a WAL/LSN offset)
+        self.processed = processed
+
+    def __repr__(self) -> str:
+        return f"OutboxEvent(id={self.id!r}, payment_id={self.payment_id!r}, seq={self.seq}, processed={self.processed})"
+
+
+class Account:
+    __slots__ = ("user_id", "balance_minor", "version")
+
+    def __init__(self, user_id: str, balance: float, version: int = 0):
+        self.user_id = user_id
+        self.balance_minor = to_minor(balance)
+        self.version = version
+
+    @property
+    def balance(self) -> float:
+        return from_minor(self.balance_minor)
+
+    @balance.setter
+    def balance(self, value: float):
+        self.balance_minor = to_minor(value)
+
+    def __repr__(self) -> str:
+        return f"Account(user_id={self.user_id!r}, balance={self.balance!r}, version={self.version})"
+
+
+class Transaction:
+    __slots__ = ("id_bytes", "card_number", "amount_minor", "timestamp", "seat", "status")
+
+    def __init__(self, id: Union[str, bytes], card_number: str, amount: float, timestamp: datetime,
+                 seat: str, status: TransactionStatus):
+        self.id_bytes = pack_uuid(id)
+        self.card_number = card_number
+        self.amount_minor = to_minor(amount)
+        self.timestamp = timestamp
+        self.seat = sys.intern(seat)  # A few hundred distinct seats per aircraft; unique ids are not interned
+        self.status = status
+
+    @property
+    def id(self) -> str:
+        return unpack_uuid(self.id_bytes)
+
+    @property
+    def amount(self) -> float:
+        return from_minor(self.amount_minor)
+
+    @amount.setter
+    def amount(self, value: float):
+        self.amount_minor = to_minor(value)
+
+    def __repr__(self) -> str:
+        return (f"Transaction(id={self.id!r}, card_number={self.card_number!r}, amount={self.amount!r}, "
+                f"timestamp={self.timestamp!r}, seat={self.seat!r}, status={self.status})")
@@ -1,21 +1,60 @@
+import os
+import json
+import time
 import uuid
+import zlib
 import random
+import sys
+import hashlib
 import logging
-from dataclasses import dataclass
+import sqlite3
+import argparse
+from bisect import bisect_right
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared packages at the repo root
+from payment_metrics import metrics
+from payment_models import Payment
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(name)s: %(message)s')
 logger = logging.getLogger("BATCH-PAYRUN")
-
-@dataclass
-class Payment:
-    id: str
-    amount: float
-    status: str  # PENDING, PROCESSING, COMPLETED
+# Per-payment lines go through sampling (PAYMENT_LOG_SAMPLE_EVERY), job-level lines do not
+payment_log = metrics.sampled(logger)
 
 # Mock Database Store (Expected to contain data in a real scenario)
-database = {"payments": {}}
+database = {
+    "payments": {},
+    # PENDING ids (Simulating: CREATE INDEX ON payments (id) WHERE status = 'PENDING').
+    # Inserts append; the index is sorted once when a chunked run starts.
+    # Chunked mode only sees ids in here: insert through add_payment(), or load_table() to rebuild it.
+    "pending_index": [],
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_CHECKPOINT_PATH = "payrun.checkpoint.json"
+# The mock table lives in memory: chunked mode snapshots it here so another process can resume
+DEFAULT_TABLE_PATH = "payrun.table.json"
+
+# Sharded mode: the shared store that every worker process (and every overlapping cron run) sees
+DEFAULT_SHARD_DB_PATH = "payrun.db"
+SHARD_LEASE_SECONDS = 60
+SHARD_KEY_SPACE = 2 ** 32
+# Simulated per-payment work (stands in for the external API call)
+BANK_CALL_WORK_ITERATIONS = 200
 
+def add_payment(amount: float) -> str:
+    """Inserts a PENDING payment and maintains the status index (what the API would do)"""
+    payment_id = f"pay_{uuid.uuid4().hex}"
+    database["payments"][payment_id] = Payment(id=payment_id, amount=amount, status="PENDING")
+    # uuid4 ids arrive in random order: insort would shift the list on every insert
+    database["pending_index"].append(payment_id)
+    return payment_id
+
+@metrics.timed("payrun.legacy.job")
 def run_legacy_batch():
     """
     Simulates a periodic SQL job.
@@ -35,19 +74,329 @@ def run_legacy_batch():
     
     # 2. Sequential processing
     for p_id in pending_ids:
-        payment = database["payments"][p_id]
+        with metrics.time("payrun.legacy.payment"):
+            payment = database["payments"][p_id]
+            
+            # Update state locally
+            payment.status = "PROCESSING"
+            
+            # Process logic (e.g. external API call would go here)
+            payment.status = "COMPLETED"
+        
+        payment_log.info("DONE: Payment %s updated to COMPLETED.", p_id)
+    metrics.count("payrun.legacy.completed", len(pending_ids))
+
+    logger.info(">>> JOB FINISHED.")
+
+def iter_pending_chunks(chunk_size: int, after_id: Optional[str] = None) -> Iterator[list[str]]:
+    """
+    Keyset pagination over the PENDING index, claiming one chunk at a time.
+    This simulates, per chunk:
+        UPDATE payments SET status = 'PROCESSING'
+        WHERE id IN (SELECT id FROM payments WHERE status = 'PENDING' AND id > :after_id
+                     ORDER BY id LIMIT :chunk_size)
+    Only one chunk of ids is materialized at a time.
+    """
+    index = database["pending_index"]
+    # One O(n log n) sort per run (Timsort is ~linear when only a new tail is unsorted)
+    index.sort()
+    while True:
+        # Seek past the last key instead of OFFSET/full scan: O(log n)
+        start = bisect_right(index, after_id) if after_id is not None else 0
+        ids = index[start:start + chunk_size]
+        if not ids:
+            return
+        # Claimed rows leave the PENDING index
+        del index[start:start + len(ids)]
+        after_id = ids[-1]
+        
+        claimed = []
+        for p_id in ids:
+            payment = database["payments"][p_id]
+            # Re-check the row: the index may lag behind a status change
+            if payment.status == "PENDING":
+                payment.status = "PROCESSING"
+                claimed.append(p_id)
+        if claimed:
+            yield claimed
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"after_id": None, "in_flight": [], "processed": 0, "chunks": 0}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, checkpoint: dict):
+    write_json(path, checkpoint)
+
+def write_json(path: str, data):
+    # Write-then-rename so a crash never leaves a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_table(path: str):
+    """Snapshots the in-memory payments table (a real database is durable on its own)"""
+    write_json(path, [[p.id, p.amount, p.status] for p in database["payments"].values()])
+
+def load_table(path: str):
+    """Restores a save_table() snapshot and rebuilds the PENDING index from the table"""
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        rows = json.load(f)
+    database["payments"] = {p_id: Payment(id=p_id, amount=amount, status=status) for p_id, amount, status in rows}
+    database["pending_index"] = [p_id for p_id, _, status in rows if status == "PENDING"]
+
+def validate_checkpoint(checkpoint: dict):
+    """
+    Refuses to resume from a checkpoint that does not belong to the current data:
+    its after_id must be a payment a previous run already claimed. Otherwise
+    resuming would silently skip every PENDING id at or below after_id.
+    """
+    after_id = checkpoint["after_id"]
+    if after_id is None:
+        return
+    payment = database["payments"].get(after_id)
+    if payment is None or payment.status == "PENDING":
+        raise ValueError(f"Checkpoint resumes after {after_id}, which is not a claimed payment here; "
+                         f"it belongs to other data. Delete the checkpoint file to start a fresh pass.")
+
+def complete_chunk(chunk: list[str]) -> int:
+    """Process logic for a claimed chunk (e.g. external API calls would go here)"""
+    completed = 0
+    for p_id in chunk:
+        payment = database["payments"].get(p_id)
+        if payment is None:
+            # A checkpointed id the table no longer has: flag it, do not crash the resume
+            logger.warning(f"Skipping unknown payment {p_id} from the checkpoint.")
+            metrics.count("payrun.chunked.unknown_ids")
+            continue
+        # Idempotency: a resumed chunk may already be partly COMPLETED
+        if payment.status == "PROCESSING":
+            payment.status = "COMPLETED"
+            completed += 1
+    return completed
+
+def run_chunked_batch(chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+                      max_chunks: Optional[int] = None,
+                      table_path: Optional[str] = None) -> dict:
+    """
+    Streaming version of the payrun job.
+    Logic: Claim fixed-size chunks from the PENDING index, process them,
+    and checkpoint after each one so a crashed job resumes where it stopped.
+    max_chunks stops the job early (e.g. to stay inside the cron window).
+    The checkpoint refers to rows of the in-memory table: to resume from another
+    process, pass table_path here and load_table() it there before running.
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    validate_checkpoint(checkpoint)
+    logger.info(f">>> JOB START (chunked): resuming after {checkpoint['after_id']}, "
+                f"{checkpoint['processed']} payments already done.")
+    
+    # 1. Finish the chunk that was in flight when the previous run crashed
+    if checkpoint["in_flight"]:
+        completed = complete_chunk(checkpoint["in_flight"])
+        checkpoint["processed"] += completed
+        checkpoint["in_flight"] = []
+        save_checkpoint(checkpoint_path, checkpoint)
+        logger.info(f"Recovered in-flight chunk: {completed} payments COMPLETED.")
+    
+    # 2. Claim and process the remaining PENDING rows chunk by chunk
+    started = time.perf_counter()
+    chunks_this_run = 0
+    for chunk in iter_pending_chunks(chunk_size, checkpoint["after_id"]):
+        chunk_started = time.perf_counter()
+        # Record the claim before doing any work on it
+        checkpoint["in_flight"] = chunk
+        checkpoint["after_id"] = chunk[-1]
+        save_checkpoint(checkpoint_path, checkpoint)
+        
+        completed = complete_chunk(chunk)
         
-        # Update state locally
-        payment.status = "PROCESSING"
+        checkpoint["in_flight"] = []
+        checkpoint["processed"] += completed
+        checkpoint["chunks"] += 1
+        save_checkpoint(checkpoint_path, checkpoint)
+        chunks_this_run += 1
         
-        # Process logic (e.g. external API call would go here)
-        payment.status = "COMPLETED"
+        logger.info(f"CHUNK {checkpoint['chunks']}: {completed} payments COMPLETED "
+                    f"({chunk[0]}..{chunk[-1]}) in {(time.perf_counter() - chunk_started) * 1000:.1f}ms.")
         
-        logger.info(f"DONE: Payment {p_id} updated to COMPLETED.")
+        if max_chunks is not None and chunks_this_run >= max_chunks:
+            logger.info(">>> JOB PAUSED: chunk limit reached, next run resumes from checkpoint.")
+            break
+    else:
+        if chunks_this_run == 0:
+            logger.info("No work found. Job exiting.")
+        else:
+            logger.info(">>> JOB FINISHED.")
+        # Pass complete: the next run starts a fresh pass from the lowest PENDING id
+        save_checkpoint(checkpoint_path, {"after_id": None, "in_flight": [], "processed": 0, "chunks": 0})
+    if table_path is not None:
+        save_table(table_path)
+    
+    elapsed = time.perf_counter() - started
+    return {"processed": checkpoint["processed"], "chunks": chunks_this_run, "elapsed_seconds": elapsed}
 
-    logger.info(">>> JOB FINISHED.")
+def shard_key(payment_id: str) -> int:
+    return zlib.crc32(payment_id.encode())
+
+def shard_ranges(num_shards: int) -> list[tuple[int, int]]:
+    """Splits the hash space into num_shards contiguous [lo, hi) ranges"""
+    step = SHARD_KEY_SPACE // num_shards
+    return [(i * step, SHARD_KEY_SPACE if i == num_shards - 1 else (i + 1) * step) for i in range(num_shards)]
+
+def export_to_shard_store(db_path: str):
+    """
+    Copies the in-memory payments table into a store that worker processes can share.
+    Existing rows keep their status, so overlapping runs do not reset each other's claims.
+    """
+    # Close explicitly: a connection inherited across fork() corrupts SQLite's file locks
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS payments (
+            id TEXT PRIMARY KEY, amount REAL, status TEXT, shard_key INTEGER,
+            lease_owner TEXT, lease_until REAL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS payments_status_shard ON payments (status, shard_key)")
+        conn.execute("CREATE TABLE IF NOT EXISTS shard_leases (shard TEXT PRIMARY KEY, owner TEXT, lease_until REAL)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO payments (id, amount, status, shard_key) VALUES (?, ?, ?, ?)",
+            ((p.id, p.amount, p.status, shard_key(p.id)) for p in database["payments"].values()),
+        )
+
+def simulate_bank_call(payment_id: str):
+    digest = payment_id.encode()
+    for _ in range(BANK_CALL_WORK_ITERATIONS):
+        digest = hashlib.sha256(digest).digest()
+
+def process_shard(db_path: str, shard: str, lo: int, hi: int, owner: str, chunk_size: int) -> dict:
+    """
+    Runs in a worker process. Leases one shard, then claims and completes its
+    PENDING rows chunk by chunk. Every state change is a compare-and-set, so a
+    row is only ever processed by the run that won its PENDING -> PROCESSING claim.
+    """
+    started = time.perf_counter()
+    stats = {"shard": shard, "owner": owner, "completed": 0, "leased": False, "seconds": 0.0}
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        # 1. Lease the shard: fails if another live run already holds it
+        now = time.time()
+        conn.execute("INSERT OR IGNORE INTO shard_leases (shard, owner, lease_until) VALUES (?, NULL, 0)", (shard,))
+        leased = conn.execute(
+            "UPDATE shard_leases SET owner = ?, lease_until = ? WHERE shard = ? AND (owner IS NULL OR lease_until < ?)",
+            (owner, now + SHARD_LEASE_SECONDS, shard, now),
+        ).rowcount
+        if not leased:
+            return stats
+        stats["leased"] = True
+        
+        while True:
+            # 2. Claim a chunk: PENDING -> PROCESSING as a single CAS statement.
+            #    Rows whose lease expired (a crashed run) are reclaimable too.
+            now = time.time()
+            claimed = [row[0] for row in conn.execute(
+                """UPDATE payments SET status = 'PROCESSING', lease_owner = ?, lease_until = ?
+                   WHERE id IN (SELECT id FROM payments
+                                WHERE shard_key >= ? AND shard_key < ?
+                                  AND (status = 'PENDING' OR (status = 'PROCESSING' AND lease_until < ?))
+                                LIMIT ?)
+                   RETURNING id""",
+                (owner, now + SHARD_LEASE_SECONDS, lo, hi, now, chunk_size),
+            ).fetchall()]
+            if not claimed:
+                break
+            
+            for p_id in claimed:
+                simulate_bank_call(p_id)
+            
+            # 3. Complete only the rows this run still owns (fenced by lease_owner)
+            conn.execute("BEGIN IMMEDIATE")
+            stats["completed"] += conn.executemany(
+                "UPDATE payments SET status = 'COMPLETED', lease_owner = NULL, lease_until = NULL "
+                "WHERE id = ? AND status = 'PROCESSING' AND lease_owner = ?",
+                ((p_id, owner) for p_id in claimed),
+            ).rowcount
+            # Keep the shard lease alive while there is work left
+            conn.execute("UPDATE shard_leases SET lease_until = ? WHERE shard = ? AND owner = ?",
+                         (time.time() + SHARD_LEASE_SECONDS, shard, owner))
+            conn.execute("COMMIT")
+        
+        # 4. Release the shard for the next run
+        conn.execute("UPDATE shard_leases SET owner = NULL, lease_until = 0 WHERE shard = ? AND owner = ?", (shard, owner))
+    finally:
+        conn.close()
+        stats["seconds"] = time.perf_counter() - started
+    return stats
+
+def run_sharded_batch(num_shards: int = 8, workers: Optional[int] = None,
+                      db_path: str = DEFAULT_SHARD_DB_PATH,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE // 5) -> dict:
+    """
+    Parallel version of the payrun job.
+    Logic: Split the PENDING set into hash-range shards and process them in a process pool.
+    Returns aggregate throughput stats.
+    """
+    owner = f"run_{uuid.uuid4().hex[:8]}"
+    logger.info(f">>> JOB START (sharded): {owner} with {num_shards} shards...")
+    
+    export_to_shard_store(db_path)
+    
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(process_shard, db_path, f"{num_shards}:{i}", lo, hi, owner, chunk_size)
+            for i, (lo, hi) in enumerate(shard_ranges(num_shards))
+        ]
+        shard_stats = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+    
+    # Reflect the shared store back into the in-memory table
+    with closing(sqlite3.connect(db_path)) as conn:
+        for p_id, status in conn.execute("SELECT id, status FROM payments"):
+            if p_id in database["payments"]:
+                database["payments"][p_id].status = status
+    
+    completed = sum(s["completed"] for s in shard_stats)
+    result = {
+        "owner": owner,
+        "processed": completed,
+        "shards_leased": sum(s["leased"] for s in shard_stats),
+        "shards_skipped": sum(not s["leased"] for s in shard_stats),
+        "elapsed_seconds": round(elapsed, 3),
+        "payments_per_sec": round(completed / elapsed, 1) if elapsed else 0.0,
+        "slowest_shard_seconds": round(max((s["seconds"] for s in shard_stats), default=0.0), 3),
+    }
+    logger.info(f">>> JOB FINISHED: {result}")
+    return result
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Payrun batch job")
+    parser.add_argument("--mode", choices=["legacy", "chunked", "sharded"], default="legacy")
+    parser.add_argument("--seed", type=int, default=0, help="insert N random PENDING payments first")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--max-chunks", type=int, default=None)
+    parser.add_argument("--table", default=DEFAULT_TABLE_PATH, help="chunked mode: payments table snapshot")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--db", default=DEFAULT_SHARD_DB_PATH)
+    args = parser.parse_args()
+    
     # In this version, we assume the 'database' is populated by an external process (API)
     # before this script is executed.
-    run_legacy_batch()
\ No newline at end of file
+    if args.mode == "chunked":
+        load_table(args.table)
+    for _ in range(args.seed):
+        add_payment(amount=round(random.uniform(10, 500), 2))
+    
+    if args.mode == "legacy":
+        run_legacy_batch()
+    elif args.mode == "chunked":
+        run_chunked_batch(args.chunk_size, args.checkpoint, args.max_chunks, args.table)
+    else:
+        run_sharded_batch(args.shards, args.workers, args.db, args.chunk_size)
\ No newline at end of file
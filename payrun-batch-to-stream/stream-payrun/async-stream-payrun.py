@@ -0,0 +1,194 @@
+import time
+import uuid
+import sys
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared packages at the repo root
+from payment_metrics import metrics
+from payment_models import OutboxEvent, Payment
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(name)s: %(message)s')
+logger_app = logging.getLogger("APP-LOGIC")
+logger_relay = logging.getLogger("RELAY-PROCESS")
+logger_worker = logging.getLogger("STREAM-WORKER")
+# Per-event lines go through sampling (PAYMENT_LOG_SAMPLE_EVERY), lifecycle lines do not
+event_log_app = metrics.sampled(logger_app)
+event_log_relay = metrics.sampled(logger_relay)
+event_log_worker = metrics.sampled(logger_worker)
+
+# Mock Database Store
+database = {
+    "payments": {},
+    "outbox": {},
+    "outbox_seq": 0,     # Last sequence number handed out by create_payment()
+    "relay_cursor": 0,   # Last sequence number the relay pushed to the stream
+}
+
+# Change feed on the outbox table (Simulating LISTEN/NOTIFY or CDC)
+outbox_changed = asyncio.Condition()
+
+# The Message Stream (Simulating Kafka or RabbitMQ)
+# Bounded so a slow worker pushes back on the relay instead of buffering forever
+message_stream: asyncio.Queue = asyncio.Queue(maxsize=10_000)
+
+# The API, the Relay Process, and the Stream Worker run as tasks on one event loop
+
+class AsyncSimulatedBankClient:
+    """
+    Local fake of an async Bank API client.
+    max_concurrency caps open requests (like an HTTP connection pool), so one
+    process can keep thousands of calls in flight without overwhelming the bank.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0, max_concurrency: int = 1000):
+        self.latency_seconds = latency_seconds
+        self.slots = asyncio.Semaphore(max_concurrency)
+
+    async def pay(self, payment: Payment) -> str:
+        async with self.slots:
+            await asyncio.sleep(self.latency_seconds)
+            return "COMPLETED"
+
+# The API
+async def create_payment(amount: float) -> str:
+    """
+    Simulates the 'All-in-One Save' (Transactional Outbox Pattern).
+    Saves both the payment data and the event to the database atomically.
+    """
+    # Full 128-bit ids: 6 hex digits collide after a few thousand payments
+    payment_id = f"pay_{uuid.uuid4().hex}"
+    event_id = f"evt_{uuid.uuid4().hex}"
+
+    # In a real DB, these writes happen inside a single BEGIN/COMMIT block
+    async with outbox_changed:
+        database["outbox_seq"] += 1
+        seq = database["outbox_seq"]
+        database["payments"][payment_id] = Payment(id=payment_id, amount=amount, status="PENDING")
+        database["outbox"][event_id] = OutboxEvent(id=event_id, payment_id=payment_id, seq=seq)
+        # COMMIT: wake up the relay (NOTIFY outbox_changed)
+        outbox_changed.notify()
+
+    event_log_app.info("Created %s and saved Event %s to Outbox.", payment_id, event_id)
+    return payment_id
+
+# The Relay Process
+async def relay_process():
+    """
+    Simulates the 'Instant Hand-off'.
+    Awaits the outbox change feed and pushes new events to the Message Stream.
+    Relayed rows are deleted, so each pass only touches events since the cursor.
+    """
+    logger_relay.info("Relay started. Listening on Outbox change feed...")
+    while True:
+        # 1. Suspend until create_payment() commits
+        async with outbox_changed:
+            await outbox_changed.wait_for(lambda: database["outbox"])
+            # Only unrelayed rows are left in the outbox, already in sequence order
+            batch = list(database["outbox"].values())
+            cursor = database["relay_cursor"]
+
+        with metrics.time("payrun.relay.pass"):
+            for event in batch:
+                # Rows at or below the cursor were pushed before a crash but not yet compacted
+                if event.seq > cursor:
+                    # Push to the "Stream" (suspends while the stream is full)
+                    await message_stream.put(event.payment_id)
+                    event.processed = True
+                    event_log_relay.info("Relayed event for %s to stream.", event.payment_id)
+        metrics.count("payrun.relay.events", len(batch))
+
+        # 2. Advance the cursor, then compact the relayed rows out of the outbox
+        async with outbox_changed:
+            database["relay_cursor"] = max(cursor, batch[-1].seq)
+            for event in batch:
+                del database["outbox"][event.id]
+
+@metrics.timed("payrun.stream.process_payment")
+async def process_payment(payment_id: str, bank: AsyncSimulatedBankClient) -> bool:
+    """
+    Processes a single payment event.
+    Returns False if the event was a duplicate and skipped.
+    """
+    # 1. Fetch current payment state
+    payment = database["payments"][payment_id]
+
+    # 2. Idempotency Check: Don't process if already done or already in flight
+    # Check-and-set runs without an await in between, so it is atomic on the event loop
+    if payment.status in ("PROCESSING", "COMPLETED"):
+        event_log_worker.warning("SKIPPING: %s is already %s. (Idempotency Guard)", payment_id, payment.status)
+        metrics.count("payrun.stream.skipped")
+        return False
+    payment.status = "PROCESSING"
+
+    # 3. Simulated Bank API Call (other payments keep running while this one waits)
+    event_log_worker.info("START: Calling Bank API for %s...", payment_id)
+    payment.status = await bank.pay(payment)
+    payment.completed_at = time.perf_counter()
+
+    event_log_worker.info("DONE: Processed %s. Status: %s", payment_id, payment.status)
+    metrics.count("payrun.stream.processed")
+    if metrics.enabled:
+        # API commit -> bank result, across outbox, relay and stream
+        metrics.histogram("payrun.stream.end_to_end").record((payment.completed_at - payment.created_at) * 1e6)
+    return True
+
+# The Stream Worker
+async def stream_worker(bank: AsyncSimulatedBankClient, max_in_flight: int = 1000):
+    """
+    Simulates 'Many Tasks at Once'.
+    Takes events off the stream and runs each payment as its own task,
+    with at most max_in_flight payments being processed at a time.
+    """
+    logger_worker.info("Worker started. Waiting for events...")
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks: set[asyncio.Task] = set()
+
+    async def run(payment_id: str):
+        try:
+            await process_payment(payment_id, bank)
+        finally:
+            in_flight.release()
+            message_stream.task_done()
+
+    while True:
+        payment_id = await message_stream.get() # Suspends until an event arrives
+        await in_flight.acquire()
+        task = asyncio.create_task(run(payment_id))
+        # Keep a reference so the task is not garbage-collected mid-flight
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+async def run_payrun(num_payments: int, bank: AsyncSimulatedBankClient, max_in_flight: int = 1000):
+    """Runs the API, relay and worker on one event loop until every payment is processed"""
+    relay = asyncio.create_task(relay_process())
+    worker = asyncio.create_task(stream_worker(bank, max_in_flight))
+
+    for _ in range(num_payments):
+        await create_payment(amount=100.0)
+        # create_payment() never suspends on its own: yield so the relay and worker overlap with it
+        await asyncio.sleep(0)
+
+    # Wait for the relay to hand everything off, then drain the stream
+    while database["outbox"]:
+        await asyncio.sleep(0.001)
+    await message_stream.join()
+
+    for task in (relay, worker):
+        task.cancel()
+    await asyncio.gather(relay, worker, return_exceptions=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async stream payrun demo")
+    parser.add_argument("--payments", type=int, default=20)
+    parser.add_argument("--bank-latency-ms", type=float, default=50.0)
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    args = parser.parse_args()
+
+    bank = AsyncSimulatedBankClient(
+        latency_seconds=args.bank_latency_ms / 1000, max_concurrency=args.max_in_flight
+    )
+    asyncio.run(run_payrun(args.payments, bank, args.max_in_flight))
@@ -0,0 +1,83 @@
+"""Compares the threaded and asyncio payrun engines: events/sec and p99 latency"""
+import time
+import asyncio
+import logging
+import argparse
+import threading
+import importlib.util
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+def load_engine(filename: str):
+    """Loads a fresh copy of an engine script (new database, stream and locks per run)"""
+    spec = importlib.util.spec_from_file_location(filename.replace("-", "_")[:-3], HERE / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def report(name: str, payments: dict, elapsed: float) -> dict:
+    latencies_ms = sorted((p.completed_at - p.created_at) * 1000 for p in payments.values())
+    completed = len(latencies_ms)
+    return {
+        "engine": name,
+        "payments": completed,
+        "events_per_sec": round(completed / elapsed, 1),
+        "p50_ms": round(latencies_ms[completed // 2], 2),
+        "p99_ms": round(latencies_ms[min(completed - 1, int(completed * 0.99))], 2),
+    }
+
+
+def bench_threaded(num_payments: int, latency_seconds: float, workers: int) -> dict:
+    engine = load_engine("stream-payrun.py")
+    engine.bank_client = engine.SimulatedBankClient(latency_seconds=latency_seconds)
+    stream = engine.PartitionedStream(num_partitions=workers, capacity=10_000)
+    group = engine.ConsumerGroup(stream, max_in_flight=workers)
+
+    started = time.perf_counter()
+    group.start()
+    threading.Thread(target=engine.relay_process, args=(stream,), daemon=True).start()
+    for _ in range(num_payments):
+        engine.create_payment(amount=100.0)
+    while engine.database["outbox"]:
+        time.sleep(0.001)
+    group.stop(drain=True)
+    elapsed = time.perf_counter() - started
+
+    return report(f"threaded ({workers} workers)", engine.database["payments"], elapsed)
+
+
+def bench_async(num_payments: int, latency_seconds: float, max_in_flight: int) -> dict:
+    engine = load_engine("async-stream-payrun.py")
+    bank = engine.AsyncSimulatedBankClient(latency_seconds=latency_seconds, max_concurrency=max_in_flight)
+
+    started = time.perf_counter()
+    asyncio.run(engine.run_payrun(num_payments, bank, max_in_flight))
+    elapsed = time.perf_counter() - started
+
+    return report(f"asyncio ({max_in_flight} in flight)", engine.database["payments"], elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Threaded vs asyncio payrun benchmark")
+    parser.add_argument("--payments", type=int, default=5000)
+    parser.add_argument("--bank-latency-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=8, help="threaded engine: consumer group size")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="asyncio engine: concurrent bank calls")
+    args = parser.parse_args()
+
+    # Per-event INFO logs would dominate the measurement
+    logging.disable(logging.INFO)
+
+    latency_seconds = args.bank_latency_ms / 1000
+    for result in (
+        bench_threaded(args.payments, latency_seconds, args.workers),
+        bench_async(args.payments, latency_seconds, args.max_in_flight),
+    ):
+        print(
+            f"{result['engine']:<28} {result['payments']:>7} payments  "
+            f"{result['events_per_sec']:>10.1f} events/sec  "
+            f"p50 {result['p50_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms"
+        )
@@ -0,0 +1,470 @@
+"""File-backed, segmented append-only log (a local stand-in for a Kafka topic)"""
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import logging
+import argparse
+import tempfile
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+logger_log = logging.getLogger("DURABLE-LOG")
+
+# Record frame: offset, value length, crc32(key + value), key length, then key and value bytes
+HEADER = struct.Struct(">QIIH")
+
+# Durability settings
+FSYNC_ALWAYS = "always"  # fsync before every append returns (one fsync per record)
+FSYNC_BATCH = "batch"    # group commit: concurrent appends share one fsync per window
+FSYNC_NEVER = "never"    # leave flushing to the OS page cache (fastest, loses data on power failure)
+
+SEGMENT_SUFFIX = ".log"
+OFFSETS_FILE = "offsets.json"
+# Sparse index: one (offset, byte position) entry per this many bytes of a segment
+INDEX_INTERVAL_BYTES = 4096
+
+
+@dataclass
+class LogRecord:
+    offset: int
+    key: str
+    value: bytes
+
+
+def _segment_name(base_offset: int) -> str:
+    return f"{base_offset:020d}{SEGMENT_SUFFIX}"
+
+
+def _iter_frames(buf, start: int = 0) -> Iterator[tuple[int, LogRecord]]:
+    """Yields (end position, record) for every intact frame; stops at a torn or corrupt one"""
+    pos = start
+    size = len(buf)
+    while pos + HEADER.size <= size:
+        offset, value_len, crc, key_len = HEADER.unpack_from(buf, pos)
+        body_start = pos + HEADER.size
+        end = body_start + key_len + value_len
+        if end > size:
+            return
+        body = buf[body_start:end]
+        if zlib.crc32(body) != crc:
+            return
+        yield end, LogRecord(offset, bytes(body[:key_len]).decode(), bytes(body[key_len:]))
+        pos = end
+
+
+def _is_frame_at(buf, pos: int) -> bool:
+    """True if an intact frame starts at pos (an index entry may predate a compaction)"""
+    return next(_iter_frames(buf, pos), None) is not None
+
+
+class _SegmentIndex:
+    """Sparse offset -> byte position map for one segment, so a read seeks instead of scanning"""
+    __slots__ = ("offsets", "positions")
+
+    def __init__(self):
+        self.offsets: list[int] = []
+        self.positions: list[int] = []
+
+    def add(self, offset: int, position: int):
+        if not self.positions or position - self.positions[-1] >= INDEX_INTERVAL_BYTES:
+            self.offsets.append(offset)
+            self.positions.append(position)
+
+    def position_for(self, offset: int) -> int:
+        """Byte position of an indexed frame at or before offset"""
+        i = bisect_right(self.offsets, offset) - 1
+        return self.positions[i] if i >= 0 else 0
+
+    @classmethod
+    def build(cls, buf) -> "_SegmentIndex":
+        index, pos = cls(), 0
+        for end, record in _iter_frames(buf):
+            index.add(record.offset, pos)
+            pos = end
+        return index
+
+
+def _encode(offset: int, key: str, value: bytes) -> bytes:
+    key_bytes = key.encode()
+    body = key_bytes + value
+    return HEADER.pack(offset, len(value), zlib.crc32(body), len(key_bytes)) + body
+
+
+class SegmentedLog:
+    """
+    Append-only log split into fixed-size segment files, with per-group consumer offsets.
+    Readers only see records up to the durable offset (the "high watermark"),
+    so a consumer never acts on an event that a crash could still lose.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024,
+                 fsync: str = FSYNC_BATCH, group_commit_seconds: float = 0.0,
+                 group_commit_records: int = 1000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.group_commit_seconds = group_commit_seconds
+        self.group_commit_records = group_commit_records
+
+        self._lock = threading.Lock()
+        # Notified when the durable offset advances (readers and waiting writers)
+        self._changed = threading.Condition(self._lock)
+        self._pending = 0
+        self._closed = False
+        # Segment base offset -> sparse index; closed segments from earlier runs are indexed on first read
+        self._indexes: dict[int, _SegmentIndex] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self.segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)
+        ) or [0]
+        # Only the active (last) segment can hold a torn write, so recovery is bounded by one segment
+        self.next_offset = self._recover_active_segment()
+        self.durable_offset = self.next_offset
+        self._active = open(self._segment_path(self.segments[-1]), "ab", buffering=0)
+        self._active_size = self._active.tell()
+        self.offsets = self._load_offsets()
+
+        self._flusher = None
+        if fsync == FSYNC_BATCH:
+            self._flusher = threading.Thread(target=self._group_commit_loop, name="LOG-FLUSHER", daemon=True)
+            self._flusher.start()
+
+    # Write path
+
+    def append(self, key: str, value: bytes, wait: bool = True) -> int:
+        """Appends one record and returns its offset; wait=True blocks until it is durable"""
+        return self.append_many([(key, value)], wait=wait)[-1]
+
+    def append_many(self, records: list[tuple[str, bytes]], wait: bool = True) -> list[int]:
+        """Appends records with a single write() call"""
+        with self._lock:
+            if self._active_size >= self.segment_bytes:
+                self._roll()
+            offsets = list(range(self.next_offset, self.next_offset + len(records)))
+            encoded = [_encode(offset, key, value) for offset, (key, value) in zip(offsets, records)]
+            index = self._indexes[self.segments[-1]]
+            position = self._active_size
+            for offset, frame in zip(offsets, encoded):
+                index.add(offset, position)
+                position += len(frame)
+            frames = b"".join(encoded)
+            self._active.write(frames)
+            self._active_size += len(frames)
+            self.next_offset += len(records)
+
+            if self.fsync == FSYNC_ALWAYS:
+                self._sync_locked()
+            elif self.fsync == FSYNC_NEVER:
+                self._publish_locked()
+            else:
+                self._pending += len(records)
+                self._changed.notify_all()  # wake the flusher
+
+        if wait:
+            self.wait_durable(offsets[-1])
+        return offsets
+
+    def wait_durable(self, offset: int, timeout: Optional[float] = None) -> bool:
+        with self._changed:
+            return self._changed.wait_for(lambda: self.durable_offset > offset, timeout)
+
+    def _group_commit_loop(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                if self.group_commit_seconds:
+                    # Linger so more concurrent writers join this fsync
+                    self._changed.wait_for(lambda: self._pending >= self.group_commit_records,
+                                           self.group_commit_seconds)
+                target = self.next_offset
+                self._pending = 0
+                # A dup stays valid even if the segment rolls while we fsync
+                fd = os.dup(self._active.fileno())
+
+            # fsync outside the lock: writers arriving meanwhile queue up for the next group
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+            with self._changed:
+                if target > self.durable_offset:
+                    self.durable_offset = target
+                    self._changed.notify_all()
+
+    def _sync_locked(self):
+        os.fsync(self._active.fileno())
+        self._publish_locked()
+
+    def _publish_locked(self):
+        self._pending = 0
+        self.durable_offset = max(self.durable_offset, self.next_offset)
+        self._changed.notify_all()
+
+    def _roll(self):
+        self._sync_locked()
+        self._active.close()
+        self.segments.append(self.next_offset)
+        self._indexes[self.next_offset] = _SegmentIndex()
+        self._active = open(self._segment_path(self.next_offset), "ab", buffering=0)
+        self._active_size = 0
+
+    # Read path
+
+    def read(self, from_offset: int, max_records: Optional[int] = None) -> Iterator[LogRecord]:
+        """
+        Replays durable records starting at from_offset through read-only memory maps.
+        The sparse segment index seeks to within INDEX_INTERVAL_BYTES of from_offset,
+        so reading a log in max_records batches stays linear overall.
+        """
+        with self._lock:
+            segments = list(self.segments)
+            high_watermark = self.durable_offset
+
+        emitted = 0
+        first = max(0, bisect_right(segments, from_offset) - 1)
+        for base in segments[first:]:
+            if base >= high_watermark:
+                return
+            try:
+                with open(self._segment_path(base), "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        continue
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        start = self._seek(base, mm, from_offset) if base == segments[first] else 0
+                        for _, record in _iter_frames(mm, start):
+                            if record.offset >= high_watermark:
+                                return
+                            if record.offset < from_offset:
+                                continue
+                            yield record
+                            emitted += 1
+                            if max_records is not None and emitted >= max_records:
+                                return
+            except FileNotFoundError:
+                # Removed by retention while we were reading; later segments are still valid
+                continue
+
+    def _seek(self, base: int, mm, offset: int) -> int:
+        with self._lock:
+            index = self._indexes.get(base)
+        if index is None:
+            index = _SegmentIndex.build(mm)
+            with self._lock:
+                index = self._indexes.setdefault(base, index)
+        with self._lock:
+            start = index.position_for(offset)
+        return start if start == 0 or _is_frame_at(mm, start) else 0
+
+    def wait_for_records(self, from_offset: int, timeout: Optional[float] = None) -> bool:
+        """Blocks until a record at or after from_offset is durable (no polling)"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.durable_offset > from_offset, timeout)
+
+    @property
+    def start_offset(self) -> int:
+        return self.segments[0]
+
+    # Consumer offsets
+
+    def committed_offset(self, group: str) -> int:
+        """Next offset the group should read (the oldest retained record for a new group)"""
+        return max(self.offsets.get(group, 0), self.start_offset)
+
+    def commit_offset(self, group: str, next_offset: int):
+        with self._lock:
+            self.offsets[group] = next_offset
+            snapshot = dict(self.offsets)
+        path = os.path.join(self.directory, OFFSETS_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+            if self.fsync != FSYNC_NEVER:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _load_offsets(self) -> dict[str, int]:
+        path = os.path.join(self.directory, OFFSETS_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    # Retention and compaction
+
+    def apply_retention(self, max_segments: Optional[int] = None) -> int:
+        """
+        Deletes closed segments that every consumer group has read past.
+        max_segments additionally caps how many segments are kept, consumed or not.
+        Returns the number of segments deleted.
+        """
+        with self._lock:
+            consumed_through = min(self.offsets.values(), default=0)
+            doomed = []
+            closed = self.segments[:-1]
+            for i, base in enumerate(closed):
+                next_base = self.segments[i + 1]
+                over_cap = max_segments is not None and len(self.segments) - len(doomed) > max_segments
+                if next_base <= consumed_through or over_cap:
+                    doomed.append(base)
+                else:
+                    break
+            self.segments = self.segments[len(doomed):]
+            for base in doomed:
+                self._indexes.pop(base, None)
+
+        for base in doomed:
+            os.remove(self._segment_path(base))
+        if doomed:
+            logger_log.info(f"Retention removed {len(doomed)} segments in {self.directory}.")
+        return len(doomed)
+
+    def compact(self) -> int:
+        """
+        Key-based compaction of closed segments: keeps only the latest record per key
+        and drops tombstones (empty values). Offsets are preserved, so consumer
+        positions stay valid. Returns the number of records removed.
+        """
+        with self._lock:
+            closed = self.segments[:-1]
+            high_watermark = self.durable_offset
+
+        latest: dict[str, int] = {}
+        for record in self.read(self.start_offset):
+            latest[record.key] = record.offset
+            if record.offset + 1 >= high_watermark:
+                break
+
+        removed = 0
+        for base in closed:
+            path = self._segment_path(base)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue  # Removed by retention since the segment list was taken
+            kept = []
+            total = 0
+            for _, record in _iter_frames(data):
+                total += 1
+                if record.value and latest.get(record.key) == record.offset:
+                    kept.append(_encode(record.offset, record.key, record.value))
+            if len(kept) == total:
+                continue
+            removed += total - len(kept)
+            # Write-then-rename so a crash mid-compaction keeps the old segment
+            tmp_path = f"{path}.compact"
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(kept))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._indexes.pop(base, None)  # Byte positions moved; rebuilt on the next read
+
+        if removed:
+            logger_log.info(f"Compaction removed {removed} superseded records in {self.directory}.")
+        return removed
+
+    # Lifecycle
+
+    def close(self):
+        with self._changed:
+            self._closed = True
+            if self.fsync != FSYNC_NEVER:
+                self._sync_locked()
+            self._changed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        self._active.close()
+
+    def _segment_path(self, base_offset: int) -> str:
+        return os.path.join(self.directory, _segment_name(base_offset))
+
+    def _recover_active_segment(self) -> int:
+        """Truncates a torn tail left by a crash and returns the next offset to assign"""
+        base = self.segments[-1]
+        path = self._segment_path(base)
+        if not os.path.exists(path):
+            open(path, "wb").close()
+            self._indexes[base] = _SegmentIndex()
+            return base
+
+        with open(path, "rb") as f:
+            data = f.read()
+        index = self._indexes[base] = _SegmentIndex()
+        good_end, next_offset = 0, base
+        for end, record in _iter_frames(data):
+            index.add(record.offset, good_end)
+            good_end, next_offset = end, record.offset + 1
+        if good_end < len(data):
+            logger_log.warning(f"Truncating {len(data) - good_end} torn bytes from {path}.")
+            with open(path, "r+b") as f:
+                f.truncate(good_end)
+        return next_offset
+
+
+def benchmark_durability(records: int, writers: int, value_size: int) -> list[dict]:
+    """Measures append throughput and mmap replay speed under each durability setting"""
+    settings = [
+        ("never", dict(fsync=FSYNC_NEVER)),
+        ("batch", dict(fsync=FSYNC_BATCH)),
+        ("batch+1ms", dict(fsync=FSYNC_BATCH, group_commit_seconds=0.001)),
+        ("always", dict(fsync=FSYNC_ALWAYS)),
+    ]
+    value = b"x" * value_size
+    results = []
+    for name, options in settings:
+        with tempfile.TemporaryDirectory() as directory:
+            log = SegmentedLog(directory, segment_bytes=4 * 1024 * 1024, **options)
+            per_writer = records // writers
+
+            def writer(worker_id: int):
+                for i in range(per_writer):
+                    log.append(f"pay_{worker_id}_{i}", value)
+
+            threads = [threading.Thread(target=writer, args=(w,)) for w in range(writers)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            write_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            replayed = sum(1 for _ in log.read(0))
+            replay_seconds = time.perf_counter() - started
+            log.close()
+
+            results.append({
+                "fsync": name,
+                "records": per_writer * writers,
+                "writes_per_sec": round(per_writer * writers / write_seconds, 1),
+                "replayed_per_sec": round(replayed / replay_seconds, 1),
+                "segments": len(log.segments),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Durable log write/replay throughput")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--writers", type=int, default=8, help="concurrent appending threads")
+    parser.add_argument("--value-size", type=int, default=64)
+    args = parser.parse_args()
+
+    for result in benchmark_durability(args.records, args.writers, args.value_size):
+        print(
+            f"fsync={result['fsync']:<11} {result['records']:>8} records  "
+            f"{result['writes_per_sec']:>10.1f} writes/sec  "
+            f"{result['replayed_per_sec']:>11.1f} replayed/sec  {result['segments']} segments"
+        )
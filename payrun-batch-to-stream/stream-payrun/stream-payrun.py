@@ -1,37 +1,90 @@
 import time
 import uuid
+import zlib
+import sys
 import logging
+import argparse
 import threading
-from dataclasses import dataclass, field
-from queue import Queue
+from pathlib import Path
+from queue import Queue, Empty
+from typing import Optional
+
+from durable_log import SegmentedLog
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # Shared packages at the repo root
+from payment_metrics import metrics
+from payment_models import OutboxEvent, Payment
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(name)s: %(message)s')
 logger_app = logging.getLogger("APP-LOGIC")
 logger_relay = logging.getLogger("RELAY-PROCESS")
 logger_worker = logging.getLogger("STREAM-WORKER")
-
-@dataclass
-class Payment:
-    id: str
-    amount: float
-    status: str
-
-@dataclass
-class OutboxEvent:
-    id: str
-    payment_id: str
-    processed: bool = False
+# Per-event lines go through sampling (PAYMENT_LOG_SAMPLE_EVERY), lifecycle lines do not
+event_log_app = metrics.sampled(logger_app)
+event_log_relay = metrics.sampled(logger_relay)
+event_log_worker = metrics.sampled(logger_worker)
 
 # Mock Database Store
 database = {
     "payments": {},
-    "outbox": {}
+    "outbox": {},
+    "outbox_seq": 0,     # Last sequence number handed out by create_payment()
+    "relay_cursor": 0,   # Last sequence number the relay pushed to the stream
 }
 
+# Change feed on the outbox table (Simulating LISTEN/NOTIFY or CDC).
+# Writers notify it on commit so the relay wakes up instead of polling.
+outbox_changed = threading.Condition()
+
+# Upper bound on how long the relay sleeps without a notification
+RELAY_IDLE_TIMEOUT_SECONDS = 5.0
+
+# Simulated round-trip time of one Bank API call
+BANK_API_LATENCY_SECONDS = 0.0
+
 # The Message Stream (Simulating Kafka or RabbitMQ)
 message_stream = Queue()
 
+class PartitionedStream:
+    """
+    Simulates a partitioned topic (Kafka-style).
+    Events are routed by payment_id, so every event for one payment lands on
+    the same partition and is consumed in order; partitions run in parallel.
+    """
+    
+    def __init__(self, num_partitions: int, capacity: int = 0):
+        # capacity > 0 bounds each partition so a slow consumer pushes back on the relay
+        self.partitions = [Queue(maxsize=capacity) for _ in range(num_partitions)]
+    
+    def partition_for(self, payment_id: str) -> int:
+        # Stable hash (unlike hash(), it does not change between processes)
+        return zlib.crc32(payment_id.encode()) % len(self.partitions)
+    
+    def put(self, payment_id: str):
+        self.partitions[self.partition_for(payment_id)].put(payment_id)
+
+class DurableStream:
+    """
+    Message Stream backed by a file-based append-only log.
+    Events survive a restart, and consumers resume from their committed offset.
+    """
+    
+    def __init__(self, log: SegmentedLog):
+        self.log = log
+    
+    def put(self, payment_id: str):
+        self.log.append(payment_id, payment_id.encode())
+    
+    def put_many(self, payment_ids: list[str]):
+        """One write and one durability wait for the whole batch"""
+        if payment_ids:
+            self.log.append_many([(payment_id, payment_id.encode()) for payment_id in payment_ids])
+
+# Durable Outbox: when set, create_payment() appends outbox events to this log
+# instead of database["outbox"], and durable_relay_process() tails it.
+outbox_log: Optional[SegmentedLog] = None
+
 # The API, the Relay Process, and the Stream Worker run in separate processes/threads
 
 # The API
@@ -40,34 +93,159 @@ def create_payment(amount: float):
     Simulates the 'All-in-One Save' (Transactional Outbox Pattern).
     Saves both the payment data and the event to the database atomically.
     """
-    payment_id = f"pay_{uuid.uuid4().hex[:6]}"
-    event_id = f"evt_{uuid.uuid4().hex[:6]}"
+    payment_id = f"pay_{uuid.uuid4().hex}"
+    event_id = f"evt_{uuid.uuid4().hex}"
+    
+    if outbox_log is not None:
+        database["payments"][payment_id] = Payment(id=payment_id, amount=amount, status="PENDING")
+        # The durable append is the COMMIT (concurrent callers share one fsync)
+        outbox_log.append(event_id, payment_id.encode())
+        event_log_app.info("Created %s and saved Event %s to Outbox.", payment_id, event_id)
+        return payment_id
     
-    # In a real DB, these two lines happen inside a single BEGIN/COMMIT block
-    database["payments"][payment_id] = Payment(id=payment_id, amount=amount, status="PENDING")
-    database["outbox"][event_id] = OutboxEvent(id=event_id, payment_id=payment_id)
+    # In a real DB, these writes happen inside a single BEGIN/COMMIT block
+    with outbox_changed:
+        database["outbox_seq"] += 1
+        seq = database["outbox_seq"]
+        database["payments"][payment_id] = Payment(id=payment_id, amount=amount, status="PENDING")
+        database["outbox"][event_id] = OutboxEvent(id=event_id, payment_id=payment_id, seq=seq)
+        # COMMIT: wake up the relay (NOTIFY outbox_changed)
+        outbox_changed.notify()
     
-    logger_app.info(f"Created {payment_id} and saved Event {event_id} to Outbox.")
+    event_log_app.info("Created %s and saved Event %s to Outbox.", payment_id, event_id)
+    return payment_id
+
+def requeue_payment(payment_id: str):
+    """
+    Saves a fresh outbox event for a payment whose stream event was never consumed,
+    so the relay delivers it again (the worker's idempotency guard absorbs repeats).
+    """
+    event_id = f"evt_{uuid.uuid4().hex}"
+    if outbox_log is not None:
+        outbox_log.append(event_id, payment_id.encode())
+        return
+    with outbox_changed:
+        database["outbox_seq"] += 1
+        database["outbox"][event_id] = OutboxEvent(id=event_id, payment_id=payment_id, seq=database["outbox_seq"])
+        outbox_changed.notify()
 
 # The Relay Process
-def relay_process():
+def relay_process(stream=message_stream):
     """
     Simulates the 'Instant Hand-off'.
-    Watches the Outbox table and pushes events to the Message Stream.
+    Sleeps on the outbox change feed and pushes new events to the Message Stream.
+    Relayed rows are deleted, so each pass only touches events since the cursor.
     """
-    logger_relay.info("Relay started. Watching Outbox table...")
+    logger_relay.info("Relay started. Listening on Outbox change feed...")
     while True:
-        # Check for unprocessed events in the outbox
-        unprocessed = [e for e in database["outbox"].values() if not e.processed]
+        # 1. Block until create_payment() commits (no fixed polling interval)
+        with outbox_changed:
+            outbox_changed.wait_for(lambda: database["outbox"], timeout=RELAY_IDLE_TIMEOUT_SECONDS)
+            # Only unrelayed rows are left in the outbox, already in sequence order
+            batch = list(database["outbox"].values())
+            cursor = database["relay_cursor"]
         
-        for event in unprocessed:
-            # Push to the "Stream"
-            message_stream.put(event.payment_id)
-            # Mark as processed in the Outbox
-            event.processed = True
-            logger_relay.info(f"Relayed event for {event.payment_id} to stream.")
-            
-        time.sleep(1) # Polling the outbox frequently
+        relayed = []
+        with metrics.time("payrun.relay.pass"):
+            for event in batch:
+                # Rows at or below the cursor were pushed before a crash but not yet compacted
+                if event.seq > cursor:
+                    # Push to the "Stream"
+                    stream.put(event.payment_id)
+                    event.processed = True
+                    event_log_relay.info("Relayed event for %s to stream.", event.payment_id)
+                relayed.append(event)
+        
+        if not relayed:
+            continue
+        metrics.count("payrun.relay.events", len(relayed))
+        
+        # 2. Advance the cursor, then compact the relayed rows out of the outbox
+        with outbox_changed:
+            database["relay_cursor"] = max(cursor, relayed[-1].seq)
+            for event in relayed:
+                del database["outbox"][event.id]
+
+def durable_relay_process(stream, group: str = "relay", batch_size: int = 1000):
+    """
+    Relay over the durable outbox log.
+    The committed consumer offset is the relay cursor, so a restarted relay
+    resumes at the first unrelayed event instead of rebuilding state.
+    """
+    offset = outbox_log.committed_offset(group)
+    logger_relay.info(f"Relay started at outbox offset {offset}...")
+    while True:
+        # Wakes up as soon as an outbox append is durable
+        if not outbox_log.wait_for_records(offset, timeout=RELAY_IDLE_TIMEOUT_SECONDS):
+            continue
+        
+        records = list(outbox_log.read(offset, max_records=batch_size))
+        if not records:
+            # Nothing readable at offset (e.g. retention removed its segment): skip ahead
+            offset = max(offset, outbox_log.start_offset)
+            continue
+        # One append (and one fsync wait) per outbox batch instead of one per event
+        stream.put_many([record.value.decode() for record in records])
+        logger_relay.info(f"Relayed {len(records)} events to stream.")
+        
+        offset = records[-1].offset + 1
+        outbox_log.commit_offset(group, offset)
+        # Segments the relay has moved past are no longer needed
+        outbox_log.apply_retention()
+
+class SimulatedBankClient:
+    """
+    Local fake of the Bank API.
+    Every call costs one network round trip, whether it carries one payment or a batch.
+    Swap in a real client exposing the same pay()/pay_batch() methods.
+    """
+    
+    def __init__(self, latency_seconds: float = BANK_API_LATENCY_SECONDS):
+        self.latency_seconds = latency_seconds
+    
+    def pay(self, payment: Payment) -> str:
+        time.sleep(self.latency_seconds)
+        return "COMPLETED"
+    
+    def pay_batch(self, payments: list[Payment]) -> dict[str, str]:
+        """Returns the final status of each payment, keyed by payment id"""
+        time.sleep(self.latency_seconds)
+        return {payment.id: "COMPLETED" for payment in payments}
+
+bank_client = SimulatedBankClient()
+
+def call_bank_api(payment: Payment):
+    """Simulated Bank API Call"""
+    return bank_client.pay(payment)
+
+@metrics.timed("payrun.stream.process_payment")
+def process_payment(payment_id: str) -> bool:
+    """
+    Processes a single payment event.
+    Returns False if the event was a duplicate and skipped.
+    """
+    # 1. Fetch current payment state
+    payment = database["payments"][payment_id]
+    
+    # 2. Idempotency Check: Don't process if already done
+    # This prevents the "Double-Charging Risk" if the worker retries an event
+    if payment.status == "COMPLETED":
+        event_log_worker.warning("SKIPPING: %s is already COMPLETED. (Idempotency Guard)", payment_id)
+        metrics.count("payrun.stream.skipped")
+        return False
+    
+    # 3. Simulated Bank API Call
+    event_log_worker.info("START: Calling Bank API for %s...", payment_id)
+    payment.status = "PROCESSING"
+    payment.status = call_bank_api(payment)
+    payment.completed_at = time.perf_counter()
+    
+    event_log_worker.info("DONE: Processed %s instantly. Status: %s", payment_id, payment.status)
+    metrics.count("payrun.stream.processed")
+    if metrics.enabled:
+        # API commit -> bank result, across outbox, relay and stream
+        metrics.histogram("payrun.stream.end_to_end").record((payment.completed_at - payment.created_at) * 1e6)
+    return True
 
 # The Stream Worker
 def stream_worker():
@@ -78,23 +256,274 @@ def stream_worker():
     logger_worker.info("Worker started. Waiting for events...")
     while True:
         payment_id = message_stream.get() # Blocks until an event arrives
+        process_payment(payment_id)
+        message_stream.task_done()
+
+def durable_stream_worker(log: SegmentedLog, group: str = "payrun-workers", batch_size: int = 500):
+    """
+    Stream Worker over a DurableStream.
+    Starts at the group's committed offset, so a restart only replays unconsumed events.
+    The offset is committed after each batch, and the idempotency guard
+    absorbs anything replayed from a batch that was cut short by a crash.
+    """
+    offset = log.committed_offset(group)
+    logger_worker.info(f"Worker resuming at offset {offset} ({log.durable_offset - offset} unconsumed events)...")
+    while True:
+        if not log.wait_for_records(offset, timeout=RELAY_IDLE_TIMEOUT_SECONDS):
+            continue
         
-        # Process the individual payment
-        payment = database["payments"][payment_id]
-        payment.status = "COMPLETED"
+        last_offset = None
+        for record in log.read(offset, max_records=batch_size):
+            last_offset = record.offset
+            # The mock payments table is in memory; a replay after restart may outlive it
+            if record.key not in database["payments"]:
+                event_log_worker.warning("SKIPPING: %s not found in payments table.", record.key)
+                continue
+            process_payment(record.key)
+        
+        if last_offset is None:
+            # Nothing readable at offset (e.g. retention removed its segment): skip ahead
+            offset = max(offset, log.start_offset)
+            continue
+        offset = last_offset + 1
+        log.commit_offset(group, offset)
+        log.apply_retention()
+
+# The Consumer Group
+class ConsumerGroup:
+    """
+    Simulates a consumer group reading a PartitionedStream.
+    One worker thread owns each partition, so a payment's events stay in order
+    while different partitions call the bank in parallel.
+    """
+    
+    _STOP = None  # Sentinel queued behind the last event on each partition
+    
+    def __init__(self, stream: PartitionedStream, max_in_flight: int = 0):
+        self.stream = stream
+        # Caps concurrent Bank API calls across all workers (0 = one per worker)
+        self.in_flight = threading.BoundedSemaphore(max_in_flight or len(stream.partitions))
+        self.stats = {"processed": 0, "skipped": 0, "requeued": 0}
+        self._stats_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+    
+    def start(self):
+        for partition_id, partition in enumerate(self.stream.partitions):
+            thread = threading.Thread(
+                target=self._consume,
+                args=(partition_id, partition),
+                name=f"STREAM-WORKER-{partition_id}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger_worker.info(f"Consumer group started with {len(self._threads)} workers.")
+    
+    def stop(self, drain: bool = True):
+        """
+        Shuts the group down.
+        drain=True finishes every event already on the stream first;
+        drain=False only finishes the bank calls in flight. The relay already deleted
+        the queued events from the outbox, so each one is saved back to the outbox
+        as a fresh event (requeue_payment) for the next consumers to pick up.
+        """
+        if not drain:
+            self._stopping.set()
+        for partition in self.stream.partitions:
+            partition.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        logger_worker.info(f"Consumer group stopped. Stats: {self.stats}")
+    
+    def _consume(self, partition_id: int, partition: Queue):
+        while True:
+            payment_id = partition.get() # Blocks until an event arrives
+            if payment_id is self._STOP:
+                partition.task_done()
+                return
+            if self._stopping.is_set():
+                # Not processed here, so it must not be lost either
+                if database["payments"][payment_id].status != "COMPLETED":
+                    requeue_payment(payment_id)
+                    with self._stats_lock:
+                        self.stats["requeued"] += 1
+                partition.task_done()
+                continue
+            
+            with self.in_flight:
+                processed = process_payment(payment_id)
+            
+            with self._stats_lock:
+                self.stats["processed" if processed else "skipped"] += 1
+            partition.task_done()
 
-        # 1. Fetch current payment state
+def process_payment_batch(payment_ids: list[str], bank) -> int:
+    """
+    Processes a batch of payment events with a single Bank API call.
+    Returns the number of payments sent to the bank.
+    """
+    # 1. Idempotency Check for the whole batch (also drops repeats within the batch)
+    to_send: dict[str, Payment] = {}
+    for payment_id in payment_ids:
         payment = database["payments"][payment_id]
-        
-        # 2. Idempotency Check: Don't process if already done
-        # This prevents the "Double-Charging Risk" if the worker retries an event
-        if payment.status == "COMPLETED":
-            logger_worker.warning(f"SKIPPING: {payment_id} is already COMPLETED. (Idempotency Guard)")
-            message_stream.task_done()
+        if payment.status == "COMPLETED" or payment_id in to_send:
+            event_log_worker.warning("SKIPPING: %s is already COMPLETED. (Idempotency Guard)", payment_id)
             continue
+        payment.status = "PROCESSING"
+        to_send[payment_id] = payment
+    
+    if not to_send:
+        return 0
+    
+    # 2. One round trip to the Bank API for the whole batch
+    results = bank.pay_batch(list(to_send.values()))
+    
+    # 3. Apply the bank's results back to the payments table
+    completed_at = time.perf_counter()
+    end_to_end = metrics.histogram("payrun.stream.end_to_end") if metrics.enabled else None
+    for payment_id, status in results.items():
+        payment = database["payments"][payment_id]
+        payment.status = status
+        payment.completed_at = completed_at
+        if end_to_end is not None:
+            # Same span as process_payment(): API commit -> bank result
+            end_to_end.record((completed_at - payment.created_at) * 1e6)
+    metrics.count("payrun.stream.processed", len(results))
+    
+    logger_worker.info(f"DONE: Processed batch of {len(to_send)} payments.")
+    return len(to_send)
+
+# The Batched Stream Worker
+class MicroBatcher:
+    """
+    Simulates a micro-batching stage in front of the Bank API.
+    A collector thread groups events until the batch is full or max_wait_seconds
+    passes, while a sender thread calls the bank for the previous batch
+    (collection of batch N+1 overlaps the round trip of batch N).
+    Batch sizes and flush latencies (first event received -> results applied) go to
+    the "payrun.batch.size" and "payrun.batch.flush" histograms for tuning.
+    """
+    
+    _STOP = None  # Sentinel queued behind the last event
+    
+    def __init__(self, source: Queue, bank=None, max_batch_size: int = 100,
+                 max_wait_seconds: float = 0.020, max_pending_batches: int = 2):
+        self.source = source
+        self.bank = bank or bank_client
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        # Bounded hand-off: a slow bank stalls the collector instead of buffering forever
+        self.batches: Queue = Queue(maxsize=max_pending_batches)
+        self._threads: list[threading.Thread] = []
+    
+    def start(self):
+        for target, name in ((self._collect, "BATCH-COLLECTOR"), (self._send, "BATCH-SENDER")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger_worker.info(
+            f"Micro-batcher started (max {self.max_batch_size} events / {self.max_wait_seconds * 1000:.0f}ms)."
+        )
+    
+    def stop(self):
+        """Flushes every event already on the source, then stops both threads"""
+        self.source.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        logger_worker.info(f"Micro-batcher stopped. Batch sizes: {metrics.histogram('payrun.batch.size').summary()}, "
+                           f"flush us: {metrics.histogram('payrun.batch.flush').summary()}")
+    
+    def _collect(self):
+        stopping = False
+        while not stopping:
+            payment_id = self.source.get() # Blocks until the first event of a batch
+            if payment_id is self._STOP:
+                self.source.task_done()
+                break
+            
+            started = time.perf_counter()
+            deadline = started + self.max_wait_seconds
+            batch = [payment_id]
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    payment_id = self.source.get(timeout=remaining)
+                except Empty:
+                    break
+                if payment_id is self._STOP:
+                    self.source.task_done()
+                    stopping = True
+                    break
+                batch.append(payment_id)
             
-        # 3. Simulated Bank API Call
-        logger_worker.info(f"START: Calling Bank API for {payment_id}...")
+            self.batches.put((started, batch))
+        self.batches.put(self._STOP)
+    
+    def _send(self):
+        while True:
+            item = self.batches.get()
+            if item is self._STOP:
+                return
+            started, batch = item
+            process_payment_batch(batch, self.bank)
+            if metrics.enabled:
+                metrics.histogram("payrun.batch.size").record(len(batch))
+                metrics.histogram("payrun.batch.flush").record((time.perf_counter() - started) * 1e6)
+            for _ in batch:
+                self.source.task_done()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream payrun demo")
+    parser.add_argument("--mode", choices=["group", "batch", "durable"], default="group",
+                        help="group: partitioned consumer group; batch: micro-batched bank calls; "
+                             "durable: file-backed outbox and stream")
+    parser.add_argument("--log-dir", default="payrun-log", help="durable mode: where the logs live")
+    parser.add_argument("--payments", type=int, default=20)
+    args = parser.parse_args()
+    
+    bank_client = SimulatedBankClient(latency_seconds=0.05)
+    
+    if args.mode == "durable":
+        # Durable mode: outbox and stream are append-only logs on disk.
+        # Re-running the script resumes both from their committed offsets.
+        outbox_log = SegmentedLog(f"{args.log_dir}/outbox")
+        stream_log = SegmentedLog(f"{args.log_dir}/stream")
+        threading.Thread(target=durable_relay_process, args=(DurableStream(stream_log),), daemon=True).start()
+        threading.Thread(target=durable_stream_worker, args=(stream_log,), daemon=True).start()
         
-        logger_worker.info(f"DONE: Processed {payment_id} instantly. Status: {payment.status}")
-        message_stream.task_done()
\ No newline at end of file
+        for _ in range(args.payments):
+            create_payment(amount=100.0)
+        
+        # Wait until both consumers have committed everything, then flush the logs
+        while (outbox_log.committed_offset("relay") < outbox_log.durable_offset
+               or stream_log.committed_offset("payrun-workers") < stream_log.durable_offset):
+            time.sleep(0.01)
+        outbox_log.close()
+        stream_log.close()
+        raise SystemExit(0)
+    
+    if args.mode == "group":
+        # Consumer group mode: N workers over a stream partitioned by payment_id
+        NUM_WORKERS = 4
+        stream = PartitionedStream(num_partitions=NUM_WORKERS, capacity=1000)
+        consumer = ConsumerGroup(stream, max_in_flight=NUM_WORKERS)
+    else:
+        # Batch mode: one bank round trip per batch of up to 100 events / 20ms
+        stream = message_stream
+        consumer = MicroBatcher(stream, bank_client, max_batch_size=100, max_wait_seconds=0.020)
+    
+    consumer.start()
+    threading.Thread(target=relay_process, args=(stream,), daemon=True).start()
+    
+    for _ in range(args.payments):
+        create_payment(amount=100.0)
+    
+    # Wait for the relay to hand everything off, then drain the consumer
+    while database["outbox"]:
+        time.sleep(0.01)
+    consumer.stop()